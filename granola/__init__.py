@@ -1,5 +1,8 @@
 from granola._version import get_versions
 from granola.breakfast_cereal import Cereal, PortNotOpenError
+from granola.bundles import compile_bundle
+from granola.checkpoint import load_checkpoint, save_checkpoint
+from granola.clocks import ScaledClock, VirtualClock
 from granola.command_readers import (
     BaseCommandReaders,
     CannedQueries,
@@ -7,7 +10,14 @@ from granola.command_readers import (
     RandomizeResponse,
     SerialCmds,
 )
-from granola.enums import HookTypes, SetRelationship
+from granola.enums import (
+    CannedQueriesBackend,
+    CommandMatch,
+    HookTypes,
+    SetRelationship,
+)
+from granola.file_responses import FileResponse
+from granola.fleet import Fleet
 from granola.hooks.base_hook import BaseHook
 from granola.hooks.hooks import (
     ApproachHook,
@@ -15,16 +25,33 @@ from granola.hooks.hooks import (
     StickCannedQueries,
     register_hook,
 )
+from granola.hooks.transitions import TransitionEngine
+from granola.list_ports import PortRegistry
 from granola.main import MockSerial  # deprecated
+from granola.metrics import FleetMetrics
 from granola.serial_sniffer import SerialSniffer
+from granola.signals import DiurnalSignal, RandomWalk, RecordedSeries, SignalBank
+from granola.transcript import QueueSubscriber, Transcript, UnixSocketSubscriber
+from granola.urlhandler import register as _register_url_handlers
+from granola.utils import IS_PYTHON3
+
+if IS_PYTHON3:  # the servers use selectors, which python 2 doesn't have
+    from granola.rfc2217_server import Rfc2217Server
+    from granola.tcp_server import TcpServer
 
 __version__ = get_versions()["version"]
 del get_versions
 
+_register_url_handlers()
+
 
 __all__ = [
     "__version__",
+    "compile_bundle",
     "RandomizeResponse",
+    "CannedQueriesBackend",
+    "CommandMatch",
+    "FileResponse",
     "BaseCommandReaders",
     "SerialCmds",
     "Cereal",
@@ -40,4 +67,21 @@ __all__ = [
     "SetRelationship",
     "HookTypes",
     "register_hook",
+    "TransitionEngine",
+    "Fleet",
+    "SignalBank",
+    "DiurnalSignal",
+    "RecordedSeries",
+    "RandomWalk",
+    "VirtualClock",
+    "ScaledClock",
+    "save_checkpoint",
+    "load_checkpoint",
+    "FleetMetrics",
+    "PortRegistry",
+    "Transcript",
+    "QueueSubscriber",
+    "UnixSocketSubscriber",
 ]
+if IS_PYTHON3:
+    __all__ += ["TcpServer", "Rfc2217Server"]
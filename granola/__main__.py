@@ -0,0 +1,234 @@
+"""
+Command line interface, run with ``python -m granola <command> --help`` for the details of each command.
+"""
+import argparse
+import codecs
+import logging
+import os
+import signal
+import sys
+
+from granola.breakfast_cereal import Cereal
+
+
+def _add_device_arguments(parser):
+    parser.add_argument("config_path", help="JSON configuration file")
+    parser.add_argument("config_key", help="key of the device configuration in the configuration file")
+    parser.add_argument("--count", type=int, default=1, help="number of devices to serve (default: %(default)s)")
+
+
+def _devices(args):
+    return [Cereal.mock_from_json(config_key=args.config_key, config_path=args.config_path) for _ in range(args.count)]
+
+
+def _unescape(text):
+    """Bytes of a command line argument with Python escapes, such as ``get\\r``"""
+    return codecs.decode(text, "unicode_escape").encode("latin-1")
+
+
+def _serve(server):
+    """Serve until interrupted, stopping cleanly on SIGINT and SIGTERM"""
+
+    def stop(signum, frame):
+        server.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    with server:
+        server.serve_forever()
+
+
+def pty(args):
+    from granola.pty_server import PtyServer
+
+    server = PtyServer()
+    for device in _devices(args):
+        print(server.add(device))
+    sys.stdout.flush()
+    _serve(server)
+
+
+def _serve_tcp(args, server_class):
+    server = server_class(host=args.host)
+    devices = _devices(args)
+    if args.per_connection:
+        addresses = [server.add_fleet(devices, port=args.port, per_connection=True)]
+    else:
+        addresses = server.add_fleet(devices, port=args.port)
+    for address in addresses:
+        print(server.url(address))
+    sys.stdout.flush()
+    _serve(server)
+
+
+def tcp(args):
+    from granola.tcp_server import TcpServer
+
+    _serve_tcp(args, TcpServer)
+
+
+def rfc2217(args):
+    from granola.rfc2217_server import Rfc2217Server
+
+    _serve_tcp(args, Rfc2217Server)
+
+
+def sniff(args):
+    from granola.sniffing_proxy import SniffingProxy
+
+    proxy = SniffingProxy(
+        args.port,
+        outfile=args.outfile,
+        write_terminator=_unescape(args.write_terminator),
+        read_terminator=_unescape(args.read_terminator),
+        baudrate=args.baudrate,
+    )
+    print(proxy.path)
+    sys.stdout.flush()
+    _serve(proxy)
+
+
+def watch(args):
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(args.path)
+    try:
+        for line in sock.makefile("r"):
+            sys.stdout.write(line)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+def bench_tcp(args):
+    from granola.tcp_server import benchmark
+
+    def factory():
+        return Cereal.mock_from_json(config_key=args.config_key, config_path=args.config_path)
+
+    command = _unescape(args.command)
+    result = benchmark(factory, command, clients=args.clients, commands=args.commands)
+    print(
+        "{commands} commands from {clients} clients in {seconds:.3f}s: {commands_per_second:.0f} commands/s".format(
+            **result
+        )
+    )
+
+
+def compile_command(args):
+    import json
+
+    from granola.bundles import benchmark, compile_bundle
+
+    config_keys = args.config_keys
+    if not config_keys:
+        with open(args.config_path) as f:
+            config_keys = list(json.load(f))
+    for config_key in config_keys:
+        output_path = None
+        if args.outdir:
+            output_path = os.path.join(args.outdir, config_key + ".granola")
+        bundle_path = compile_bundle(config_key, config_path=args.config_path, output_path=output_path)
+        print(bundle_path)
+        if args.benchmark:
+            result = benchmark(config_key, config_path=args.config_path, bundle_path=bundle_path)
+            print(
+                "  start up from CSV {csv_seconds:.4f}s, from bundle {bundle_seconds:.4f}s: {speedup:.1f}x faster"
+                .format(**result)
+            )
+        sys.stdout.flush()
+
+
+def import_sqlite(args):
+    from granola.sqlite_store import import_csv
+
+    fields = {}
+    for field in args.field:
+        name, _, value = field.partition("=")
+        fields[name] = value
+    print(import_csv(args.database, args.csv_paths, **fields))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m granola", description="Serve mocked serial devices")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log more, can be repeated")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    pty_parser = commands.add_parser("pty", help="serve devices on pseudo terminals, printing one slave path per line")
+    _add_device_arguments(pty_parser)
+    pty_parser.set_defaults(func=pty)
+
+    for name, func, help in (
+        ("tcp", tcp, "serve devices over TCP, printing one socket:// URL per port"),
+        ("rfc2217", rfc2217, "serve devices over RFC 2217, printing one rfc2217:// URL per port"),
+    ):
+        tcp_parser = commands.add_parser(name, help=help)
+        _add_device_arguments(tcp_parser)
+        tcp_parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: %(default)s)")
+        tcp_parser.add_argument("--port", type=int, default=0, help="first port to listen on (default: any free port)")
+        tcp_parser.add_argument(
+            "--per-connection", action="store_true", help="serve every device on one port, a device per connection"
+        )
+        tcp_parser.set_defaults(func=func)
+
+    sniff_parser = commands.add_parser(
+        "sniff", help="proxy a port through a pseudo terminal, recording the traffic, printing the terminal's path"
+    )
+    sniff_parser.add_argument("port", help="port or pyserial URL to proxy")
+    sniff_parser.add_argument("--baudrate", type=int, default=9600, help="baud rate (default: %(default)s)")
+    sniff_parser.add_argument("--outfile", default="", help="CSV to record to (default: timestamped, after the port)")
+    sniff_parser.add_argument("--write-terminator", default=r"\r", help=r"end of a command (default: '\r')")
+    sniff_parser.add_argument("--read-terminator", default=r"\r>", help=r"end of a response (default: '\r>')")
+    sniff_parser.set_defaults(func=sniff)
+
+    watch_parser = commands.add_parser("watch", help="print the transcript streamed to a UnixSocketSubscriber")
+    watch_parser.add_argument("path", help="path of the UnixSocketSubscriber's socket")
+    watch_parser.set_defaults(func=watch)
+
+    bench_parser = commands.add_parser("bench-tcp", help="loopback benchmark of commands per second over TCP")
+    bench_parser.add_argument("config_path", help="JSON configuration file")
+    bench_parser.add_argument("config_key", help="key of the device configuration in the configuration file")
+    bench_parser.add_argument("--command", required=True, help=r"command to send, with escapes, such as 'get\r'")
+    bench_parser.add_argument("--clients", type=int, default=100, help="concurrent connections (default: %(default)s)")
+    bench_parser.add_argument("--commands", type=int, default=100, help="commands per client (default: %(default)s)")
+    bench_parser.set_defaults(func=bench_tcp)
+
+    compile_parser = commands.add_parser(
+        "compile", help="compile device configurations into bundles that start faster, printing each bundle's path"
+    )
+    compile_parser.add_argument("config_path", help="JSON configuration file")
+    compile_parser.add_argument("config_keys", nargs="*", help="keys of the devices to compile (default: every key)")
+    compile_parser.add_argument("--outdir", help="directory to write the bundles to (default: the configuration's)")
+    compile_parser.add_argument(
+        "--benchmark", action="store_true", help="compare how long devices take to start from CSVs and from bundles"
+    )
+    compile_parser.set_defaults(func=compile_command)
+
+    import_parser = commands.add_parser(
+        "import-sqlite", help="import canned query CSVs into a SQLite database, printing the number of rows imported"
+    )
+    import_parser.add_argument("database", help="SQLite database, created if it doesn't exist")
+    import_parser.add_argument("csv_paths", nargs="+", help="CSV files to import, such as serial sniffer captures")
+    import_parser.add_argument(
+        "--field",
+        action="append",
+        default=[],
+        help="name=value stored in every imported row, to pick the rows to use later, such as firmware=1.2.0",
+    )
+    import_parser.set_defaults(func=import_sqlite)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=max(logging.WARNING - 10 * args.verbose, logging.DEBUG))
+    return args.func(args)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -1,17 +1,23 @@
+import functools
 import inspect
 import json
 import logging
 import os
+import threading
 from collections import OrderedDict
+from timeit import default_timer as timer
 
 from serial import Serial
 
+from granola.clocks import real_seconds_until, sleep_until
 from granola.command_readers import BaseCommandReaders, CannedQueries, GettersAndSetters
+from granola.file_responses import FileResponse, ResponseStream
 from granola.hooks.base_hook import (
     BaseHook,
     _run_post_reading_hooks,
     _run_pre_reading_hooks,
 )
+from granola.transcript import Transcript
 from granola.utils import (
     IS_PYTHON3,
     SENTINEL,
@@ -35,6 +41,17 @@ except ImportError:  # pragma: no cover
 logger = logging.getLogger(__name__)
 
 
+def _locked(method):
+    """Run ``method`` holding the device's lock, so that it never sees command readers part way through reloading"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock_:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class Cereal(Serial):
     r"""
     Mock :std:doc:`Pyserial's <pyserial:index>` :class:`Serial <pyserial:serial.Serial>` class
@@ -92,6 +109,12 @@ class Cereal(Serial):
         encoding(str, optional): The encoding scheme used to encode the serial commands and responses
             Defaults to "ascii"
 
+        clock (callable, optional): Function that returns the current time in seconds, such as :func:`time.time`,
+            a :class:`~granola.clocks.ScaledClock` or a :class:`~granola.clocks.VirtualClock`, to hold back
+            responses with a delay (such as canned queries with a ``delay(ms)``) on. A response can't be read until
+            its delay has passed on the clock, and reads wait for it (up to the port's ``timeout``), except on a
+            virtual clock, which has to be advanced. Defaults to None, responses are never delayed
+
     See Also
     --------
     :meth:`.mock_from_json` : Constructor from external configuration file
@@ -185,6 +208,7 @@ class Cereal(Serial):
         unsupported_response="Unsupported\r>",
         write_terminator="\r",
         encoding="ascii",
+        clock=None,
     ):
         self._data_path_root = (
             data_path_root if data_path_root is not None else os.path.join(os.getcwd(), "config.json")
@@ -195,10 +219,16 @@ class Cereal(Serial):
         self._unsupported_response = unsupported_response
         self._encoding = encoding
         self._write_terminator = write_terminator
+        self._clock = clock
+        self._read_ready_at = None  # clock time the response can be read from, while it is delayed
 
         self._readers_ = self._setup_command_readers_and_hooks(command_readers, hooks)
 
         self._hooks_ = []
+        self._metrics_ = None  # DeviceMetrics, set when added to a Fleet
+        self._transcript_ = None  # Transcript, set when subscribed to
+        self._config_source_ = None  # (config_key, config_path), set when made with mock_from_json
+        self._lock_ = threading.RLock()  # held while writing and reloading, which a FileWatcher does from its thread
         self._next_read = ""  # The next read for this "serial" device
         self._next_write = ""  # The current write buffer to the serial device
 
@@ -220,6 +250,23 @@ class Cereal(Serial):
         kwargs.update(config)
         if "data_path_root" not in kwargs:
             kwargs["data_path_root"] = config_path
+        cereal = cls(**kwargs)
+        cereal._config_source_ = (config_key, fixpath(get_path(config_path)))
+        return cereal
+
+    @classmethod
+    def mock_from_bundle(cls, bundle_path, **kwargs):
+        """
+        Load the configuration, and canned queries, compiled into a bundle by :func:`~granola.bundles.compile_bundle`
+        (or ``python -m granola compile``) and return a Breakfast Cereal class. The canned queries are
+        memory mapped from the bundle, rather than read from CSV files.
+        """
+        from granola.bundles import read_bundle_config
+
+        config = read_bundle_config(bundle_path)
+        kwargs.update(config)
+        if "data_path_root" not in kwargs:
+            kwargs["data_path_root"] = bundle_path
         return cls(**kwargs)
 
     @classmethod
@@ -238,6 +285,45 @@ class Cereal(Serial):
         config = config[config_key]
         return config
 
+    @_locked
+    def reload_config(self):
+        """
+        Load the configuration of a device made with :meth:`mock_from_json` again, and update each of its command
+        readers from their new options with :meth:`~granola.command_readers.BaseCommandReaders.reload_config`,
+        keeping their hooks, and as much of their state (such as the cursors of canned queries that haven't
+        changed) as they can. Command readers can't be added or removed, and hooks aren't reloaded.
+
+        Raises:
+            ValueError: If the device wasn't made with :meth:`mock_from_json`
+        """
+        if self._config_source_ is None:
+            raise ValueError("%s wasn't made from a JSON configuration to reload" % self)
+        config_key, config_path = self._config_source_
+        config = self._load_json_config(config_key=config_key, config_path=config_path)
+        command_readers = config.get("command_readers", {})
+        if not isinstance(command_readers, dict):
+            logger.warning("%s can only reload command readers configured with options", self)
+            return
+        for name, options in command_readers.items():
+            name = name if isinstance(name, str) else name.__name__
+            if name not in self._readers_:
+                logger.warning("%s can't add the %s command reader when reloading", self, name)
+                continue
+            logger.info("%s reloading %s", self, name)
+            self._readers_[name].reload_config(**options)
+
+    def watch(self, interval=1.0):
+        """
+        Reload the configuration (when made with :meth:`mock_from_json`) and canned query files of this device when
+        they change, polling them every ``interval`` seconds from a background thread. See :mod:`granola.hot_reload`.
+
+        Returns:
+            FileWatcher: the started watcher, to :meth:`~granola.hot_reload.FileWatcher.stop`
+        """
+        from granola.hot_reload import FileWatcher
+
+        return FileWatcher(self, interval=interval).start()
+
     def __call__(self, *args, **kwargs):
         """
         Method to initialize pyserial Serial object. Serperating out the initialization of
@@ -266,6 +352,35 @@ class Cereal(Serial):
 
         return self
 
+    def subscribe(self, subscriber):
+        """
+        Stream every command this device processes, with its response, to ``subscriber``, such as a
+        :class:`~granola.transcript.QueueSubscriber` or :class:`~granola.transcript.UnixSocketSubscriber`.
+        See :mod:`granola.transcript`.
+
+        Returns:
+            the subscriber
+        """
+        if self._transcript_ is None:
+            self._transcript_ = Transcript()
+        return self._transcript_.subscribe(subscriber)
+
+    def unsubscribe(self, subscriber):
+        """Stop streaming to ``subscriber``. Raises ValueError if it isn't subscribed."""
+        if self._transcript_ is None:
+            raise ValueError("%r is not subscribed to %s" % (subscriber, self))
+        self._transcript_.unsubscribe(subscriber)
+
+    def __getstate__(self):
+        """Leave out the lock, a new one is made when loaded"""
+        state = self.__dict__.copy()
+        del state["_lock_"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock_ = threading.RLock()
+
     def __str__(self):
         port = getattr(self, "port", "")
         port_str = " on %s" % port if port else ""
@@ -274,7 +389,13 @@ class Cereal(Serial):
     def read(self, size=1):
         """Mock :meth:`pyserial:serial.Serial.read`. Return number of bytes in self._next_read based on `size`"""
         read = bytearray()
-        if size > 0:
+        if self._is_delayed() and not sleep_until(self._clock, self._read_ready_at, getattr(self, "_timeout", 0)):
+            size = 0  # still held back
+        if isinstance(self._next_read, ResponseStream):  # streamed from a file
+            read = self._next_read.read(size) if size > 0 else b""
+            if not len(self._next_read):
+                self._clear_input()
+        elif size > 0:
             self._next_read = encode_to_bytes(self._next_read, self._encoding)
             while len(read) < size and len(self._next_read):
                 read.append(self._next_read[0])
@@ -283,8 +404,12 @@ class Cereal(Serial):
 
         logger.info("%s read: %r", self, read)
 
+        if self._metrics_ is not None:
+            self._metrics_.bytes_out(len(read))
+
         return read
 
+    @_locked
     def write(self, data):
         """
         Mock :meth:`pyserial:serial.Serial.write` by seeding a serial command generator
@@ -296,7 +421,11 @@ class Cereal(Serial):
 
         self._verify_open()
 
+        if self._metrics_ is not None:
+            self._metrics_.bytes_in(len(data))
+
         data = decode_bytes(data)
+        published = None  # the last command processed, and its response, to publish to the transcript
 
         for d in data:
             self._next_write += d
@@ -304,7 +433,9 @@ class Cereal(Serial):
                 # Based on observation, writes with multiple carriage returns only return the result up to the first
                 # So data after the first terminator is basically ignored
 
+                start = timer() if self._metrics_ is not None else None
                 next_read = None
+                self._clear_input()  # anything not read yet is replaced by the response
                 _run_pre_reading_hooks(hooked=self, data=self._next_write)
 
                 for reader in self._readers_.values():
@@ -313,6 +444,10 @@ class Cereal(Serial):
                         self._next_read = next_read
                         break
 
+                delay = getattr(next_read, "delay", 0)
+                if self._clock is not None and delay:
+                    self._read_ready_at = self._clock() + delay
+
                 if next_read is None or next_read is SENTINEL:
                     self._next_read = self._unsupported_response
                     # If a response is not handled by the hooks and returns SENTINEL, return unsupported with warning
@@ -320,8 +455,21 @@ class Cereal(Serial):
 
                         logger.warning("%s unhandled response return from hooks. Defaulting to Unsupported Response!")
 
+                unsupported = next_read is None or next_read is SENTINEL
+                if start is not None:
+                    self._metrics_.command(self._next_write, timer() - start, unsupported)
+                if self._transcript_ is not None:
+                    if published is not None:  # an earlier command in this write, whose response has been given
+                        self._transcript_.publish(self, *published)
+                    published = (self._next_write, self._next_read, unsupported)
+
                 self._next_write = ""  # once we grab the next read, clear the next write
         self._next_read = _run_post_reading_hooks(hooked=self, result=self._next_read, data=self._next_write)
+        if published is not None:  # subscribers see the response as it will be read, after the post reading hooks
+            command, _, unsupported = published
+            self._transcript_.publish(self, command, self._next_read, unsupported)
+        if isinstance(self._next_read, FileResponse):
+            self._next_read = self._next_read.open()
         return len(data)
 
     if check_min_package_version("pyserial", "3.0"):
@@ -400,14 +548,100 @@ class Cereal(Serial):
     def open(self):  # TODO madeline raise SerialException error if _port is none or if already open
         self._is_open = True
 
+    # Modem status lines the mocked device drives, set ``cts``, ``dsr``, ``ri`` and ``cd`` to change them
+    _cts = True
+    _dsr = True
+    _ri = False
+    _cd = True
+
+    @property
+    def cts(self):
+        """Mock pyserial's Clear To Send line"""
+        self._verify_open()
+        return self._cts
+
+    @cts.setter
+    def cts(self, value):
+        self._cts = bool(value)
+
+    @property
+    def dsr(self):
+        """Mock pyserial's Data Set Ready line"""
+        self._verify_open()
+        return self._dsr
+
+    @dsr.setter
+    def dsr(self, value):
+        self._dsr = bool(value)
+
+    @property
+    def ri(self):
+        """Mock pyserial's Ring Indicator line"""
+        self._verify_open()
+        return self._ri
+
+    @ri.setter
+    def ri(self, value):
+        self._ri = bool(value)
+
+    @property
+    def cd(self):
+        """Mock pyserial's Carrier Detect line"""
+        self._verify_open()
+        return self._cd
+
+    @cd.setter
+    def cd(self, value):
+        self._cd = bool(value)
+
+    def _update_dtr_state(self):
+        """Bypassing pyserial setting the DTR line on a real port, ``dtr`` keeps its value"""
+        logger.debug("%s DTR: %s", self, self._dtr_state)
+
+    def _update_rts_state(self):
+        """Bypassing pyserial setting the RTS line on a real port, ``rts`` keeps its value"""
+        logger.debug("%s RTS: %s", self, self._rts_state)
+
+    def _update_break_state(self):
+        """Bypassing pyserial setting the break condition on a real port, ``break_condition`` keeps its value"""
+        logger.debug("%s break condition: %s", self, self._break_state)
+
+    def send_break(self, duration=0.25):
+        """Mock pyserial's send_break without waiting out the break ``duration``"""
+        self._verify_open()
+        logger.debug("%s send break for %ss", self, duration)
+
     def _clear_input(self):
+        if isinstance(self._next_read, ResponseStream):
+            self._next_read.close()
         self._next_read = ""
+        self._read_ready_at = None
+
+    def _is_delayed(self):
+        """Whether the response is being held back, until its delay has passed on the clock"""
+        if self._read_ready_at is None:
+            return False
+        if self._clock() >= self._read_ready_at:
+            self._read_ready_at = None
+            return False
+        return True
+
+    def _delay_left(self):
+        """
+        Real seconds until the response can be read: 0 if it isn't held back, or None if it is held back on a
+        :class:`~granola.clocks.VirtualClock`, and only advancing the clock will release it.
+        """
+        if not self._is_delayed():
+            return 0
+        return real_seconds_until(self._clock, self._read_ready_at)
 
     def _clear_output(self):
         self._next_write = ""
 
     @property
     def _in_waiting(self):
+        if self._is_delayed():
+            return 0
         return len(self._next_read)
 
     @property
@@ -0,0 +1,346 @@
+import copy
+import json
+import logging
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+import numpy as np
+
+from granola.command_table import CommandTable, _FilledColumn, _is_missing
+from granola.utils import IS_PYTHON3, get_path
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_SUFFIX = ".granola"
+BUNDLE_VERSION = 1
+_MAGIC = b"GRNLBNDL"
+_PREAMBLE = struct.Struct("<8sIIQ")  # magic, version, flags, length of the JSON header
+_ALIGNMENT = 8
+
+# CannedQueries options that aren't extra fields, and are kept in a bundle's configuration
+_CANNED_QUERIES_OPTIONS = ("seed", "will_randomize_responses", "hooks")
+
+
+class BundleCommandTable(CommandTable):
+    """
+    Table of canned serial commands from a bundle made by :func:`compile_bundle`. The bundle is memory mapped,
+    and already holds the commands grouped together, and every value decoded, so opening it doesn't read or
+    decode any rows, and each value is only read when it is used.
+
+    Args:
+        path (str): Path to the bundle.
+
+    Raises:
+        ValueError: If the file isn't a bundle, or is from a newer version of GRANOLA.
+    """
+
+    lazy = True
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.extra_fields = OrderedDict()
+        self._open()
+
+    def __len__(self):
+        return self.rows
+
+    def __getstate__(self):
+        return {"path": self.path, "extra_fields": self.extra_fields}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def add_fields(self, **fields):
+        """Add extra fields, as for :meth:`CommandTable.add_fields`, without reading the rows"""
+        for name, value in fields.items():
+            if isinstance(value, (list, tuple)) and len(value) != len(self):
+                raise ValueError("Length of values (%s) does not match number of rows (%s)" % (len(value), len(self)))
+            self.extra_fields[name] = value
+            self.columns[name] = self._values(name, np.arange(self.rows))
+
+    def index(self, column="response"):
+        return OrderedDict(
+            (cmd, self._values(column, self._row_order[start:end]))
+            for cmd, start, end in zip(self.commands, self._group_starts[:-1], self._group_starts[1:])
+        )
+
+    def to_dataframe(self):
+        """The whole bundle as a pandas DataFrame (requires pandas)"""
+        return CommandTable(OrderedDict((name, list(column)) for name, column in self.columns.items())).to_dataframe()
+
+    def _open(self):
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = read_bundle_header(self.path, self._mmap)
+        self.config = self.header["config"]
+        self.rows = self.header["rows"]
+        self.commands = self.header["commands"]
+        self.patterns = self.header.get("patterns")  # None if they weren't stored, and the rows have to be scanned
+        self._start = _aligned(_PREAMBLE.size + self.header["length"])
+        self._row_order = self._array(self.header["row_order"], np.int64)
+        self._group_starts = self._array(self.header["group_starts"], np.int64)
+        names = list(self.header["columns"]) + [
+            name for name in self.extra_fields if name not in self.header["columns"]
+        ]
+        self.columns = OrderedDict((name, self._values(name, np.arange(self.rows))) for name in names)
+
+    def _array(self, section, dtype):
+        return np.frombuffer(self._mmap, dtype=dtype, count=section["count"], offset=self._start + section["offset"])
+
+    def _values(self, column, rows):
+        spec = self.header["columns"].get(column)
+        if spec is None:
+            values = None
+        elif spec["type"] == "float":
+            values = self._array(spec["values"], np.float64)[rows]
+        else:
+            values = _BundleColumn(self, spec, rows)
+        if column in self.extra_fields:
+            return _FilledColumn(values, self.extra_fields[column], rows)
+        return values
+
+
+class _BundleColumn(object):
+    """Sequence of the text (or JSON) values of one column of a :class:`BundleCommandTable`, in some of its rows"""
+
+    def __init__(self, table, spec, rows):
+        self.table = table
+        self.spec = spec
+        self.rows = rows
+        self._offsets = table._array(spec["offsets"], np.int64)
+        self._text = table._start + spec["text"]["offset"]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        row = self.rows[i]
+        start, end = self._text + self._offsets[row], self._text + self._offsets[row + 1]
+        value = self.table._mmap[start:end].decode("utf-8")
+        return json.loads(value) if self.spec["type"] == "json" else value
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def write_bundle(path, table, config=None, patterns=None):
+    """
+    Write a :class:`~granola.command_table.CommandTable` of canned serial commands, and the configuration of the
+    device it is for, to a bundle at ``path``. ``patterns`` are the commands of the table that are patterns, with
+    the :class:`~granola.enums.CommandMatch` name of each, if they are known, so that loading the bundle doesn't
+    scan its ``match`` column for them.
+
+    The bundle starts with a fixed size preamble (magic bytes, format version, flags and the length of a JSON header),
+    followed by the JSON header describing the sections after it: the row numbers grouped by command, where each
+    command's group starts, and each column. Numeric extra fields are stored as float64 arrays, and every other column
+    as int64 offsets into a block of UTF-8 text (JSON encoded, unless every value is a string).
+    """
+    rows = len(table)
+    groups = OrderedDict()
+    for row, cmd in enumerate(table["cmd"]):
+        if not _is_missing(cmd):
+            groups.setdefault(cmd, []).append(row)
+    row_order = [row for group in groups.values() for row in group]
+    group_starts = np.cumsum([0] + [len(group) for group in groups.values()])
+
+    sections = []  # bytes of each section, in order
+    size = [0]
+
+    def add_section(data, count):
+        sections.append(data)
+        section = {"offset": size[0], "count": count}
+        size[0] += _aligned(len(data))
+        return section
+
+    columns = OrderedDict()
+    for name, values in table.columns.items():
+        values = list(values)
+        if name not in ("cmd", "response") and all(_is_number(value) for value in values):
+            columns[name] = {"type": "float", "values": add_section(np.array(values, dtype=np.float64).tobytes(), rows)}
+            continue
+        kind = "text" if all(isinstance(value, str) for value in values) else "json"
+        encoded = [(value if kind == "text" else json.dumps(value)).encode("utf-8") for value in values]
+        offsets = np.cumsum([0] + [len(value) for value in encoded], dtype=np.int64)
+        columns[name] = {
+            "type": kind,
+            "offsets": add_section(offsets.tobytes(), rows + 1),
+            "text": add_section(b"".join(encoded), len(encoded)),
+        }
+
+    header = {
+        "config": config if config is not None else {},
+        "rows": rows,
+        "commands": list(groups),
+        "row_order": add_section(np.array(row_order, dtype=np.int64).tobytes(), len(row_order)),
+        "group_starts": add_section(np.array(group_starts, dtype=np.int64).tobytes(), len(group_starts)),
+        "columns": columns,
+    }
+    if patterns is not None:  # otherwise the match column is scanned for them as the bundle is loaded
+        header["patterns"] = patterns
+    encoded_header = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(_MAGIC, BUNDLE_VERSION, 0, len(encoded_header)))
+        f.write(encoded_header)
+        f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+        for data in sections:
+            f.write(data)
+            f.write(b"\0" * (_aligned(len(data)) - len(data)))
+    return path
+
+
+def read_bundle_header(path, data=None):
+    """
+    The JSON header of the bundle at ``path``, including the ``"config"`` of the device it is for.
+
+    Raises:
+        ValueError: If the file isn't a bundle, or is from a newer version of GRANOLA.
+    """
+    if data is None:
+        with open(path, "rb") as f:
+            preamble = f.read(_PREAMBLE.size)
+            magic, version, _, length = _unpack_preamble(path, preamble)
+            header = f.read(length)
+    else:
+        magic, version, _, length = _unpack_preamble(path, data[: _PREAMBLE.size])
+        header = data[_PREAMBLE.size : _PREAMBLE.size + length]
+    if IS_PYTHON3:
+        header = json.loads(header.decode("utf-8"), object_pairs_hook=OrderedDict)
+    else:  # pragma: no cover
+        header = json.loads(header, object_pairs_hook=OrderedDict)
+    header["length"] = length
+    header["version"] = version
+    return header
+
+
+def _unpack_preamble(path, preamble):
+    if len(preamble) < _PREAMBLE.size or not preamble.startswith(_MAGIC):
+        raise ValueError("%s is not a GRANOLA bundle" % path)
+    preamble = _PREAMBLE.unpack(preamble)
+    if preamble[1] > BUNDLE_VERSION:
+        raise ValueError(
+            "%s is a version %s bundle, this version of GRANOLA reads up to version %s"
+            % (path, preamble[1], BUNDLE_VERSION)
+        )
+    return preamble
+
+
+def read_bundle_config(path):
+    """
+    Configuration of the device the bundle at ``path`` is for, as passed to
+    :class:`~granola.breakfast_cereal.Cereal`, with its canned queries read from the bundle.
+    """
+    config = read_bundle_header(path)["config"]
+    readers = config.get("command_readers")
+    if isinstance(readers, dict) and "CannedQueries" in readers:
+        readers["CannedQueries"]["data"] = [get_path(path)]
+    return config
+
+
+def compile_bundle(config_key, config_path="config.json", output_path=None):
+    """
+    Compile the device configuration at ``config_key`` in the JSON configuration at ``config_path`` into a bundle
+    that :meth:`Cereal.mock_from_bundle <granola.breakfast_cereal.Cereal.mock_from_bundle>` loads without
+    reading any CSV files. The canned queries, from every file and dictionary, with their extra fields, are
+    stored in the bundle already decoded and grouped by command, along with which commands are patterns, and the rest
+    of the configuration (getters and setters, hooks and other options) is stored as it is. The patterns' regular
+    expressions and templates are still compiled as the bundle is loaded, as compiled regular expressions can't be
+    stored, but that doesn't read any rows. The configuration is checked while it is compiled,
+    so the getters and setters aren't checked again every time the bundle is loaded.
+
+    Args:
+        config_key (str): Key of the device configuration.
+        config_path (str, optional): JSON configuration file. Defaults to "config.json"
+        output_path (str, optional): Where to write the bundle. Defaults to ``<config_key>.granola`` next to the
+            configuration file
+
+    Returns:
+        str: Path of the bundle.
+    """
+    from granola.breakfast_cereal import Cereal
+
+    config = copy.deepcopy(Cereal._load_json_config(config_key=config_key, config_path=config_path))
+    if output_path is None:
+        output_path = os.path.join(os.path.dirname(get_path(config_path)), config_key + BUNDLE_SUFFIX)
+
+    # Make the device once, with its canned queries read into a CommandTable, which also checks its configuration
+    loading = copy.deepcopy(config)
+    loading.setdefault("data_path_root", config_path)
+    readers = loading.get("command_readers")
+    if isinstance(readers, dict) and "CannedQueries" in readers:
+        readers["CannedQueries"]["backend"] = "csv"
+    cereal = Cereal(**loading)
+
+    table, patterns = CommandTable(), None
+    readers = config.get("command_readers")
+    if isinstance(readers, dict):
+        if "CannedQueries" in readers:
+            table = CommandTable.concat([cereal._readers_["CannedQueries"].serial_table])
+            patterns = cereal._readers_["CannedQueries"]._patterns
+            readers["CannedQueries"] = OrderedDict(
+                (key, value) for key, value in readers["CannedQueries"].items() if key in _CANNED_QUERIES_OPTIONS
+            )
+        if "GettersAndSetters" in readers:
+            readers["GettersAndSetters"]["validate"] = False
+
+    write_bundle(output_path, table, config, patterns)
+    logger.info("Compiled %s from %s into %s, %s canned queries", config_key, config_path, output_path, len(table))
+    return output_path
+
+
+def benchmark(config_key, config_path="config.json", bundle_path=None, repeat=20):
+    """
+    Compare how long it takes to make a :class:`~granola.breakfast_cereal.Cereal` from its JSON configuration and
+    CSV files, and from a bundle compiled from the same configuration. Each is timed ``repeat`` times,
+    and the fastest time is kept.
+
+    Args:
+        config_key (str): Key of the device configuration.
+        config_path (str, optional): JSON configuration file. Defaults to "config.json"
+        bundle_path (str, optional): The bundle, compiled if it is None. Defaults to None
+        repeat (int, optional): Number of times to make each. Defaults to 20
+
+    Returns:
+        dict: ``{"csv_seconds": float, "bundle_seconds": float, "speedup": float}``
+    """
+    from granola.breakfast_cereal import Cereal
+
+    if bundle_path is None:
+        bundle_path = compile_bundle(config_key, config_path)
+
+    def fastest(make):
+        times = []
+        for _ in range(repeat):
+            start = timer()
+            make()
+            times.append(timer() - start)
+        return min(times)
+
+    csv_seconds = fastest(lambda: Cereal.mock_from_json(config_key, config_path=config_path))
+    bundle_seconds = fastest(lambda: Cereal.mock_from_bundle(bundle_path))
+    return {"csv_seconds": csv_seconds, "bundle_seconds": bundle_seconds, "speedup": csv_seconds / bundle_seconds}
+
+
+def _aligned(size):
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
+__doc__ = """
+Compile device configurations, and the canned queries in their CSV files, into bundles that are memory mapped
+when they are loaded, so devices start without reading or decoding any CSV files. Also available from the
+command line, along with a comparison of how long devices take to start from the CSV files and from the bundle::
+
+    python -m granola compile config.json cereal --benchmark
+"""
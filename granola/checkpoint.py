@@ -0,0 +1,201 @@
+import logging
+import os
+import pickle
+import struct
+import zlib
+
+from granola.utils import replace_file
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GRANOLA-CHECKPOINT"
+VERSION = 2  # devices pickled by older versions of GRANOLA can't be resumed
+_HEADER = struct.Struct("<18sHB")  # magic, version, compressed flag
+
+
+class CheckpointError(ValueError):
+    """Raised when a checkpoint file can't be read"""
+
+
+def save_checkpoint(fleet, path, compress=True):
+    """
+    Save the complete mutable state of a :class:`~granola.fleet.Fleet` to ``path``.
+
+    This includes every device (attribute values, canned query positions, hook state and the
+    already parsed canned queries themselves, so resuming never touches the original configs or CSVs),
+    the fleet's transitions and signals, and its clock, including any events still pending on a
+    :class:`~granola.clocks.VirtualClock`.
+
+    The checkpoint is streamed to disk one device at a time, so saving a large fleet doesn't need a second copy of
+    it in memory. It is written to a temporary file next to ``path`` that replaces ``path`` only once it is complete,
+    so a crash while saving leaves the previous checkpoint intact.
+
+    Args:
+        fleet (Fleet): The fleet to save.
+        path (str): Where to save the checkpoint.
+        compress (bool, optional): Whether to zlib compress the checkpoint. Defaults to True
+
+    Returns:
+        str: ``path``
+    """
+    path = str(path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, int(compress)))
+        stream = _CompressedWriter(f) if compress else f
+        # A single pickler for every record keeps objects shared between records (such as the
+        # readers a TransitionEngine is keyed by) shared after resuming.
+        pickler = pickle.Pickler(stream, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.dump({"devices": len(fleet.devices)})
+        for device in fleet.devices:
+            pickler.dump(device)
+        pickler.dump(fleet._checkpoint_state())
+        pickler.dump(len(fleet.devices))  # end marker, lets resume detect a truncated checkpoint
+        if compress:
+            stream.close()
+        f.flush()
+        os.fsync(f.fileno())
+    replace_file(tmp_path, path)
+    logger.debug("Saved checkpoint of %s devices to %s", len(fleet.devices), path)
+    return path
+
+
+def load_checkpoint(path, fleet_class=None):
+    """
+    Resume a :class:`~granola.fleet.Fleet` saved with :func:`save_checkpoint`.
+
+    .. warning::
+
+        Checkpoints are pickles, and loading one can run any code in it, so only load checkpoints you saved yourself,
+        or otherwise trust. The format version in the header only tells checkpoints from other versions of GRANOLA
+        apart, it doesn't make a checkpoint safe to load, nor does it notice devices whose classes have changed
+        since they were saved.
+
+    Args:
+        path (str): Path of the checkpoint.
+        fleet_class (type, optional): Fleet class to resume as. Defaults to :class:`~granola.fleet.Fleet`
+
+    Returns:
+        Fleet: the resumed fleet.
+
+    Raises:
+        CheckpointError: if ``path`` isn't a checkpoint, was written with another checkpoint format version (older or
+            newer), or is truncated.
+    """
+    if fleet_class is None:
+        from granola.fleet import Fleet as fleet_class
+
+    with open(str(path), "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise CheckpointError("%s is not a GRANOLA checkpoint" % path)
+        magic, version, compressed = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise CheckpointError("%s is not a GRANOLA checkpoint" % path)
+        if version > VERSION:
+            raise CheckpointError("%s is checkpoint version %s, newer than supported %s" % (path, version, VERSION))
+        if version < VERSION:
+            raise CheckpointError(
+                "%s is checkpoint version %s, saved by an older GRANOLA that this one can't resume (supported %s)"
+                % (path, version, VERSION)
+            )
+        stream = _CompressedReader(f) if compressed else f
+        unpickler = pickle.Unpickler(stream)
+        try:
+            count = unpickler.load()["devices"]
+            devices = [unpickler.load() for _ in range(count)]
+            state = unpickler.load()
+            end = unpickler.load()
+        except (EOFError, pickle.UnpicklingError, zlib.error) as err:
+            raise CheckpointError("%s is truncated or corrupt: %r" % (path, err))
+        if end != count:
+            raise CheckpointError("%s is truncated or corrupt" % path)
+
+    logger.debug("Loaded checkpoint of %s devices from %s", count, path)
+    return fleet_class._from_checkpoint_state(devices, state)
+
+
+class _CompressedWriter(object):
+    """Minimal file like object that zlib compresses everything written to it"""
+
+    def __init__(self, f, level=6):
+        self._f = f
+        self._compressor = zlib.compressobj(level)
+
+    def write(self, data):
+        self._f.write(self._compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        self._f.write(self._compressor.flush())
+
+
+class _CompressedReader(object):
+    """Minimal file like object that decompresses a zlib stream for pickle"""
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj()
+        self._buffer = bytearray()
+
+    def _fill(self, size):
+        while len(self._buffer) < size:
+            chunk = self._f.read(self._chunk_size)
+            if not chunk:
+                self._buffer += self._decompressor.flush()
+                break
+            self._buffer += self._decompressor.decompress(chunk)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            self._fill(float("inf"))
+            size = len(self._buffer)
+        else:
+            self._fill(size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def readline(self):
+        self._fill(1)
+        while b"\n" not in self._buffer:
+            size = len(self._buffer)
+            self._fill(size + self._chunk_size)
+            if len(self._buffer) == size:
+                break
+        index = self._buffer.find(b"\n")
+        return self.read(index + 1 if index >= 0 else len(self._buffer))
+
+
+__doc__ = """
+Save a :class:`~granola.fleet.Fleet` to disk and resume it later, so long running simulations can be paused
+and survive crashes.
+
+Checkpoints are pickles, so only load checkpoints you trust: loading one can run any code in it. Unlike the saved
+indexes of memory mapped canned queries, which are never unpickled, a checkpoint from someone else is as dangerous as
+running their code.
+
+>>> import os, tempfile
+>>> from granola import Cereal, Fleet, VirtualClock
+>>> clock = VirtualClock()
+>>> fleet = Fleet([Cereal({"CannedQueries": {"data": [{"1\\r": ["1a", "1b"]}]}})], clock=clock)
+>>> fleet[0].write(b"1\\r")
+2
+>>> fleet[0].read(2)
+b'1a'
+>>> clock.advance(3600)
+>>> path = save_checkpoint(fleet, os.path.join(tempfile.mkdtemp(), "fleet.ckpt"))
+>>> resumed = load_checkpoint(path)
+>>> resumed.clock()
+3600.0
+>>> resumed[0].write(b"1\\r")
+2
+>>> resumed[0].read(2)
+b'1b'
+"""
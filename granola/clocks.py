@@ -0,0 +1,141 @@
+import heapq
+import logging
+import time
+from timeit import default_timer as timer
+
+logger = logging.getLogger(__name__)
+
+
+class VirtualClock(object):
+    """
+    A clock whose time only moves when it is told to, for running simulations in virtual time.
+    Calling the clock returns the current virtual time in seconds, so it can be used anywhere a
+    clock function such as :func:`time.time` is expected (:class:`~granola.fleet.Fleet`,
+    :class:`~granola.hooks.transitions.TransitionEngine`, ...).
+
+    Events can be scheduled on the clock, and run in time order as :meth:`advance` moves time past them.
+    Pending events are saved with :mod:`checkpoints <granola.checkpoint>`, so their callbacks
+    must be picklable (module level functions, or methods of picklable objects).
+
+    Args:
+        start (float, optional): The starting time in seconds. Defaults to 0
+
+    Examples
+    --------
+    >>> clock = VirtualClock()
+    >>> clock.call_later(5, print, "five seconds later")
+    >>> clock()
+    0.0
+    >>> clock.advance(10)
+    five seconds later
+    >>> clock()
+    10.0
+    """
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+        self._events = []  # heap of (when, order, callback, args)
+        self._order = 0
+
+    def __call__(self):
+        return self.now
+
+    def __repr__(self):
+        return "{cls}(now={now!r}, pending={pending})".format(
+            cls=self.__class__.__name__, now=self.now, pending=len(self._events)
+        )
+
+    @property
+    def pending(self):
+        """list[tuple]: ``(when, callback, args)`` of every pending event, in the order they will run"""
+        return [(when, callback, args) for when, _, callback, args in sorted(self._events)]
+
+    def call_at(self, when, callback, *args):
+        """Schedule ``callback(*args)`` to run when the clock reaches ``when``"""
+        heapq.heappush(self._events, (float(when), self._order, callback, args))
+        self._order += 1
+
+    def call_later(self, delay, callback, *args):
+        """Schedule ``callback(*args)`` to run ``delay`` seconds from now"""
+        self.call_at(self.now + delay, callback, *args)
+
+    def advance(self, seconds):
+        """
+        Move time forward by ``seconds``, running every event that comes due on the way at its scheduled time.
+        """
+        self.advance_to(self.now + seconds)
+
+    def advance_to(self, when):
+        """Move time forward to ``when``, running every event that comes due on the way at its scheduled time."""
+        while self._events and self._events[0][0] <= when:
+            event_time, _, callback, args = heapq.heappop(self._events)
+            self.now = max(self.now, event_time)
+            callback(*args)
+        self.now = max(self.now, float(when))
+
+
+class ScaledClock(object):
+    """
+    A clock that runs ``speed`` times as fast as real time, so that delays measured on it, such as the
+    delays of canned query responses, pass ``speed`` times as quickly.
+
+    Args:
+        speed (float): How many seconds pass on the clock for each real second.
+        start (float, optional): The starting time in seconds. Defaults to :func:`time.time`
+
+    Examples
+    --------
+    >>> clock = ScaledClock(100, start=0)
+    >>> sleep_until(clock, 1.0)  # sleeps for a hundredth of a second
+    True
+    >>> 1.0 <= clock() < 2.0
+    True
+    """
+
+    def __init__(self, speed, start=None):
+        if not speed > 0:
+            raise ValueError("speed must be positive, got %r" % speed)
+        self.speed = float(speed)
+        self.start = time.time() if start is None else float(start)
+        self._real_start = timer()
+
+    def __call__(self):
+        return self.start + (timer() - self._real_start) * self.speed
+
+    def __repr__(self):
+        return "{cls}(speed={speed!r})".format(cls=self.__class__.__name__, speed=self.speed)
+
+
+def real_seconds_until(clock, when):
+    """
+    Real seconds until ``clock`` reaches ``when``, allowing for its ``speed`` like :func:`sleep_until`, or None for
+    a :class:`VirtualClock`, which only reaches it when it is advanced.
+    """
+    if isinstance(clock, VirtualClock):
+        return None
+    return max((when - clock()) / getattr(clock, "speed", 1.0), 0)
+
+
+def sleep_until(clock, when, timeout=None):
+    """
+    Sleep until ``clock`` reaches ``when``, or for at most ``timeout`` real seconds. Clocks that run
+    faster than real time (with a ``speed``, like :class:`ScaledClock`) sleep for less time, and a
+    :class:`VirtualClock` doesn't sleep at all, since its time only moves when it is advanced.
+
+    Returns:
+        bool: Whether the clock has reached ``when``
+    """
+    deadline = None if timeout is None else timer() + timeout
+    while not isinstance(clock, VirtualClock) and clock() < when:
+        wait = real_seconds_until(clock, when)
+        if deadline is not None:
+            wait = min(wait, deadline - timer())
+        if wait <= 0:
+            break
+        time.sleep(wait)
+    return clock() >= when
+
+
+__doc__ = """
+Clocks that can be used in place of :func:`time.time` to control how time passes in a simulation.
+"""
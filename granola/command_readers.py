@@ -1,24 +1,51 @@
 import abc
 import copy
+import fnmatch
 import inspect
 import logging
 import os
-import random
 import re
 from collections import OrderedDict
 from pathlib import Path
 
 import jinja2
 import jinja2.meta
-import pandas as pd
+import numpy as np
 
 import granola.hooks
-from granola.enums import RandomizeResponse, get_attribute_from_enum, validate_enum
+from granola.bundles import BUNDLE_SUFFIX, BundleCommandTable
+from granola.command_table import (
+    ChainedCommandTable,
+    CommandTable,
+    MappedCommandTable,
+    _ChainedSequence,
+    _is_missing,
+    _object_array,
+)
+from granola.command_trie import CommandTrie, substitute_arguments
+from granola.enums import (
+    CannedQueriesBackend,
+    CommandMatch,
+    RandomizeResponse,
+    get_attribute_from_enum,
+    validate_enum,
+)
+from granola.file_responses import FileResponse, _FileResponses
 from granola.hooks.base_hook import wrap_in_hooks
-from granola.utils import ABC, IS_PYTHON3, SENTINEL, fixpath, load_serial_df
+from granola.sqlite_store import SqliteCommandTable, split_sqlite_path
+from granola.utils import (
+    ABC,
+    IS_PYTHON3,
+    SENTINEL,
+    fixpath,
+    load_serial_df,
+    resolve_data_path,
+)
 
 logger = logging.getLogger(__name__)
 
+DELAY_COLUMN = "delay(ms)"  # as captured by SerialSniffer
+
 
 class SerialCmds(object):
     """
@@ -26,10 +53,14 @@ class SerialCmds(object):
     Other columns are optional, and may or may not be used by certain Command Readers.
 
     Args:
-        data (list[pd.DataFrame]): list of DataFrames containing serial command, response pairs,
+        data (list[CommandTable | pd.DataFrame]): list of tables containing serial command, response pairs,
             as well potentially other columns.
         will_randomize_responses (RandomizeResponse): Whether the responses of each command will be
             randomized or not.
+        backend (CannedQueriesBackend): How the tables are stored, either as
+            :class:`~granola.command_table.CommandTable` with the standard library ``csv`` module, which doesn't need
+            pandas, as pandas DataFrames, or with CSV files memory mapped as
+            :class:`~granola.command_table.MappedCommandTable`. Defaults to ``csv``
 
     See Also:
 
@@ -38,10 +69,40 @@ class SerialCmds(object):
         Config guide :ref:`Canned Queries Configuration`
     """
 
-    def __init__(self, data=None, will_randomize_responses=RandomizeResponse.not_randomized):
-        self.data = data if data is not None else []  # type: list[pd.DataFrame]
+    def __init__(
+        self, data=None, will_randomize_responses=RandomizeResponse.not_randomized, backend=CannedQueriesBackend.csv
+    ):
+        self.data = data if data is not None else []  # type: list[CommandTable]
         self.will_randomize_responses = get_attribute_from_enum(will_randomize_responses, "name")
         validate_enum(self.will_randomize_responses, RandomizeResponse)
+        self.backend = get_attribute_from_enum(backend, "name")
+        validate_enum(self.backend, CannedQueriesBackend)
+
+    @property
+    def _uses_pandas(self):
+        return getattr(self, "backend", CannedQueriesBackend.pandas.name) == CannedQueriesBackend.pandas.name
+
+    def empty_table(self):
+        """Table without any serial commands"""
+        if self._uses_pandas:
+            import pandas as pd
+
+            return pd.DataFrame(columns=["cmd", "response"])
+        return CommandTable()
+
+    def concat(self):
+        """Every table in data, as one table"""
+        if not self.data:
+            return self.empty_table()
+        if self._uses_pandas:
+            import pandas as pd
+
+            return pd.concat(objs=[df for df in self.data])
+        if len(self.data) == 1:
+            return self.data[0]
+        if self.backend == CannedQueriesBackend.mmap.name or any(table.lazy for table in self.data):
+            return ChainedCommandTable(self.data)  # without reading the lazy tables
+        return CommandTable.concat(self.data)
 
     def add_dataframe(self, df):
         """Add dataframe to data"""
@@ -49,28 +110,56 @@ class SerialCmds(object):
 
     def add_df_from_file(self, file, data_path_root=None, **kwargs):
         """
-        Add a df to data from a csv file path
+        Add a df to data from a csv file path, from a bundle made by
+        :func:`~granola.bundles.compile_bundle` (a ``.granola`` file), or from a SQLite database
+        (a ``.sqlite``, ``.sqlite3`` or ``.db`` file) made by :func:`~granola.sqlite_store.import_csv`, optionally
+        followed by the values of the rows to use, such as ``library.sqlite?firmware=1.2.0``
 
         Args:
-            file (str): Path to csv file.
+            file (str): Path to csv file, bundle or database.
             data_path_root (str, optional): Path to configuration. Required if file path is not an absolute path
             extra_fields (dict, optional): Dictionary of extra fields to add to DataFrame of commands. Either
                 key will be mapped to a new column in the DataFrame, and each value can either be
                 a single value, in which case it will be broadcast to all rows. Or a list of values
                 the same length as the number of rows in the data.
         """
-        file = str(file)
-        if not os.path.isabs(file):
-            if data_path_root is None:
-                raise TypeError("`data_path_root` must be specified when using a relative file path")
-            data_path_root = str(data_path_root)
-            file = os.path.join(os.path.dirname(data_path_root), file)
-        file = fixpath(file)
-        logger.debug("Canned query path %s: ", file)
-        df = load_serial_df(file)
+        return self.add_dataframe(self.read_file(file, data_path_root, **kwargs))
+
+    def read_file(self, file, data_path_root=None, **kwargs):
+        """Table of the serial commands in a file, as for :meth:`add_df_from_file`, without adding it to data"""
+        path, where = self.resolve_file(file, data_path_root)
+        logger.debug("Canned query path %s: ", path)
+        if where is not None:
+            df = SqliteCommandTable(path, where=where)
+            if self._uses_pandas:
+                df = df.to_dataframe()
+        elif path.endswith(BUNDLE_SUFFIX):
+            df = BundleCommandTable(path)
+            if self._uses_pandas:
+                df = df.to_dataframe()
+        elif self._uses_pandas:
+            df = load_serial_df(path)
+        elif self.backend == CannedQueriesBackend.mmap.name:
+            df = MappedCommandTable(path)
+        else:
+            df = CommandTable.read_csv(path)
         if kwargs:
             self._append_extra_fields_to_df(df, **kwargs)
-        return self.add_dataframe(df)
+        return df
+
+    @staticmethod
+    def resolve_file(file, data_path_root=None):
+        """
+        Path of a canned query file, and the rows to use if it is a SQLite database (otherwise None)
+
+        Returns:
+            tuple[str, dict | None]: path and rows
+        """
+        sqlite_path = split_sqlite_path(file)
+        where = None
+        if sqlite_path is not None:
+            file, where = sqlite_path
+        return fixpath(resolve_data_path(file, data_path_root)), where
 
     def add_df_from_dict(self, dic, **kwargs):
         """
@@ -85,14 +174,23 @@ class SerialCmds(object):
                 a single value, in which case it will be broadcast to all rows. Or a list of values
                 the same length as the number of rows in the data.
         """
+        return self.add_dataframe(self.read_dict(dic, **kwargs))
+
+    def read_dict(self, dic, **kwargs):
+        """Table of a dictionary of serial commands, as for :meth:`add_df_from_dict`, without adding it to data"""
         data = []
         d = copy.deepcopy(dic)
         for cmd, value in d.items():
             self._transverse_dict_and_append(data, cmd, value)
-        df = pd.DataFrame.from_records(data)
+        if self._uses_pandas:
+            import pandas as pd
+
+            df = pd.DataFrame.from_records(data)
+        else:
+            df = CommandTable.from_records(data)
         if kwargs:
             self._append_extra_fields_to_df(df, **kwargs)
-        return self.add_dataframe(df)
+        return df
 
     def _transverse_dict_and_append(self, data, cmd, value, **extra_fields):
         if isinstance(value, (str, int, float)):  # End of node
@@ -155,6 +253,9 @@ class SerialCmds(object):
 
     @staticmethod
     def _append_extra_fields_to_df(data, **kwargs):
+        if isinstance(data, CommandTable):
+            data.add_fields(**kwargs)
+            return
         for field, value in kwargs.items():
             if field in data.columns:
                 data.loc[data[field].isna(), field] = value
@@ -211,6 +312,7 @@ class BaseCommandReaders(ABC):
     def __init__(self, hooks=None, data_path_root=None, *args, **kwargs):
         super(BaseCommandReaders, self).__init__()
         self._hooks_ = hooks if hooks is not None else []
+        self._metrics_ = None  # DeviceMetrics, set when the device is added to a Fleet
         self._data_path_root = data_path_root if data_path_root is not None else os.getcwd()
 
     @wrap_in_hooks
@@ -232,6 +334,23 @@ class BaseCommandReaders(ABC):
     def register_hook(self, hook):
         self._hooks_.append(hook)
 
+    def watched_files(self):
+        """Paths of the files the command reader was loaded from, that :meth:`reload` reads again"""
+        return []
+
+    def reload(self, paths=None):
+        """
+        Read the files in ``paths`` (or every file from :meth:`watched_files`) again, after they have changed
+
+        Returns:
+            list[str]: paths read again
+        """
+        return []
+
+    def reload_config(self, **options):
+        """Update the command reader from new configuration options, keeping as much of its state as it can"""
+        logger.warning("%s doesn't reload its configuration", self.__class__.__name__)
+
     def assign_default_hook(self):
         """If self._hooks_ hooks is empty, add any default hooks for this Command Reader."""
         if not self._hooks_:
@@ -245,9 +364,14 @@ class GettersAndSetters(BaseCommandReaders):
     setters defined in the setters in `self.setters`, and then grabbed from the getters stored in
     `self.getters`.
 
-    Inside the getters and setters, the formatting follows Jinja2 formatting syntax.
+    Inside the getters and setters, the formatting follows Jinja2 formatting syntax. Besides the attributes,
+    templates can read the shared :mod:`signals <granola.signals>` of the :class:`~granola.fleet.Fleet` the
+    device is in with ``{{ signals.signal_name }}``.
 
     Args:
+        validate (bool, optional): Check that every attribute used by the getters and setters has a default value.
+            Turned off in bundles made by :func:`~granola.bundles.compile_bundle`, which are checked when they are
+            compiled. Defaults to True
         arguments for BaseCommandReaders
 
     See Also
@@ -264,22 +388,28 @@ class GettersAndSetters(BaseCommandReaders):
         setters=None,
         variable_start_string="{{",
         variable_end_string="}}",
+        validate=True,
         **kwargs
     ):
         super(GettersAndSetters, self).__init__(**kwargs)
+        self.signals = OrderedDict()  # bound to a SignalView when the device is added to a Fleet
+        self._load(default_values, getters, setters, variable_start_string, variable_end_string, validate)
+
+    def _load(self, default_values, getters, setters, variable_start_string, variable_end_string, validate):
+        """Set up the getters and setters from their configuration, with every attribute at its default value"""
+        self._validate = validate
         self._variable_start_string = variable_start_string
         self._variable_end_string = variable_end_string
-        self.jinja_env = jinja2.Environment(
-            variable_start_string=variable_start_string,
-            variable_end_string=variable_end_string,
-            loader=jinja2.BaseLoader(),
-        )
+        self.jinja_env = self._build_jinja_env()
         default_values = default_values if default_values is not None else OrderedDict()
         getters = getters if getters is not None else OrderedDict()
         setters = setters if setters is not None else OrderedDict()
         self.instrument_attributes = OrderedDict()
         self.getters = OrderedDict()
         self.setters = OrderedDict()
+        self._getter_trie = self._build_command_trie()  # getters with arguments
+        self._setter_trie = self._build_command_trie()
+        self._default_values = default_values
         self._load_getters_and_setters(default_values, getters, setters)
 
     @wrap_in_hooks
@@ -305,6 +435,30 @@ class GettersAndSetters(BaseCommandReaders):
             return next_read
         return
 
+    def reload_config(
+        self,
+        default_values=None,
+        getters=None,
+        setters=None,
+        variable_start_string="{{",
+        variable_end_string="}}",
+        validate=True,
+        **kwargs
+    ):
+        """
+        Replace the getters and setters with new ones from new configuration options. Attributes keep the values
+        they have been set to, unless their default value has changed.
+        """
+        values = OrderedDict(
+            (attribute, instrument_attribute.value)
+            for attribute, instrument_attribute in self.instrument_attributes.items()
+            if (self._default_values or {}).get(attribute) == (default_values or {}).get(attribute)
+        )
+        self._load(default_values, getters, setters, variable_start_string, variable_end_string, validate)
+        for attribute, value in values.items():
+            if attribute in self.instrument_attributes:
+                self.instrument_attributes[attribute].value = value
+
     @property
     def attribute_vals(self):
         attribute_vals = {
@@ -317,9 +471,31 @@ class GettersAndSetters(BaseCommandReaders):
         attribute_vals = attribute_vals if attribute_vals is not None else self.attribute_vals
         command = string.replace("\r", "_\\r_").replace("\n", "_\\n_")
         template = self.jinja_env.from_string(command)
-        result = template.render(**attribute_vals).replace("_\\r_", "\r").replace("_\\n_", "\n")
+        context = {"signals": self.signals}
+        context.update(attribute_vals)
+        result = template.render(**context).replace("_\\r_", "\r").replace("_\\n_", "\n")
         return result
 
+    def __getstate__(self):
+        """Leave out the jinja environment, it is rebuilt from the variable start and end strings"""
+        state = self.__dict__.copy()
+        del state["jinja_env"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.jinja_env = self._build_jinja_env()
+
+    def _build_jinja_env(self):
+        return jinja2.Environment(
+            variable_start_string=self._variable_start_string,
+            variable_end_string=self._variable_end_string,
+            loader=jinja2.BaseLoader(),
+        )
+
+    def _build_command_trie(self):
+        return CommandTrie(self._variable_start_string, self._variable_end_string)
+
     def _load_getters_and_setters(self, default_values, getters, setters):
         """Loads default values, getters and setters"""
 
@@ -337,11 +513,16 @@ class GettersAndSetters(BaseCommandReaders):
     def _initialize_getters(self, getters):
         """
         Loads all getters from getters_and_setters["getters"] into `self.getters`. If getter
-        does not get an attribute in self.instrument_attributes, raise Value Error"""
+        does not get an attribute in self.instrument_attributes, raise Value Error. Getters with
+        arguments in their command are also added to a :class:`~granola.command_trie.CommandTrie`,
+        and their responses can use the values of the arguments"""
         for getter in getters:
-            self._check_attributes_are_valid("getters", getter)
+            arguments = self._getter_trie.arguments(getter["cmd"])
+            self._check_attributes_are_valid("getters", getter, arguments)
 
             self.getters[getter["cmd"]] = getter["response"]
+            if arguments:
+                self._getter_trie.add(getter["cmd"], getter["response"])
 
     def _initialize_setters(self, setters):
         """
@@ -355,6 +536,7 @@ class GettersAndSetters(BaseCommandReaders):
             )
             setter_regex = re.sub(regex, self._format_match_group, setter["cmd"])
             self.setters[setter_regex] = setter["response"]
+            self._setter_trie.add(setter["cmd"], setter["response"])
 
     def _format_match_group(self, match):
         """
@@ -377,48 +559,58 @@ class GettersAndSetters(BaseCommandReaders):
             next_read = self.render_template(self.getters[data])
 
             return next_read
+        found = self._getter_trie.match(data)
+        if found is not None:
+            response_template, arguments = found
+            attribute_vals = self.attribute_vals
+            attribute_vals.update(arguments)
+            return self.render_template(response_template, attribute_vals)
         return
 
     def _process_setter(self, data):
         """Process setter if data matches a setter regex"""
-        regex_match, response_template = self._get_matching_setter(data)
+        arguments, response_template = self._get_matching_setter(data)
         if not response_template:
             return
-        self._proccess_setter_helper(regex_match, self.attribute_vals)
+        self._proccess_setter_helper(arguments, self.attribute_vals)
 
         response = self.render_template(response_template)
         return response
 
     def _get_matching_setter(self, data):
-        """Process setter if data matches a setter regex"""
-        for cmd_regex, response in self.setters.items():
-            regex_match = re.search(cmd_regex, data)
-            if regex_match:
-                return regex_match, response
-
-        return None, None
-
-    def _proccess_setter_helper(self, regex_match, attributes):
-        # we can extract the match group by name because we gave
-        # them a name earlier for ease of book keeping now
+        """
+        The values of the attributes in the setter matching data, and its response. The setters are
+        looked up in a :class:`~granola.command_trie.CommandTrie`, so it doesn't matter how many there are"""
+        found = self._setter_trie.match(data)
+        if found is None:
+            return None, None
+        response, arguments = found
+        return arguments, response
+
+    def _proccess_setter_helper(self, arguments, attributes):
         for attribute in attributes:
-            try:  # check for all attributes, only update attribute that matches regex
-                updated_value = regex_match.group(attribute)
-            except IndexError:
+            if attribute not in arguments:  # only update the attributes in the setter
                 continue
+            updated_value = arguments[attribute]
 
             logger.debug("Updating %s to %s", attribute, updated_value)
 
             self.instrument_attributes[attribute].value = updated_value
 
-    def _check_attributes_are_valid(self, attribute_type, template_string):
+    def _check_attributes_are_valid(self, attribute_type, template_string, arguments=()):
         """Check every attribute in attributes is an attribute in `self.instrument_attributes`,
-        else raise ValueError"""
+        or one of the arguments of the command, else raise ValueError"""
+        if not self._validate:
+            return
         for template in template_string.values():
             parsed_content = self.jinja_env.parse(template)
             attributes = jinja2.meta.find_undeclared_variables(parsed_content)
             for attribute in attributes:
-                if attribute not in self.instrument_attributes:
+                if (
+                    attribute not in self.instrument_attributes
+                    and attribute not in arguments
+                    and attribute != "signals"
+                ):
                     raise ValueError(
                         "{attribute_type} attribute {attribute} not found in default_values."
                         "\nMake sure you initialize all values!"
@@ -434,9 +626,15 @@ class CannedQueries(BaseCommandReaders):
     such as a csv or configuration dictionary).
 
     It stores a dictionary of :class:`~granola.command_readers.SerialCmds`, which represents
-    canned queries as pandas DataFrames of the serial commands. And then as a serial command comes in,
-    it is directed to the correct :class:`~granola.command_readers.SerialCmds` and then creates a slice of
-    your DataFrame to get only the matching serial commands to iterate over.
+    canned queries as pandas DataFrames of the serial commands. The responses of each serial command are
+    grouped together once, when the canned queries are loaded, so that as a serial command comes in
+    only its own responses are iterated over, without searching the DataFrame again.
+
+    Args:
+        data (list[str | dict]): CSV file paths and dictionaries of serial commands.
+        data_path_root (str, optional): Directory relative CSV file paths are relative to.
+        seed (int, optional): Seed for randomized responses, so that the same responses are given in
+            the same order every run. Defaults to None, a different order each run
 
     See Also
     --------
@@ -445,20 +643,33 @@ class CannedQueries(BaseCommandReaders):
     :ref:`Custom Command Readers and Hooks Configuration` : Command Readers and Hook Overviews
     """
 
-    def __init__(self, data=None, data_path_root=None, **kwargs):
+    def __init__(self, data=None, data_path_root=None, seed=None, **kwargs):
 
         super(CannedQueries, self).__init__(data_path_root=data_path_root, **kwargs)
+        self._runtime_responses = OrderedDict()  # (replaced, responses, weights) added while running, by command
+        self._load(data, seed, **kwargs)
+
+    def _load(self, data, seed, **kwargs):
+        """Read the canned queries in ``data``, with their options, and start every command from its first response"""
         self.data = data if data is not None else OrderedDict()
-        self.serial_df = pd.DataFrame(columns=["cmd", "response"])  # default empty df
+        self.seed = seed
+        self._random_state = np.random.RandomState(seed)
         serial_cmd_files_kwargs = self._extract_serial_cmd_file_kw_from_config(kwargs)
         self.serial_cmd_file = SerialCmds(**serial_cmd_files_kwargs)
+        self.serial_table = self.serial_cmd_file.empty_table()
         self.serial_generator = OrderedDict()
 
+        self._serial_cmd_files_kwargs = serial_cmd_files_kwargs
+        self._extra_fields = OrderedDict(
+            (key, value) for key, value in kwargs.items() if key not in serial_cmd_files_kwargs
+        )
+        self._sources = []  # the item of data each table in serial_cmd_file.data was read from
+        self._source_indexes = None  # index of each table, made when the canned queries are first reloaded
         for maybe_file in self.data:
-            if isinstance(maybe_file, (str, Path)):
-                self.serial_cmd_file.add_df_from_file(maybe_file, self._data_path_root, **kwargs)
-            elif isinstance(maybe_file, dict):
-                self.serial_cmd_file.add_df_from_dict(maybe_file, **kwargs)
+            table = self._read_source(maybe_file)
+            if table is not None:
+                self.serial_cmd_file.add_dataframe(table)
+                self._sources.append(maybe_file)
 
         self._seed_serial_dfs()
 
@@ -470,7 +681,7 @@ class CannedQueries(BaseCommandReaders):
     def get_reading(self, data):
         """
         Process incoming canned queries by extracting just the serial commands that match the
-        incoming serial command and then create a generator of those matching serial commands
+        incoming serial command and then create a cursor over those matching serial commands
         and response to iterate through.
 
         Args:
@@ -479,7 +690,7 @@ class CannedQueries(BaseCommandReaders):
         Returns:
             str | None | SENTINEL: the response from matching serial df.
             If no matching matching command is found, then it returns None.
-            If The generator is exhausted, and no Hook is activate to reseed the generator or
+            If The cursor is exhausted, and no Hook is activate to restart the cursor or
             alter the behavior in some other way, return SENTINEL.
 
         See Also
@@ -490,19 +701,297 @@ class CannedQueries(BaseCommandReaders):
 
         :ref:`Custom Command Readers and Hooks Configuration` : Command Readers and Hook Overviews
         """
-        try:
-            if data not in self.serial_generator:
-                self._start_serial_generator(data)
-            next_read = next(self.serial_generator[data], SENTINEL)
-        except KeyError:
-            next_read = None
-        return next_read
+        cursor = self._cursor(data)
+        if cursor is None:
+            return None
+        return next(cursor, SENTINEL)
 
     def _start_serial_generator(self, cmd):
-        serial_df = self._filter_serial_df(cmd=cmd)  # type: pd.DataFrame
-        if not serial_df.empty:
-            serial_df_generator = self._get_generator_from_df(serial_df, self.serial_cmd_file.will_randomize_responses)
-            self.serial_generator[cmd] = serial_df_generator
+        """Start (or restart) the cursor over the responses of ``cmd``, and return it, or None if it has none"""
+        cursor = self._cursor(cmd)
+        if cursor is not None:
+            cursor.rewind()
+        return cursor
+
+    def _cursor(self, cmd):
+        """
+        The cursor over the responses of ``cmd``, or None if it has none. Only the cursors of commands with canned
+        queries of their own are kept in ``serial_generator``, since any number of serial commands can match a
+        pattern: those are matched each time, and share the pattern's cursor.
+        """
+        cursor = self.serial_generator.get(cmd)
+        if cursor is not None:
+            return cursor
+        if cmd in self._responses_by_cmd and cmd not in self._patterns:
+            cursor = self.serial_generator[cmd] = self._new_cursor(cmd)
+            return cursor
+        # only commands without canned queries of their own are matched against the patterns
+        found = self._template_trie.match(cmd)
+        if found is not None:
+            template, arguments = found
+            return _ArgumentsCursor(self._pattern_cursor(template), arguments)
+        pattern = self._pattern_matcher.match(cmd)
+        if pattern is not None:
+            return self._pattern_cursor(pattern)
+        return None
+
+    def _pattern_cursor(self, pattern):
+        """Cursor shared by every command matching the pattern"""
+        if pattern not in self._pattern_cursors:
+            self._pattern_cursors[pattern] = self._new_cursor(pattern)
+        return self._pattern_cursors[pattern]
+
+    def _new_cursor(self, cmd):
+        return self._get_cursor(
+            self._responses_by_cmd[cmd],
+            self.serial_cmd_file.will_randomize_responses,
+            self._random_state,
+            self._weights_by_cmd.get(cmd),
+        )
+
+    def watched_files(self):
+        """Paths of the canned query files, including bundles and SQLite databases"""
+        paths = [self._source_path(source) for source in self._sources]
+        return [path for path in OrderedDict.fromkeys(paths) if path is not None]
+
+    def reload(self, paths=None):
+        """
+        Read the canned query files in ``paths`` (or every file) again, after they have changed. Only the
+        commands in those files are grouped again, and their cursors start again from their first response, while
+        the cursors of every other command carry on where they were.
+
+        Args:
+            paths (list[str], optional): Files to read again. Defaults to every file
+
+        Returns:
+            list[str]: paths read again
+        """
+        paths = None if paths is None else set(fixpath(str(path)) for path in paths)
+        tables = list(self.serial_cmd_file.data)
+        reloaded = []
+        for i, source in enumerate(self._sources):
+            path = self._source_path(source)
+            if path is None or (paths is not None and path not in paths):
+                continue
+            tables[i] = self._read_source(source)
+            reloaded.append(path)
+        if reloaded:
+            logger.info("%s reloaded %s", self.__class__.__name__, ", ".join(reloaded))
+            self._set_tables(list(self._sources), tables)
+        return reloaded
+
+    def reload_config(self, data=None, seed=None, **kwargs):
+        """
+        Update the canned queries from new configuration options. Where only ``data`` has changed, only the files
+        and dictionaries that are new are read, and only their commands, and those of the files and
+        dictionaries that are gone, are grouped again. Any other change loads the canned queries again.
+        Hooks are kept either way.
+        """
+        data = data if data is not None else []
+        kwargs.pop("data_path_root", None)
+        kwargs.pop("hooks", None)
+        serial_cmd_files_kwargs = self._extract_serial_cmd_file_kw_from_config(kwargs)
+        extra_fields = OrderedDict((key, value) for key, value in kwargs.items() if key not in serial_cmd_files_kwargs)
+        if (
+            seed != self.seed
+            or serial_cmd_files_kwargs != self._serial_cmd_files_kwargs
+            or extra_fields != self._extra_fields
+        ):
+            self._load(data, seed, **kwargs)
+            if self._runtime_responses:
+                self._source_indexes = [self._index_table(table) for table in self.serial_cmd_file.data]
+                self._update_commands(list(self._runtime_responses))
+            return
+        old = list(zip(self._sources, self.serial_cmd_file.data))
+        sources, tables = [], []
+        for source in data:
+            reused = next((i for i, (old_source, _) in enumerate(old) if old_source == source), None)
+            table = old.pop(reused)[1] if reused is not None else self._read_source(source)
+            if table is not None:
+                sources.append(source)
+                tables.append(table)
+        self.data = data
+        self._set_tables(sources, tables)
+
+    def add_responses(self, cmd, responses, weights=None):
+        """
+        Add ``responses`` after the responses of ``cmd``, or add the command if it doesn't have any, while the
+        device runs. A cursor part way through the command's responses carries on into the new ones.
+
+        Adding responses takes time in proportion to the responses added, however many responses the command
+        and the canned queries have (except for weighted commands, which make their alias table again).
+        Changes made while running are kept when the canned queries are reloaded. They aren't added to
+        ``serial_df``, which only has the canned queries from ``data``.
+
+        Args:
+            cmd (str): Serial command.
+            responses (list[str]): Responses to add.
+            weights (list[float], optional): How often each response is picked, when randomizing with
+                replacement. Defaults to None, a weight of 1 each
+
+        Examples
+        --------
+        >>> canned_queries = CannedQueries(data=[{"get -sn\\r": ["42\\r>", "43\\r>"]}])
+        >>> canned_queries.get_reading("get -sn\\r")
+        '42\\r>'
+        >>> canned_queries.add_responses("get -sn\\r", ["44\\r>"])
+        >>> canned_queries.get_reading("get -sn\\r"), canned_queries.get_reading("get -sn\\r")
+        ('43\\r>', '44\\r>')
+        """
+        responses, weights = self._runtime_change(responses, weights)
+        replaced, added, added_weights = self._runtime_responses.get(cmd, (False, _object_array([]), None))
+        if not isinstance(added, _GrowingSequence):
+            added = _GrowingSequence(added)
+        if weights is not None or added_weights is not None:
+            added_weights = _merge_weights([range(len(added)), responses], [added_weights, weights])
+        added.extend(responses)
+        self._runtime_responses[cmd] = (replaced, added, added_weights)
+
+        current = self._responses_by_cmd.get(cmd)
+        if current is None:
+            self._set_responses(cmd, [_GrowingSequence(responses)], [weights])
+            return
+        if not isinstance(current, _GrowingSequence):
+            current = self._responses_by_cmd[cmd] = _GrowingSequence(current)
+        current_weights = self._weights_by_cmd.get(cmd)
+        if weights is not None or current_weights is not None:
+            self._weights_by_cmd[cmd] = _merge_weights([range(len(current)), responses], [current_weights, weights])
+        current.extend(responses)
+        cursor = self._pattern_cursors.get(cmd) if cmd in self._patterns else self.serial_generator.get(cmd)
+        if cursor is None:
+            return
+        if type(cursor) is _RandomResponseCursor and cmd in self._weights_by_cmd:
+            self._forget_cursors(cmd)  # now picked by weight
+        else:
+            cursor.extend(self._responses_by_cmd[cmd], self._weights_by_cmd.get(cmd))
+
+    def replace_responses(self, cmd, responses, weights=None):
+        """
+        Replace the responses of ``cmd`` with ``responses``, or add the command if it doesn't have any, while the
+        device runs. The command's cursor starts again from the first of its new responses. See
+        :meth:`add_responses`.
+        """
+        responses, weights = self._runtime_change(responses, weights)
+        self._runtime_responses[cmd] = (True, responses, weights)
+        self._forget_cursors(cmd)
+        self._set_responses(cmd, [responses], [weights])
+
+    def remove_responses(self, cmd):
+        """
+        Remove every response of ``cmd`` while the device runs, so that it is handled as if it had no canned
+        queries. See :meth:`add_responses`.
+        """
+        self._runtime_responses[cmd] = (True, _object_array([]), None)
+        self._forget_cursors(cmd)
+        self._set_responses(cmd, [], [])
+        if self._patterns.pop(cmd, None) is not None:
+            self._compile_patterns()
+
+    @staticmethod
+    def _runtime_change(responses, weights):
+        responses = _object_array(list(responses))
+        if weights is not None:
+            if len(weights) != len(responses):
+                raise ValueError("%s weights given for %s responses" % (len(weights), len(responses)))
+            weights = np.array(weights, dtype=float)
+        return responses, weights
+
+    def _forget_cursors(self, cmd):
+        """Drop the cursor over the responses of ``cmd``, which every command it matched shares, if it is a pattern"""
+        self.serial_generator.pop(cmd, None)
+        self._pattern_cursors.pop(cmd, None)
+
+    def _read_source(self, source):
+        """Table read from an item of data, either a file or a dictionary"""
+        if isinstance(source, (str, Path)):
+            return self.serial_cmd_file.read_file(source, self._data_path_root, **self._extra_fields)
+        elif isinstance(source, dict):
+            return self.serial_cmd_file.read_dict(source, **self._extra_fields)
+        return None
+
+    def _source_path(self, source):
+        if not isinstance(source, (str, Path)):
+            return None
+        return self.serial_cmd_file.resolve_file(str(source), self._data_path_root)[0]
+
+    def _set_tables(self, sources, tables):
+        """Use ``tables``, read from ``sources``, grouping again only the commands in tables that have changed"""
+        if self._source_indexes is None:
+            self._source_indexes = [self._index_table(table) for table in self.serial_cmd_file.data]
+        old = list(zip(self.serial_cmd_file.data, self._source_indexes))
+        changed = set()
+        indexes = []
+        for table in tables:
+            index = next((index for old_table, index in old if old_table is table), None)
+            if index is None:
+                index = self._index_table(table)
+                changed.update(index["response"])
+            indexes.append(index)
+        for old_table, index in old:
+            if not any(old_table is table for table in tables):
+                changed.update(index["response"])
+        self._sources = sources
+        self.serial_cmd_file.data = tables
+        self._source_indexes = indexes
+        self.serial_table = self.serial_cmd_file.concat()
+        self._update_commands(changed)
+
+    def _set_responses(self, cmd, responses, weights):
+        """Use ``responses`` (and ``weights``), from each table with responses to ``cmd``, as its responses"""
+        weights = [weight for response, weight in zip(responses, weights) if len(response)]
+        responses = [response for response in responses if len(response)]
+        if not responses:
+            self._responses_by_cmd.pop(cmd, None)
+            self._weights_by_cmd.pop(cmd, None)
+            return
+        self._responses_by_cmd[cmd] = _merge_sequences(responses)
+        weights = _merge_weights(responses, weights)
+        if weights is not None:
+            self._weights_by_cmd[cmd] = weights
+        else:
+            self._weights_by_cmd.pop(cmd, None)
+
+    def _update_commands(self, cmds):
+        """
+        Group the responses (and weights) of ``cmds`` again, from the index of each table, restarting their cursors
+        """
+        for cmd in cmds:
+            self.serial_generator.pop(cmd, None)
+            indexes = [index for index in self._source_indexes if cmd in index["response"]]
+            responses = [index["response"][cmd] for index in indexes]
+            weights = [index["weight"][cmd] if "weight" in index else None for index in indexes]
+            if cmd in self._runtime_responses:
+                replaced, added, added_weights = self._runtime_responses[cmd]
+                if replaced:
+                    responses, weights = [], []
+                responses.append(_object_array(list(added)))  # a copy, since more may be added to the record
+                weights.append(added_weights)
+            self._set_responses(cmd, responses, weights)
+
+        patterns = OrderedDict(
+            (cmd, match)
+            for cmd, match in self._index_patterns_of_tables(self._source_indexes).items()
+            if cmd in self._responses_by_cmd  # and not removed while running
+        )
+        if patterns != self._patterns or any(cmd in self._patterns for cmd in cmds):
+            # every command matching a pattern starts again
+            self._patterns = patterns
+            self._pattern_cursors = OrderedDict()
+            self._compile_patterns()
+            for cmd in list(self.serial_generator):
+                if cmd not in self._responses_by_cmd or cmd in self._patterns:
+                    del self.serial_generator[cmd]
+
+    @property
+    def serial_df(self):
+        """pd.DataFrame: Every canned query, from every file and dictionary, as a pandas DataFrame (requires pandas)"""
+        if isinstance(self.serial_table, CommandTable):
+            return self.serial_table.to_dataframe()
+        return self.serial_table
+
+    @serial_df.setter
+    def serial_df(self, df):
+        self.serial_table = df
 
     def _extract_serial_cmd_file_kw_from_config(self, kw):
         """
@@ -524,54 +1013,514 @@ class CannedQueries(BaseCommandReaders):
         return kwargs
 
     def _seed_serial_dfs(self):
-        if self.serial_cmd_file.data:
-            self.serial_df = pd.concat(objs=[df for df in self.serial_cmd_file.data])
+        self.serial_table = self.serial_cmd_file.concat()
+        self._responses_by_cmd = self._index_response_column(self.serial_table)
+        self._weights_by_cmd = self._index_weights(self.serial_table)
+        self._patterns = self._index_patterns(self.serial_table)
+        self._pattern_cursors = OrderedDict()  # shared by every command matching the pattern
+        self._compile_patterns()
+
+    def _compile_patterns(self):
+        """Commands with arguments into a CommandTrie, and regex and glob patterns into one regular expression"""
+        self._template_trie = CommandTrie()
+        patterns = OrderedDict()
+        for pattern, match in self._patterns.items():
+            if match == CommandMatch.template.name:
+                self._template_trie.add(pattern, pattern)
+            else:
+                patterns[pattern] = match
+        self._pattern_matcher = _PatternMatcher(patterns)
 
-    def _filter_serial_df(self, cmd):
+    @staticmethod
+    def _index_responses(df, column="response"):
         """
-        Filter DataFrame to only the commands that match the inputted command
+        Group the responses of every command in the table, in the order they appear,
+        so that looking up (and restarting) a command's responses doesn't search the whole table.
 
-        This allows the CSVs to contain many different serial inputs, but it will only return
-        the serial command that you pass in.
+        This allows the CSVs to contain many different serial inputs, but each command will only
+        return its own responses.
 
         Args:
-            df (pd.DataFrame): DataFrame to filer.
-            cmd (str): Command to filter against.
+            df (CommandTable | pd.DataFrame): Table with `cmd` and `response` columns.
+            column (str, optional): Column to group. Defaults to "response"
 
         Returns:
-            pd.DataFrame: Filtered DataFrame.
+            dict: Command to array of its responses.
+        """
+        if isinstance(df, CommandTable):
+            return df.index(column)
+        responses = df[column].to_numpy()
+        return {cmd: responses[rows] for cmd, rows in df.groupby("cmd", sort=False).indices.items()}
+
+    @classmethod
+    def _index_weights(cls, df):
+        """Group the `weight` column like the responses, if there is one. Rows without a weight have a weight of 1"""
+        if "weight" not in df.columns:
+            return {}
+        index = {}
+        for cmd, weights in cls._index_responses(df, "weight").items():
+            weights = np.array([weight for weight in weights], dtype=float)
+            weights[np.isnan(weights)] = 1
+            index[cmd] = weights
+        return index
+
+    @classmethod
+    def _index_patterns(cls, df):
+        """
+        Commands that are patterns, from the `match` column, if there is one, in the order they appear,
+        with the :class:`~granola.enums.CommandMatch` name of each. Bundles store their patterns, so aren't scanned.
         """
-        df = self.serial_df
-        conditions = df["cmd"] == cmd
-        columns = ["response"]
-        serial_df = df.loc[conditions, columns]
-        return serial_df
+        if getattr(df, "patterns", None) is not None:
+            return OrderedDict(df.patterns)
+        if "match" not in df.columns:
+            return OrderedDict()
+        return cls._index_patterns_of_tables([{"match": cls._index_responses(df, "match")}])
+
+    def _index_table(self, df):
+        """The responses, and any weights and matches, of each command in one table, as for `_index_responses`"""
+        index = OrderedDict(
+            (column, self._index_responses(df, column))
+            for column in ("response", "weight", "match")
+            if column in df.columns
+        )
+        index["response"] = self._index_response_column(df)
+        return index
+
+    def _index_response_column(self, df):
+        """The responses of each command, as for `_index_responses`, as file responses and with delays where given"""
+        return self._index_delays(df, self._index_file_responses(df, self._index_responses(df)))
+
+    def _index_delays(self, df, responses):
+        """
+        The ``responses`` of each command, from `_index_responses`, as a :class:`DelayedResponse` in the rows
+        of the table with a ``delay(ms)``. The delays aren't read until their responses are used, so that tables
+        that are read lazily stay that way.
+        """
+        if DELAY_COLUMN not in df.columns:
+            return responses
+        for cmd, delays in self._index_responses(df, DELAY_COLUMN).items():
+            responses[cmd] = _DelayedResponses(responses[cmd], delays)
+        return responses
+
+    def _index_file_responses(self, df, responses):
+        """
+        The ``responses`` of each command, from `_index_responses`, with a
+        :class:`~granola.file_responses.FileResponse` in the rows of the table with a ``response_file``
+        """
+        if "response_file" not in df.columns:
+            return responses
+        for cmd, files in self._index_responses(df, "response_file").items():
+            responses[cmd] = _FileResponses(responses[cmd], files, self._data_path_root)
+        return responses
+
+    @staticmethod
+    def _index_patterns_of_tables(indexes):
+        """Commands that are patterns, as for `_index_patterns`, from the index of each table"""
+        matches = OrderedDict()
+        for index in indexes:
+            for cmd, values in index.get("match", {}).items():
+                if cmd not in matches:
+                    matches[cmd] = next((match for match in values if isinstance(match, str)), None)
+        patterns = OrderedDict()
+        for cmd, match in matches.items():
+            if match is not None:
+                validate_enum(match, CommandMatch)
+                if match != CommandMatch.exact.name:
+                    patterns[cmd] = match
+        return patterns
 
     @staticmethod
-    def _get_generator_from_df(df, will_randomize_responses):
-        """Create a generator for the df so that when you call next on that generator, it
-        gives you the next serial command each time, and not the first one. Allowing you to
-        continue through the list of serial commands. Also gives the option to randomize results.
+    def _get_cursor(responses, will_randomize_responses, random_state=None, weights=None):
+        """Create a cursor over the responses so that when you call next on that cursor, it
+        gives you the next response each time, and not the first one. Allowing you to
+        continue through the list of responses. Also gives the option to randomize results.
 
         Args:
-            df (pd.DataFrame): DataFrame to iterate over
-            serial_cmd_file (SerialCmds): SerialCmds to know if you are randomizing the results or just doing
-                a straight iteration.
-        """
-        # TODO(madeline) only pass in randomize enum? Also clean up and make subfunctions?
-        if will_randomize_responses == RandomizeResponse.not_randomized.name:
-            for _, rows in df.iterrows():
-                yield rows["response"]
-        if (
-            will_randomize_responses == RandomizeResponse.randomized_w_replacement.name
-            or will_randomize_responses == RandomizeResponse.randomize_and_remove.name
-        ):
-            while df.shape[0] > 0:
-                df_length = df.shape[0]
-                row = random.randint(0, df_length - 1)
-                yield df["response"].iloc[row]
-                if will_randomize_responses == RandomizeResponse.randomize_and_remove.name:
-                    df = df.drop(row)
+            responses (np.ndarray): Responses of a single command, to iterate over
+            will_randomize_responses (str): :class:`~granola.enums.RandomizeResponse` name, to know if you are
+                randomizing the results or just doing a straight iteration.
+            random_state (np.random.RandomState, optional): Source of randomized results. Defaults to a new
+                unseeded RandomState
+            weights (np.ndarray, optional): How often each response is picked relative to the others,
+                when randomizing with replacement. Defaults to None, every response equally often
+
+        Returns:
+            _ResponseCursor: Cursor over the responses.
+        """
+        if random_state is None:
+            random_state = np.random.RandomState()
+        if will_randomize_responses == RandomizeResponse.randomized_w_replacement.name:
+            if weights is not None:
+                return _WeightedResponseCursor(responses, random_state, weights)
+            return _RandomResponseCursor(responses, random_state)
+        if will_randomize_responses == RandomizeResponse.randomize_and_remove.name:
+            return _ShuffledResponseCursor(responses, random_state)
+        return _ResponseCursor(responses)
+
+
+class DelayedResponse(str):
+    """
+    Response that a :class:`~granola.breakfast_cereal.Cereal` with a ``clock`` holds back until ``delay``
+    seconds after its command, on that clock. Canned queries give a delayed response for rows with a ``delay(ms)``,
+    such as the captures of :class:`~granola.serial_sniffer.SerialSniffer`.
+
+    Examples
+    --------
+    >>> response = DelayedResponse("42\\r>", 0.25)
+    >>> response, response.delay
+    ('42\\r>', 0.25)
+    """
+
+    def __new__(cls, response, delay):
+        self = super(DelayedResponse, cls).__new__(cls, response)
+        self.delay = delay
+        return self
+
+    def __reduce__(self):
+        return DelayedResponse, (str(self), self.delay)
+
+
+class _DelayedResponses(object):
+    """
+    The responses of one command, with the delay in ``delays`` (in milliseconds) of each row that has one.
+    The delayed responses are made as they are used.
+    """
+
+    def __init__(self, responses, delays):
+        self.responses = responses
+        self.delays = delays
+
+    def __len__(self):
+        return len(self.responses)
+
+    def __getitem__(self, i):
+        response, delay = self.responses[i], self.delays[i]
+        if _is_missing(delay) or delay == "" or not float(delay) > 0:
+            return response
+        if isinstance(response, FileResponse):
+            return FileResponse(response.path, response.offset, response.length, delay=float(delay) / 1000)
+        if isinstance(response, str):
+            return DelayedResponse(response, float(delay) / 1000)
+        return response
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _merge_sequences(sequences):
+    """The responses of a command from several tables, as one sequence"""
+    if len(sequences) == 1:
+        return sequences[0]
+    if all(isinstance(sequence, np.ndarray) for sequence in sequences):
+        return np.concatenate(sequences)
+    flattened = []  # rather than chains of chains
+    for sequence in sequences:
+        flattened.extend(sequence.sequences if isinstance(sequence, _ChainedSequence) else [sequence])
+    return _ChainedSequence(flattened)
+
+
+class _GrowingSequence(object):
+    """
+    The responses of a command, followed by responses added while running, kept in an array that doubles in size
+    when it is full, so that adding responses takes time in proportion to the responses added.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self._base_length = len(base)
+        self._added = np.empty(8, dtype=object)
+        self._length = 0
+
+    def __len__(self):
+        return self._base_length + self._length
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if i < self._base_length:
+            return self.base[i]
+        return self._added[i - self._base_length]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def extend(self, values):
+        """Add ``values`` after the others"""
+        end = self._length + len(values)
+        if end > len(self._added):
+            added = np.empty(max(end, 2 * len(self._added)), dtype=object)
+            added[: self._length] = self._added[: self._length]
+            self._added = added
+        self._added[self._length : end] = values
+        self._length = end
+
+
+def _merge_weights(sequences, weights):
+    """Weights of the responses in ``sequences`` as one array, or None if none have weights. Missing weights are 1"""
+    if all(weight is None for weight in weights):
+        return None
+    merged = np.concatenate(
+        [
+            np.array(list(weight), dtype=float) if weight is not None else np.ones(len(sequence))
+            for sequence, weight in zip(sequences, weights)
+        ]
+    )
+    merged[np.isnan(merged)] = 1
+    return merged
+
+
+class _PatternMatcher(object):
+    """
+    Canned query commands that are patterns, compiled into one regular expression, so that a command is
+    only searched once, however many patterns there are. Where more than one pattern matches a command,
+    the first one wins.
+
+    Args:
+        patterns (dict): Each pattern, with its :class:`~granola.enums.CommandMatch` name.
+
+    Examples
+    --------
+    >>> matcher = _PatternMatcher({"set time \\\\d+\\r": "regex", "get -*\\r": "glob"})
+    >>> matcher.match("set time 1697000000\\r"), matcher.match("get -sn\\r"), matcher.match("set time now\\r")
+    ('set time \\\\d+\\r', 'get -*\\r', None)
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._regexes = []
+        for pattern, match in patterns.items():
+            regex = fnmatch.translate(pattern) if match == CommandMatch.glob.name else pattern
+            try:  # matching the whole command
+                self._regexes.append(re.compile(r"(?:%s)\Z" % regex))
+            except re.error as err:
+                raise ValueError("Invalid %s canned query command %r: %s" % (match, pattern, err))
+        self._combined, self._groups = self._combine(self._regexes)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def match(self, cmd):
+        """The first pattern that matches the whole of ``cmd``, or None"""
+        if not self.patterns:
+            return None
+        if self._combined is not None:
+            found = self._combined.match(cmd)
+            return self.patterns[self._groups[found.lastindex]] if found else None
+        for pattern, regex in zip(self.patterns, self._regexes):
+            if regex.match(cmd):
+                return pattern
+        return None
+
+    @staticmethod
+    def _combine(regexes):
+        """
+        One regular expression with each pattern as an alternative in its own group, and the pattern each
+        group is for. None where patterns can't be combined, such as where two patterns have groups with the same
+        name, or refer to their groups by number, and are tried one by one instead.
+        """
+        alternatives, groups, group = [], {}, 1
+        for i, regex in enumerate(regexes):
+            if re.search(r"\\[1-9]", regex.pattern):
+                return None, {}
+            alternatives.append("(%s)" % regex.pattern)
+            groups[group] = i
+            group += regex.groups + 1
+        try:
+            return re.compile("|".join(alternatives)), groups
+        except re.error:
+            return None, {}
+
+
+class _ResponseCursor(object):
+    """
+    Cursor over the responses of a single command, in order. ``position`` is how many responses
+    have been taken since the cursor was started, and can be set to skip forwards or backwards.
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position >= len(self.responses):
+            raise StopIteration
+        response = self._response(self.position)
+        self.position += 1
+        return response
+
+    next = __next__  # python 2
+
+    def _response(self, position):
+        return self.responses[position]
+
+    def rewind(self):
+        """Start again from the first response"""
+        self.position = 0
+
+    def extend(self, responses, weights=None):
+        """Carry on over ``responses``, the responses so far followed by new ones (with the ``weights`` of each)"""
+        self.responses = responses
+
+
+class _ArgumentsCursor(object):
+    """
+    Cursor over the responses of a command with arguments, for one serial command, with the values of the
+    arguments substituted into the responses. The responses come from the command's cursor, which is shared by every
+    serial command it matches.
+    """
+
+    def __init__(self, cursor, arguments):
+        self.cursor = cursor
+        self.arguments = arguments
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        response = next(self.cursor)
+        substituted = substitute_arguments(response, self.arguments)
+        if isinstance(response, DelayedResponse):  # the substituted string is a plain one
+            return DelayedResponse(substituted, response.delay)
+        return substituted
+
+    next = __next__  # python 2
+
+    @property
+    def position(self):
+        return self.cursor.position
+
+    @position.setter
+    def position(self, position):
+        self.cursor.position = position
+
+    def rewind(self):
+        """Start again from the first response"""
+        self.cursor.rewind()
+
+
+class _ShuffledResponseCursor(_ResponseCursor):
+    """
+    Cursor over every response once, in an order shuffled (with a Fisher-Yates shuffle) each time
+    the cursor is started
+    """
+
+    def __init__(self, responses, random_state):
+        super(_ShuffledResponseCursor, self).__init__(responses)
+        self.random_state = random_state
+        self.order = random_state.permutation(len(responses))
+
+    def _response(self, position):
+        return self.responses[self.order[position]]
+
+    def rewind(self):
+        super(_ShuffledResponseCursor, self).rewind()
+        self.random_state.shuffle(self.order)
+
+    def extend(self, responses, weights=None):
+        # the new responses are shuffled in with those not given yet, as an inside out Fisher-Yates shuffle would
+        if not isinstance(self.order, list):
+            self.order = self.order.tolist()
+        for new in range(len(self.order), len(responses)):
+            self.order.append(new)
+            swap = self.random_state.randint(self.position, len(self.order))
+            self.order[swap], self.order[-1] = self.order[-1], self.order[swap]
+        super(_ShuffledResponseCursor, self).extend(responses, weights)
+
+
+class _RandomResponseCursor(_ResponseCursor):
+    """
+    Cursor over random responses, with replacement, that never runs out. Random rows are drawn
+    ``batch_size`` at a time, rather than one call to the random number generator per response.
+    """
+
+    batch_size = 256
+
+    def __init__(self, responses, random_state):
+        super(_RandomResponseCursor, self).__init__(responses)
+        self.random_state = random_state
+        self._rows = []
+        self._next_row = 0
+
+    def __next__(self):
+        if self._next_row >= len(self._rows):
+            self._rows = self._draw_rows()
+            self._next_row = 0
+        row = self._rows[self._next_row]
+        self._next_row += 1
+        self.position += 1
+        return self.responses[row]
+
+    next = __next__  # python 2
+
+    def _draw_rows(self):
+        return self.random_state.randint(0, len(self.responses), size=self.batch_size)
+
+    def extend(self, responses, weights=None):
+        super(_RandomResponseCursor, self).extend(responses, weights)
+        self._rows = []  # drawn again, from every response
+        self._next_row = 0
+
+
+class _WeightedResponseCursor(_RandomResponseCursor):
+    """
+    Cursor over random responses, with replacement, picked in proportion to their weights. The weights are
+    turned into an alias table (Vose's alias method) once, so that every draw takes constant time, however
+    many responses there are.
+    """
+
+    def __init__(self, responses, random_state, weights):
+        super(_WeightedResponseCursor, self).__init__(responses, random_state)
+        self.probability, self.alias = _alias_table(weights)
+
+    def extend(self, responses, weights=None):
+        super(_WeightedResponseCursor, self).extend(responses, weights)
+        self.probability, self.alias = _alias_table(weights)
+
+    def _draw_rows(self):
+        rows = self.random_state.randint(0, len(self.responses), size=self.batch_size)
+        keep = self.random_state.random_sample(self.batch_size) < self.probability[rows]
+        return np.where(keep, rows, self.alias[rows])
+
+
+def _alias_table(weights):
+    """
+    Alias table for picking indexes in proportion to ``weights`` in constant time: pick a random index ``i``,
+    and keep it with probability ``probability[i]``, otherwise use ``alias[i]`` instead.
+
+    Args:
+        weights (list[float]): Relative weight of each index. Must not be negative, and at least one
+            must be positive.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: ``(probability, alias)``
+
+    Examples
+    --------
+    >>> probability, alias = _alias_table([1, 3])
+    >>> probability.tolist(), alias.tolist()
+    ([0.5, 1.0], [1, 1])
+    """
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    if (weights < 0).any() or not total > 0:
+        raise ValueError("Weights must not be negative, and at least one must be positive, got %s" % weights)
+    scaled = weights * len(weights) / total
+    probability = np.ones(len(weights))
+    alias = np.arange(len(weights))
+    small = [i for i, weight in enumerate(scaled) if weight < 1]
+    large = [i for i, weight in enumerate(scaled) if weight >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] += scaled[less] - 1
+        (small if scaled[more] < 1 else large).append(more)
+    return probability, alias  # anything left over is (up to rounding) exactly 1
 
 
 __doc__ = """
@@ -0,0 +1,490 @@
+import csv
+import io
+import json
+import logging
+import mmap
+import os
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from granola.utils import IS_PYTHON3, decode_escape_char, replace_file
+
+logger = logging.getLogger(__name__)
+
+NAN = float("nan")
+
+INDEX_SUFFIX = ".granola-index"
+INDEX_VERSION = 2
+
+
+class CommandTable(object):
+    """
+    Lightweight table of canned serial commands, stored as a plain list per column, for
+    :class:`~granola.command_readers.SerialCmds` without pandas. It has just what canned queries need,
+    loading from CSV files and dictionaries, extra fields, and concatenating, and is turned into a pandas
+    DataFrame with :meth:`to_dataframe` only when one is asked for.
+
+    Missing values are NaN, as they would be in a DataFrame.
+
+    Args:
+        columns (dict, optional): Column name to list of values. Defaults to empty `cmd` and `response` columns
+
+    Examples
+    --------
+    >>> table = CommandTable.from_records([{"cmd": "get -sn\\r", "response": "42\\r>"}, {"cmd": "reset\\r"}])
+    >>> table.add_fields(delay=5)
+    >>> len(table), list(table.columns)
+    (2, ['cmd', 'response', 'delay'])
+    >>> table["response"]
+    ['42\\r>', nan]
+    """
+
+    lazy = False  # whether values are only read when they are used
+
+    def __init__(self, columns=None):
+        self.columns = OrderedDict(columns if columns is not None else [("cmd", []), ("response", [])])
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __repr__(self):
+        return "<{name} {rows} rows, columns {columns}>".format(
+            name=self.__class__.__name__, rows=len(self), columns=list(self.columns)
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        """Table from a list of dictionaries, one per row"""
+        names = OrderedDict()
+        for record in records:
+            names.update((name, None) for name in record)
+        return cls((name, [record.get(name, NAN) for record in records]) for name in names)
+
+    @classmethod
+    def read_csv(cls, path):
+        """
+        Table from a CSV file with a header row, as :func:`~granola.utils.load_serial_df` would load it.
+        Escape characters in the `cmd` and `response` columns are decoded, and every other column is
+        converted to numbers if all of its values are numbers.
+        """
+        if IS_PYTHON3:
+            with io.open(path, "r", newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f, skipinitialspace=True))
+        else:  # pragma: no cover
+            with open(path, "rb") as f:
+                rows = list(csv.reader(f, skipinitialspace=True))
+        if not rows:
+            return cls()
+        header, rows = rows[0], [row for row in rows[1:] if row]
+        columns = OrderedDict()
+        for i, name in enumerate(header):
+            values = [row[i] if i < len(row) else "" for row in rows]
+            if name in ("cmd", "response"):
+                columns[name] = [decode_escape_char(value) for value in values]
+            else:
+                columns[name] = _convert_column(values)
+        return cls(columns)
+
+    @classmethod
+    def concat(cls, tables):
+        """One table with the rows of every table, in order. Columns missing from a table are NaN"""
+        names = OrderedDict()
+        for table in tables:
+            names.update((name, None) for name in table.columns)
+        columns = OrderedDict((name, []) for name in names)
+        for table in tables:
+            for name, values in columns.items():
+                values.extend(table.columns[name] if name in table.columns else [NAN] * len(table))
+        return cls(columns)
+
+    def add_fields(self, **fields):
+        """
+        Add extra fields as columns. Each value is either a single value, broadcast to every row, or
+        a list with a value per row. Fields that already exist only have their missing values filled in.
+        """
+        for name, value in fields.items():
+            values = list(value) if isinstance(value, (list, tuple)) else [value] * len(self)
+            if len(values) != len(self):
+                raise ValueError("Length of values (%s) does not match number of rows (%s)" % (len(values), len(self)))
+            if name in self.columns:
+                self.columns[name] = [new if _is_missing(old) else old for old, new in zip(self.columns[name], values)]
+            else:
+                self.columns[name] = values
+
+    def index(self, column="response"):
+        """
+        Group the values of ``column`` by command, in the order they appear.
+
+        Returns:
+            dict: Command to array of its values.
+        """
+        groups = OrderedDict()
+        for cmd, value in zip(self.columns["cmd"], self.columns[column]):
+            if not _is_missing(cmd):
+                groups.setdefault(cmd, []).append(value)
+        return {cmd: _object_array(values) for cmd, values in groups.items()}
+
+    def to_dataframe(self):
+        """The table as a pandas DataFrame (requires pandas)"""
+        import pandas as pd
+
+        return pd.DataFrame(OrderedDict((name, list(values)) for name, values in self.columns.items()))
+
+
+class MappedCommandTable(CommandTable):
+    """
+    Table of the canned serial commands in a CSV file, such as a long capture from
+    :class:`~granola.serial_sniffer.SerialSniffer`, that is memory mapped instead of read, so that files larger than
+    memory can be used. Rows are only decoded when they are used, so a command's responses are decoded one at a
+    time as a cursor reaches them.
+
+    Opening the file only needs an index of where each command's rows start, which is built by scanning the file
+    once, and then saved next to the file (as ``<file>.granola-index``), so later opens only load the index.
+    The saved index is rebuilt whenever the file changes.
+
+    Each row must be on one line, as SerialSniffer writes them.
+
+    Args:
+        path (str): Path to the CSV file.
+        save_index (bool, optional): Whether to save the index next to the file. Defaults to True
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "capture.csv")
+    >>> with open(path, "w") as f:
+    ...     f.writelines(["cmd,response,delay(ms)\\n", "get -sn\\\\r,42\\\\r>,1\\n", "get -sn\\\\r,43\\\\r>,2\\n"])
+    >>> table = MappedCommandTable(path)
+    >>> responses = table.index()["get -sn\\r"]
+    >>> len(responses), responses[1]
+    (2, '43\\r>')
+    >>> os.path.exists(path + INDEX_SUFFIX)
+    True
+    """
+
+    lazy = True
+
+    def __init__(self, path, save_index=True):
+        self.path = str(path)
+        self.save_index = save_index
+        self._open()
+        index = self._load_index()
+        if index is None:
+            index = self._build_index()
+            if save_index:
+                self._save_index(index)
+        self.header = index["header"]
+        self.rows = index["rows"]
+        self.offsets = index["offsets"]
+        self.extra_fields = OrderedDict()
+        self.columns = OrderedDict((name, self._column(name, self.rows)) for name in self.header)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_file"], state["_mmap"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def add_fields(self, **fields):
+        """Add extra fields, as for :meth:`CommandTable.add_fields`, without reading the rows"""
+        for name, value in fields.items():
+            if isinstance(value, (list, tuple)) and len(value) != len(self):
+                raise ValueError("Length of values (%s) does not match number of rows (%s)" % (len(value), len(self)))
+            self.extra_fields[name] = value
+            self.columns[name] = self._column(name, self.rows)
+
+    def index(self, column="response"):
+        return OrderedDict((cmd, self._column(column, offsets)) for cmd, offsets in self.offsets.items())
+
+    def to_dataframe(self):
+        """The whole file as a pandas DataFrame (requires pandas, and reads every row)"""
+        return CommandTable(OrderedDict((name, list(column)) for name, column in self.columns.items())).to_dataframe()
+
+    def row(self, offset):
+        """Decoded row starting at byte ``offset``, as a dictionary"""
+        end = self._mmap.find(b"\n", offset)
+        line = self._mmap[offset : end if end != -1 else len(self._mmap)].rstrip(b"\r").decode("utf-8")
+        values = next(csv.reader([line], skipinitialspace=True))
+        row = OrderedDict()
+        for i, name in enumerate(self.header):
+            value = values[i] if i < len(values) else ""
+            row[name] = decode_escape_char(value) if name in ("cmd", "response") else _convert_value(value)
+        return row
+
+    def _column(self, name, offsets):
+        position = self.header.index(name) if name in self.header else None
+        return _MappedColumn(self, name, position, offsets)
+
+    def _open(self):
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # an empty file can't be mapped
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def _stamp(self):
+        stat = os.stat(self.path)
+        return [INDEX_VERSION, stat.st_size, stat.st_mtime]
+
+    def _load_index(self):
+        # the index is a line of JSON, followed by the row offsets, and then each command's row offsets one after
+        # another, saved as numpy arrays, so loading it never unpickles anything
+        try:
+            with open(self.path + INDEX_SUFFIX, "rb") as f:
+                meta = json.loads(f.readline().decode("utf-8"))
+                if not isinstance(meta, dict) or meta.get("stamp") != self._stamp():
+                    return None
+                rows = np.load(f, allow_pickle=False)
+                cmd_offsets = np.load(f, allow_pickle=False)
+            cmds, counts = meta["cmds"], meta["counts"]
+            if len(cmds) != len(counts) or sum(counts) != len(cmd_offsets):
+                return None
+        except (IOError, OSError, EOFError, ValueError, KeyError, TypeError):
+            return None
+        offsets = OrderedDict(zip(cmds, np.split(cmd_offsets, np.cumsum(counts)[:-1]) if cmds else []))
+        logger.debug("%s loaded saved index for %s", self.__class__.__name__, self.path)
+        return {"stamp": meta["stamp"], "header": meta["header"], "rows": rows, "offsets": offsets}
+
+    def _save_index(self, index):
+        tmp_path = "{path}{suffix}.{pid}".format(path=self.path, suffix=INDEX_SUFFIX, pid=os.getpid())
+        offsets = index["offsets"]
+        meta = {
+            "stamp": index["stamp"],
+            "header": index["header"],
+            "cmds": list(offsets),
+            "counts": [len(cmd_offsets) for cmd_offsets in offsets.values()],
+        }
+        cmd_offsets = np.concatenate(list(offsets.values())) if offsets else np.array([], dtype=np.int64)
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps(meta).encode("utf-8") + b"\n")
+                np.save(f, index["rows"], allow_pickle=False)
+                np.save(f, cmd_offsets, allow_pickle=False)
+            replace_file(tmp_path, self.path + INDEX_SUFFIX)
+        except (IOError, OSError) as err:
+            logger.debug("%s couldn't save index for %s: %r", self.__class__.__name__, self.path, err)
+
+    def _build_index(self):
+        """Scan the file once, recording where every row starts, grouped by (raw) command"""
+        data, size = self._mmap, len(self._mmap)
+        end = data.find(b"\n") if size else -1
+        header_line = data[: end if end != -1 else size].rstrip(b"\r").decode("utf-8")
+        header = next(csv.reader([header_line], skipinitialspace=True)) if header_line else ["cmd", "response"]
+        rows = array("q")
+        raw_offsets = OrderedDict()
+        position = end + 1 if end != -1 else size
+        while position < size:
+            end = data.find(b"\n", position)
+            if end == -1:
+                end = size
+            if data[position:end].strip(b"\r \t"):
+                if data[position : position + 1] == b'"':  # quoted, so let csv unquote it
+                    raw = next(csv.reader([data[position:end].rstrip(b"\r").decode("utf-8")]))[0].encode("utf-8")
+                else:
+                    comma = data.find(b",", position, end)
+                    raw = data[position : comma if comma != -1 else end].rstrip(b"\r")
+                if raw not in raw_offsets:
+                    raw_offsets[raw] = array("q")
+                raw_offsets[raw].append(position)
+                rows.append(position)
+            position = end + 1
+        offsets = OrderedDict()
+        for raw, cmd_offsets in raw_offsets.items():
+            cmd = decode_escape_char(raw.decode("utf-8").lstrip(" "))
+            offsets[cmd] = np.concatenate([offsets[cmd], cmd_offsets]) if cmd in offsets else np.array(cmd_offsets)
+        logger.debug("%s indexed %s rows of %s", self.__class__.__name__, len(rows), self.path)
+        return {"stamp": self._stamp(), "header": header, "rows": np.array(rows), "offsets": offsets}
+
+
+class _MappedColumn(object):
+    """Sequence of the values of one column of a :class:`MappedCommandTable`, in some of its rows"""
+
+    def __init__(self, table, name, position, offsets):
+        self.table = table
+        self.name = name
+        self.position = position
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        offset = self.offsets[i]
+        value = self.table.row(offset)[self.name] if self.position is not None else NAN
+        if self.name in self.table.extra_fields:
+            extra = self.table.extra_fields[self.name]
+            if isinstance(extra, (list, tuple)):
+                extra = extra[int(np.searchsorted(self.table.rows, offset))]
+            if _is_missing(value):
+                value = extra
+        return value
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ChainedCommandTable(CommandTable):
+    """
+    Several tables used as one, without copying their rows, so that :class:`MappedCommandTable`
+    files stay on disk when they are used with other canned queries.
+    """
+
+    def __init__(self, tables):
+        self.tables = list(tables)
+        self._chain_columns()
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables)
+
+    def add_fields(self, **fields):
+        """
+        Add extra fields, as for :meth:`CommandTable.add_fields`, to each of the tables, so that lazy tables stay
+        that way. A list of values, one per row, is split between the tables.
+        """
+        for name, value in fields.items():
+            if isinstance(value, (list, tuple)) and len(value) != len(self):
+                raise ValueError("Length of values (%s) does not match number of rows (%s)" % (len(value), len(self)))
+        start = 0
+        for table in self.tables:
+            end = start + len(table)
+            table.add_fields(
+                **OrderedDict(
+                    (name, list(value[start:end]) if isinstance(value, (list, tuple)) else value)
+                    for name, value in fields.items()
+                )
+            )
+            start = end
+        self._chain_columns()
+
+    def index(self, column="response"):
+        groups = OrderedDict()
+        for table in self.tables:
+            if column in table.columns:
+                index = table.index(column)
+            else:  # so that the values of every command line up with its responses
+                index = OrderedDict((cmd, [NAN] * len(values)) for cmd, values in table.index().items())
+            for cmd, values in index.items():
+                groups.setdefault(cmd, []).append(values)
+        return OrderedDict(
+            (cmd, sequences[0] if len(sequences) == 1 else _ChainedSequence(sequences))
+            for cmd, sequences in groups.items()
+        )
+
+    def to_dataframe(self):
+        return CommandTable.concat(
+            [CommandTable(OrderedDict((n, list(c)) for n, c in t.columns.items())) for t in self.tables]
+        ).to_dataframe()
+
+    def _chain_columns(self):
+        names = OrderedDict()
+        for table in self.tables:
+            names.update((name, None) for name in table.columns)
+        self.columns = OrderedDict(
+            (name, _ChainedSequence([_column_or_missing(t, name) for t in self.tables])) for name in names
+        )
+
+
+class _ChainedSequence(object):
+    """Sequences used as one"""
+
+    def __init__(self, sequences):
+        self.sequences = sequences
+        self.starts = np.cumsum([0] + [len(sequence) for sequence in sequences])
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        which = int(np.searchsorted(self.starts, i, side="right")) - 1
+        return self.sequences[which][i - self.starts[which]]
+
+    def __iter__(self):
+        for sequence in self.sequences:
+            for value in sequence:
+                yield value
+
+
+class _FilledColumn(object):
+    """
+    Sequence of the values of one column of a lazy table, in some of its ``rows`` (their positions in the table), with
+    missing values filled in from an extra field, which is either a single value, or a list with a value per row
+    """
+
+    def __init__(self, values, extra, rows):
+        self.values = values  # None when the table doesn't have the column
+        self.extra = extra
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        value = NAN if self.values is None else self.values[i]
+        if not _is_missing(value):
+            return value
+        if isinstance(self.extra, (list, tuple)):
+            return self.extra[int(self.rows[i])]
+        return self.extra
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _column_or_missing(table, name):
+    return table.columns[name] if name in table.columns else [NAN] * len(table)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _convert_value(value):
+    """A CSV value as a number if it is one, NaN if it is empty, otherwise the string"""
+    if value == "":
+        return NAN
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _convert_column(values):
+    """Numbers if every (non empty) value is one, with empty values as NaN, otherwise strings"""
+    for convert in (int, float):
+        try:
+            return [convert(value) if value != "" else NAN for value in values]
+        except ValueError:
+            pass
+    return [value if value != "" else NAN for value in values]
+
+
+__doc__ = """
+Storage for canned serial commands that only needs the standard library :mod:`csv` module and numpy,
+so canned queries can be used without pandas, including memory mapped CSV files too big to be read.
+"""
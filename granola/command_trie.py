@@ -0,0 +1,181 @@
+import re
+from collections import OrderedDict
+
+_NO_VALUE = object()
+
+
+class CommandTrie(object):
+    """
+    Commands with arguments, such as ``set -volt {{ volt }}\\r``, stored by their characters in a prefix tree,
+    so that finding the command matching a serial command, and the values of its arguments, takes time in proportion
+    to the length of the serial command, however many commands there are.
+
+    Arguments are written like jinja2 variables, and match any text (including none). Where an argument could
+    end in more than one place, it is as long as it can be, as with the regular expression ``.*``, and where more
+    than one command matches, characters of a command win over arguments, and then the command added first wins.
+
+    Args:
+        variable_start_string (str, optional): Start of an argument. Defaults to "{{"
+        variable_end_string (str, optional): End of an argument. Defaults to "}}"
+
+    Examples
+    --------
+    >>> trie = CommandTrie()
+    >>> trie.add("set -volt {{ volt }}\\r", "OK\\r>")
+    >>> trie.add("set -volt max\\r", "ERROR\\r>")
+    >>> trie.add("get -ch {{ ch }} -{{ unit }}\\r", "Channel {{ ch }} in {{ unit }}\\r>")
+    >>> trie.match("set -volt 12.5\\r")
+    ('OK\\r>', OrderedDict([('volt', '12.5')]))
+    >>> trie.match("set -volt max\\r")
+    ('ERROR\\r>', OrderedDict())
+    >>> response, arguments = trie.match("get -ch 2 -mV\\r")
+    >>> substitute_arguments(response, arguments)
+    'Channel 2 in mV\\r>'
+    >>> trie.match("reset\\r") is None
+    True
+    """
+
+    def __init__(self, variable_start_string="{{", variable_end_string="}}"):
+        self.variable_start_string = variable_start_string
+        self.variable_end_string = variable_end_string
+        self._root = _Node()
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, command, value):
+        """Add ``command``, with its arguments, matching to ``value``. Commands already added are kept"""
+        node = self._root
+        for kind, text in self.parse(command):
+            if kind == "argument":
+                node = node.arguments.setdefault(text, _Node())
+                continue
+            for char in text:
+                node = node.children.setdefault(char, _Node())
+        if node.value is _NO_VALUE:
+            node.value = value
+            self._len += 1
+
+    def match(self, cmd):
+        """
+        The value of the command matching ``cmd``, and the values of its arguments, or None
+
+        Returns:
+            tuple[object, OrderedDict] | None: value and arguments of the matching command.
+        """
+        arguments = []
+        value = self._match(self._root, cmd, 0, arguments, set())
+        if value is _NO_VALUE:
+            return None
+        return value, OrderedDict(reversed(arguments))
+
+    def parse(self, command):
+        """
+        The parts of ``command``, in order, each either ``("literal", text)``, or ``("argument", name)``
+
+        Raises:
+            ValueError: If an argument isn't closed
+        """
+        parts = []
+        start, end = self.variable_start_string, self.variable_end_string
+        position = 0
+        while True:
+            opening = command.find(start, position)
+            if opening == -1:
+                break
+            closing = command.find(end, opening + len(start))
+            if closing == -1:
+                raise ValueError("Argument not closed with %r in command %r" % (end, command))
+            if opening > position:
+                parts.append(("literal", command[position:opening]))
+            parts.append(("argument", command[opening + len(start) : closing].strip()))
+            position = closing + len(end)
+        if position < len(command):
+            parts.append(("literal", command[position:]))
+        return parts
+
+    def arguments(self, command):
+        """Names of the arguments of ``command``"""
+        return [text for kind, text in self.parse(command) if kind == "argument"]
+
+    def _match(self, node, cmd, position, arguments, failed):
+        """
+        Follow the characters of ``cmd`` from ``position`` as far as they go, then try the arguments at each node
+        on the way, from the last. Only arguments recurse, so the depth is the number of arguments.
+
+        Whether the rest of ``cmd`` matches from a node only depends on where it starts, so the nodes and positions
+        that didn't match are kept in ``failed``, and each is only tried once. Otherwise, every way of splitting
+        ``cmd`` between the arguments would be tried, and a command with k arguments would take time in proportion
+        to the k-th power of the length of ``cmd``.
+        """
+        entry = (node, position)
+        if entry in failed:
+            return _NO_VALUE
+        branches = []
+        while True:
+            if node.arguments:
+                branches.append((node, position))
+            if position == len(cmd):
+                if node.value is not _NO_VALUE:
+                    return node.value
+                break
+            node = node.children.get(cmd[position])
+            if node is None:
+                break
+            position += 1
+        for node, start in reversed(branches):
+            for name, after in node.arguments.items():
+                for end in self._argument_ends(after, cmd, start):
+                    value = self._match(after, cmd, end, arguments, failed)
+                    if value is not _NO_VALUE:
+                        arguments.append((name, cmd[start:end]))
+                        return value
+        failed.add(entry)
+        return _NO_VALUE
+
+    @staticmethod
+    def _argument_ends(after, cmd, start):
+        """Where an argument starting at ``start`` could end, from the longest, given the node after it"""
+        if after.arguments or after.value is not _NO_VALUE:
+            yield len(cmd)
+        for end in range(len(cmd) - 1, start - 1, -1):
+            if after.arguments or cmd[end] in after.children:
+                yield end
+
+
+class _Node(object):
+    __slots__ = ("children", "arguments", "value")
+
+    def __init__(self):
+        self.children = {}
+        self.arguments = OrderedDict()
+        self.value = _NO_VALUE
+
+    def __getstate__(self):
+        return self.children, self.arguments, self.value is not _NO_VALUE, self.value
+
+    def __setstate__(self, state):
+        self.children, self.arguments, has_value, value = state
+        self.value = value if has_value else _NO_VALUE
+
+
+def substitute_arguments(text, arguments, variable_start_string="{{", variable_end_string="}}"):
+    """
+    ``text`` with each of its arguments, written like jinja2 variables, replaced by their values in ``arguments``.
+    Anything else, including arguments without a value, is left as it is.
+    """
+    if not arguments or not isinstance(text, str):
+        return text
+    pattern = r"%s\s*(%s)\s*%s" % (
+        re.escape(variable_start_string),
+        "|".join(re.escape(name) for name in arguments),
+        re.escape(variable_end_string),
+    )
+    return re.sub(pattern, lambda match: arguments[match.group(1)], text)
+
+
+__doc__ = """
+Prefix tree of commands with arguments, used by the :mod:`~granola.command_readers` to find setters,
+getters and canned queries with arguments, such as ``set -volt {{ volt }}\\r``, without trying every one of them.
+"""
@@ -73,6 +73,27 @@ class RandomizeResponse(DocumentedEnum):
     randomize_and_remove = "Randomize and remove"
 
 
+class CannedQueriesBackend(DocumentedEnum):
+    """
+    The different ways :class:`~granola.command_readers.SerialCmds` can store canned queries
+    """
+
+    csv = "Standard library csv module and plain lists, without pandas"
+    pandas = "pandas DataFrames"
+    mmap = "Memory mapped CSV files, with rows decoded as they are used, for files too big to read"
+
+
+class CommandMatch(DocumentedEnum):
+    """
+    How the ``cmd`` of a canned query is matched against incoming serial commands, set with its ``match`` column
+    """
+
+    exact = "Only the command itself"
+    regex = "A regular expression that matches the whole command"
+    glob = "A glob pattern that matches the whole command, with ``*``, ``?`` and ``[...]`` wildcards"
+    template = "A command with ``{{ argument }}`` arguments, whose values are substituted into the responses"
+
+
 class HookTypes(DocumentedEnum):
     """
     Allowed hook types for ``BaseHook`` methods or for a ``register_hook``
@@ -0,0 +1,159 @@
+import mmap
+import os
+
+from granola.command_table import _convert_value, _is_missing
+from granola.utils import fixpath, resolve_data_path
+
+
+class FileResponse(object):
+    """
+    Response read from a file, or a range of its bytes, such as a data log download or a memory dump, rather than
+    kept in a canned query. Nothing is read until the response is given, and then its bytes are memory mapped,
+    and only copied out of the file as they are read from the device.
+
+    Canned queries use a file response for rows with a ``response_file``, which is a path (relative to the
+    configuration, like canned query files), optionally followed by the range of bytes to use, like a URL::
+
+        cmd,response,response_file
+        dump\\r,,memory.bin?offset=4096&length=1024
+
+    Args:
+        path (str): Path to the file.
+        offset (int, optional): First byte of the response. Defaults to 0
+        length (int, optional): Number of bytes in the response. Defaults to the rest of the file
+        delay (float, optional): Seconds to hold the response back for, as for
+            :class:`~granola.command_readers.DelayedResponse`. Defaults to 0
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "dump.bin")
+    >>> with open(path, "wb") as f:
+    ...     _ = f.write(b"header" + bytes(range(10)))
+    >>> response = FileResponse.from_spec("dump.bin?offset=6&length=4", data_path_root=path)
+    >>> len(response)
+    4
+    >>> stream = response.open()
+    >>> stream.read(3), len(stream), stream.read(3)
+    (b'\\x00\\x01\\x02', 1, b'\\x03')
+    """
+
+    def __init__(self, path, offset=0, length=None, delay=0):
+        self.path = str(path)
+        self.offset = offset
+        self.length = length
+        self.delay = delay
+
+    @classmethod
+    def from_spec(cls, spec, data_path_root=None):
+        """File response from a ``response_file``, such as ``"memory.bin?offset=4096&length=1024"``"""
+        path, _, query = str(spec).partition("?")
+        options = {}
+        for option in query.split("&") if query else []:
+            name, _, value = option.partition("=")
+            if name not in ("offset", "length"):
+                raise ValueError("Unknown option %r in response file %r" % (name, spec))
+            options[name] = int(_convert_value(value))
+        return cls(fixpath(resolve_data_path(path, data_path_root)), **options)
+
+    def __len__(self):
+        if self.length is not None:
+            return self.length
+        return max(os.stat(self.path).st_size - self.offset, 0)
+
+    def __eq__(self, other):
+        return isinstance(other, FileResponse) and (self.path, self.offset, self.length) == (
+            other.path,
+            other.offset,
+            other.length,
+        )
+
+    def __ne__(self, other):  # python 2
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.path, self.offset, self.length))
+
+    def __repr__(self):
+        return "FileResponse(%r, offset=%r, length=%r)" % (self.path, self.offset, self.length)
+
+    __str__ = __repr__
+
+    def open(self):
+        """Stream of the response's bytes, to read from"""
+        return ResponseStream(self)
+
+
+class ResponseStream(object):
+    """
+    Bytes of a :class:`FileResponse` that haven't been read yet, memory mapped from the file, so that reading a chunk
+    only copies that chunk. The file is mapped until every byte has been read, or the stream is closed.
+
+    Args:
+        response (FileResponse): Response to stream.
+        position (int, optional): Bytes already read. Defaults to 0
+    """
+
+    def __init__(self, response, position=0):
+        self.response = response
+        self.position = position
+        with open(response.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # an empty file can't be mapped
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        end = size if response.length is None else min(response.offset + response.length, size)
+        self._view = memoryview(self._mmap)[min(response.offset, end) : end]
+
+    def __len__(self):
+        return len(self._view) - self.position
+
+    def __getstate__(self):
+        return {"response": self.response, "position": self.position}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def read(self, size=-1):
+        """Up to ``size`` of the bytes not read yet (or all of them)"""
+        end = len(self._view) if size < 0 else min(self.position + size, len(self._view))
+        chunk = self._view[self.position : end].tobytes()
+        self.position = end
+        return chunk
+
+    def close(self):
+        """Stop mapping the file"""
+        self._view.release()
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+
+class _FileResponses(object):
+    """
+    The responses of one command, with a :class:`FileResponse` instead in rows with a ``response_file`` in ``files``.
+    The file responses are made as they are used.
+    """
+
+    def __init__(self, responses, files, data_path_root=None):
+        self.responses = responses
+        self.files = files
+        self.data_path_root = data_path_root
+
+    def __len__(self):
+        return len(self.responses)
+
+    def __getitem__(self, i):
+        spec = self.files[i]
+        if _is_missing(spec) or spec == "":
+            return self.responses[i]
+        return FileResponse.from_spec(spec, self.data_path_root)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+__doc__ = """
+Large responses, such as data log downloads and memory dumps, streamed from files rather than kept in canned queries.
+A :class:`FileResponse` is memory mapped when it is given, and each read from the device copies only the bytes read,
+so responses of many megabytes use almost no memory until they are read.
+"""
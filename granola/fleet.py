@@ -0,0 +1,195 @@
+import logging
+import time
+
+import numpy as np
+
+from granola.breakfast_cereal import Cereal
+from granola.checkpoint import load_checkpoint, save_checkpoint
+from granola.command_readers import GettersAndSetters
+from granola.hooks.hooks import ApproachHook
+from granola.hooks.transitions import TransitionEngine
+from granola.metrics import FleetMetrics
+from granola.signals import SignalBank
+
+logger = logging.getLogger(__name__)
+
+
+class Fleet(object):
+    """
+    A collection of :class:`~granola.breakfast_cereal.Cereal` devices that share fleet level state.
+
+    Every :class:`~granola.hooks.hooks.ApproachHook` on a device added to the fleet is pointed at
+    the fleet's :class:`~granola.hooks.transitions.TransitionEngine`, so the transitions of every device
+    live in the same arrays and can be evaluated together with :meth:`approach_values`, instead of
+    one device and one attribute at a time.
+
+    The fleet also owns a :class:`~granola.signals.SignalBank`, whose signals every device's
+    :class:`~granola.command_readers.GettersAndSetters` templates can read with ``{{ signals.signal_name }}``,
+    and a :class:`~granola.metrics.FleetMetrics` that counts the commands, bytes and time of every device.
+
+    Args:
+        devices (list[Cereal], optional): Devices to add to the fleet. Defaults to ``[]``
+        clock (callable, optional): Function that returns the current time in seconds, such as
+            a :class:`~granola.clocks.VirtualClock`. Defaults to :func:`time.time`
+        signals (dict[str, BaseSignal | dict], optional): Signals shared by the fleet. See
+            :class:`~granola.signals.SignalBank`. Defaults to ``{}``
+        signal_tick (float, optional): Seconds between recomputing the signals. Defaults to 1
+        data_path_root (str, optional): Path to resolve the relative data files of signals against, such as the
+            ``file`` of a :class:`~granola.signals.RecordedSeries`. Defaults to None, only absolute paths
+
+    Examples
+    --------
+    >>> from granola import ApproachHook, Cereal
+    >>> command_readers = {
+    ...     "GettersAndSetters": {
+    ...         "default_values": {"temp": "20"},
+    ...         "getters": [{"cmd": "get temp\\r", "response": "{{ temp }}\\r>"}],
+    ...         "setters": [{"cmd": "set temp {{ temp }}\\r", "response": "OK\\r>"}],
+    ...     }
+    ... }
+    >>> fleet = Fleet(Cereal(command_readers, hooks=[ApproachHook(attributes={"temp"}, include_or_exclude="include")])
+    ...               for _ in range(3))
+    >>> fleet[0].write(b"set temp 30\\r")
+    12
+    >>> values = fleet.approach_values("temp")
+    >>> values.shape
+    (3,)
+    >>> bool(20 <= values[0] < 30), values[1:].tolist()
+    (True, [20.0, 20.0])
+    """
+
+    def __init__(self, devices=None, clock=time.time, signals=None, signal_tick=1.0, data_path_root=None):
+        self.clock = clock
+        self.transitions = TransitionEngine(clock=clock)
+        self.signals = SignalBank(signals, tick=signal_tick, clock=clock, data_path_root=data_path_root)
+        self.metrics = FleetMetrics()
+        self.devices = []
+        for device in devices if devices is not None else []:
+            self.add(device)
+
+    @classmethod
+    def mock_from_json(cls, config_key, config_path="config.json", count=1, clock=time.time, signals=None, **kwargs):
+        """
+        Create a fleet of ``count`` devices, each configured like :meth:`.Cereal.mock_from_json`. Relative data
+        files of ``signals`` are relative to the configuration, like canned query files.
+        """
+        devices = (Cereal.mock_from_json(config_key, config_path=config_path, **kwargs) for _ in range(count))
+        return cls(devices, clock=clock, signals=signals, data_path_root=kwargs.get("data_path_root", config_path))
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __getitem__(self, index):
+        return self.devices[index]
+
+    @classmethod
+    def resume(cls, path):
+        """
+        Resume a fleet from a checkpoint saved with :meth:`checkpoint`. Checkpoints are pickles, so only resume ones
+        you trust. See :func:`~granola.checkpoint.load_checkpoint`.
+        """
+        return load_checkpoint(path, fleet_class=cls)
+
+    def checkpoint(self, path, compress=True):
+        """
+        Save the complete state of the fleet to ``path``. See :func:`~granola.checkpoint.save_checkpoint`.
+        """
+        return save_checkpoint(self, path, compress=compress)
+
+    def add(self, device):
+        """
+        Add a device to the fleet and bind its fleet level state.
+
+        Args:
+            device (Cereal): Device to add.
+
+        Returns:
+            int: index of the device in the fleet.
+        """
+        index = len(self.devices)
+        self.devices.append(device)
+        self._bind_transition_engine(device)
+        self.signals.resize(len(self.devices))
+        reader = _getters_and_setters(device)
+        if reader is not None:
+            reader.signals = self.signals.view(index)
+        device._metrics_ = self.metrics.recorder(index)
+        for reader in device._readers_.values():
+            reader._metrics_ = device._metrics_
+        logger.debug("%s added %s as device %s", self.__class__.__name__, device, index)
+        return index
+
+    def approach_values(self, attribute, now=None):
+        """
+        Current value of ``attribute`` on every device in one vectorised call.
+
+        Devices with a running :class:`~granola.hooks.hooks.ApproachHook` transition for ``attribute``
+        get the transition's current value, the rest get the attribute's stored value
+        (or nan if it doesn't have one, or it isn't numeric).
+
+        Args:
+            attribute (str): Name of the :class:`~granola.command_readers.GettersAndSetters` attribute.
+            now (float, optional): Time to evaluate at. Defaults to now.
+
+        Returns:
+            np.ndarray: one value per device, in fleet order.
+        """
+        owners = [_getters_and_setters(device) for device in self.devices]
+        values = self.transitions.values_for(owners, attribute, now=now)
+        for index in np.flatnonzero(np.isnan(values)):
+            values[index] = _stored_value(owners[index], attribute)
+        return values
+
+    def _checkpoint_state(self):
+        """Fleet level state saved with the devices in a checkpoint"""
+        return {"clock": self.clock, "transitions": self.transitions, "signals": self.signals, "metrics": self.metrics}
+
+    @classmethod
+    def _from_checkpoint_state(cls, devices, state):
+        fleet = cls.__new__(cls)
+        fleet.devices = devices
+        fleet.__dict__.update(state)
+        return fleet
+
+    def _bind_transition_engine(self, device):
+        """Point every ApproachHook of ``device`` at the fleet's engine, carrying over running transitions"""
+        for reader in device._readers_.values():
+            for hook in reader._hooks_:
+                if not isinstance(hook, ApproachHook) or hook.engine is self.transitions:
+                    continue
+                engine = hook.engine
+                for owner, attribute in engine.keys:
+                    slot = engine.slot(owner, attribute)
+                    self.transitions.start(
+                        owner,
+                        attribute,
+                        engine.start_values[slot],
+                        engine.end_values[slot],
+                        engine.transition_times[slot],
+                        set_time=engine.set_times[slot],
+                    )
+                hook.engine = self.transitions
+
+
+def _getters_and_setters(device):
+    for reader in device._readers_.values():
+        if isinstance(reader, GettersAndSetters):
+            return reader
+    return None
+
+
+def _stored_value(reader, attribute):
+    try:
+        return float(reader.instrument_attributes[attribute].value)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return np.nan
+
+
+__doc__ = """
+A :class:`Fleet` groups many :class:`~granola.breakfast_cereal.Cereal` devices together so that state
+that would otherwise be computed per device and per command (such as
+:class:`~granola.hooks.hooks.ApproachHook` transitions) can be stored and computed once for all of them.
+"""
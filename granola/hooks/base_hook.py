@@ -1,5 +1,6 @@
 import functools
 import inspect
+from timeit import default_timer as timer
 
 from granola.enums import (
     HookTypes,
@@ -95,6 +96,8 @@ def register_hook(hook_type_enum, hooked_classes):  # TODO madeline allow passin
         hook.__doc__ = func.__doc__
         RegisteredHook.__module__ = func.__module__
         RegisteredHook.__name__ = func.__name__
+        if IS_PYTHON3:  # pragma: no cover
+            RegisteredHook.__qualname__ = func.__qualname__  # lets module level hooks be pickled
 
         setattr(RegisteredHook, hook_type, hook)
 
@@ -127,9 +130,23 @@ def wrap_in_hooks(func):
 
     @functools.wraps(func)
     def wrapper(hooked, data, **kwargs):
+        metrics = getattr(hooked, "_metrics_", None)
+        if metrics is not None:
+            return _timed_wrapper(hooked, data, metrics, **kwargs)
+        data = _run_pre_reading_hooks(hooked=hooked, data=data, **kwargs)
+        result = func(hooked, data, **kwargs)
+        result = _run_post_reading_hooks(hooked=hooked, result=result, data=data, **kwargs)
+        return result
+
+    def _timed_wrapper(hooked, data, metrics, **kwargs):
+        """wrapper that also records the time spent in the hooks to ``metrics``"""
+        start = timer()
         data = _run_pre_reading_hooks(hooked=hooked, data=data, **kwargs)
+        hook_time = timer() - start
         result = func(hooked, data, **kwargs)
+        start = timer()
         result = _run_post_reading_hooks(hooked=hooked, result=result, data=data, **kwargs)
+        metrics.hook_time(hook_time + timer() - start)
         return result
 
     return wrapper
@@ -203,8 +220,7 @@ Here is an example of a hook being created
 >>> @register_hook(hook_type_enum="post_reading", hooked_classes=[CannedQueries])
 ... def LoopCannedQueries(hooked, result, data, **kwargs):
 ...     if result is SENTINEL:
-...         hooked._start_serial_generator(data)
-...         result = next(hooked.serial_generator[data])
+...         result = next(hooked._start_serial_generator(data))
 ...         return result
 ...     return result
 
@@ -1,24 +1,10 @@
-import datetime
-import time
-from math import pi
-
-import attr
-import numpy as np
-
 from granola.command_readers import CannedQueries, GettersAndSetters
 from granola.enums import HookTypes, SetRelationship
 from granola.hooks.base_hook import BaseHook, register_hook
+from granola.hooks.transitions import TransitionEngine
 from granola.utils import SENTINEL
 
 
-@attr.s
-class _ApproachHookAttributes(object):
-    start_value = attr.ib(type=str, default=None, converter=float)
-    end_value = attr.ib(type=str, default=None, converter=float)
-    set_time = attr.ib(type=datetime.datetime, default=None)
-    transition_time = attr.ib(type=int, default=None)
-
-
 class ApproachHook(BaseHook):
     """
     Hook that will on applicable attributes, when a new value is set, it will approach that
@@ -36,6 +22,10 @@ class ApproachHook(BaseHook):
         transition_dsc_scaling (float): A decrease of delta (change) of 1 unit takes this many seconds
             longer to transition. Must be
             negative.
+        engine (TransitionEngine, optional): Where the transitions are stored and evaluated. Pass the same
+            engine to the ApproachHook of every device in a fleet (or let :class:`~granola.fleet.Fleet` do it)
+            to evaluate all of their transitions at once with :meth:`TransitionEngine.values_for`.
+            Defaults to a new :class:`~granola.hooks.transitions.TransitionEngine` for this hook.
     """
 
     hooked_classes = [GettersAndSetters]
@@ -46,10 +36,12 @@ class ApproachHook(BaseHook):
         include_or_exclude=SetRelationship.exclude,
         transition_asc_scaling=40,
         transition_dsc_scaling=100,
+        engine=None,
     ):
         super(ApproachHook, self).__init__(attributes=attributes, include_or_exclude=include_or_exclude)
         self.transition_asc_scaling = transition_asc_scaling
         self.transition_dsc_scaling = transition_dsc_scaling
+        self.engine = engine if engine is not None else TransitionEngine()
 
         if self.transition_asc_scaling <= 0 or self.transition_dsc_scaling <= 0:
             raise ValueError("Inappropriate transition scaling value!")
@@ -64,15 +56,15 @@ class ApproachHook(BaseHook):
             hooked (GettersAndSetters): instance of hooked class
             data (str): Serial command
         """
-        regex_match, response = hooked._get_matching_setter(data)
+        arguments, response = hooked._get_matching_setter(data)
         if response:
-            self._process_setter_approach_hook_helper(hooked, regex_match, hooked.attribute_vals)
+            self._process_setter_approach_hook_helper(hooked, arguments, hooked.attribute_vals)
         return data
 
     def post_reading(self, hooked, result, data, **kwargs):
         """
-        On applicable attributes, retrieve meta data class information set from pre_reading hook,
-        and based on that information (how long it has been since the set time, how long the
+        On applicable attributes, retrieve the transition started by the pre_reading hook from
+        ``self.engine``, and based on that information (how long it has been since the set time, how long the
         transition is supposed to take, etc), calculate the new attribute value and return it.
 
         Args:
@@ -82,28 +74,23 @@ class ApproachHook(BaseHook):
         """
         if data in hooked.getters:
             attribute_vals = hooked.attribute_vals
+            now = self.engine.clock()
             for attribute in attribute_vals:
-                attrib = hooked.instrument_attributes[attribute].meta_data.get(_ApproachHookAttributes.__name__)
-                if attrib:
-                    seconds_ran = time.time() - attrib.set_time
-                    value = attrib.start_value + 0.5 * (1 + np.tanh(6 * seconds_ran / attrib.transition_time - pi)) * (
-                        attrib.end_value - attrib.start_value
-                    )
+                value = self.engine.value(hooked, attribute, now=now)
+                if value is not None:
                     attribute_vals[attribute] = value
 
             result = hooked.render_template(hooked.getters[data], attribute_vals)
         return result
 
-    def _process_setter_approach_hook_helper(self, hooked, regex_match, attributes):
+    def _process_setter_approach_hook_helper(self, hooked, arguments, attributes):
         """
-        we can extract the match group by name because we gave
-        them a name earlier for ease of book keeping now
+        arguments are the values of the attributes in the setter, by name
         """
         for attribute in attributes:
-            try:  # check for all attributes, only update attribute that matches regex
-                end_value = regex_match.group(attribute)
-            except IndexError:
+            if attribute not in arguments:  # only update the attributes in the setter
                 continue
+            end_value = arguments[attribute]
             in_attribs = attribute in self.attributes
             include_attribs = self.include_or_exclude == SetRelationship.include.name
             exclude_attribs = self.include_or_exclude == SetRelationship.exclude.name
@@ -111,17 +98,12 @@ class ApproachHook(BaseHook):
 
                 self.validate_attribute_type(hooked, attribute)
 
-                attrib = _ApproachHookAttributes(
-                    start_value=hooked.instrument_attributes[attribute].value, end_value=end_value, set_time=time.time()
-                )
-
-                delta = attrib.end_value - attrib.start_value
+                start_value = float(hooked.instrument_attributes[attribute].value)
+                delta = float(end_value) - start_value
                 transition_time = (
-                    delta * self.transition_asc_scaling if delta >= 0 else delta * self.transition_dsc_scaling
+                    delta * self.transition_asc_scaling if delta >= 0 else -delta * self.transition_dsc_scaling
                 )
-                attrib.transition_time = transition_time
-
-                hooked.instrument_attributes[attribute].meta_data[_ApproachHookAttributes.__name__] = attrib
+                self.engine.start(hooked, attribute, start_value, end_value, transition_time)
             hooked.instrument_attributes[attribute].value = end_value
 
     def validate_attribute_type(self, hooked, attribute):
@@ -151,8 +133,7 @@ def LoopCannedQueries(hooked, result, data, **kwargs):
         serial command, it will just return SENTINEL unmodified.
     """
     if result is SENTINEL:
-        hooked._start_serial_generator(data)
-        result = next(hooked.serial_generator[data])
+        result = next(hooked._start_serial_generator(data))
         return result
     return result
 
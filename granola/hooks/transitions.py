@@ -0,0 +1,187 @@
+import math
+import time
+from math import pi
+
+import numpy as np
+
+
+class TransitionEngine(object):
+    """
+    Storage and evaluation of :class:`~granola.hooks.hooks.ApproachHook` transitions for any number of devices.
+
+    Every transition (one attribute on one device) is given a slot, and the start value, end value,
+    set time and transition time of every slot are stored in parallel numpy arrays. This lets
+    a whole fleet of devices share one engine and have the current value of all their transitions
+    evaluated with a single vectorised call to :meth:`values`, while :meth:`value`
+    evaluates a single slot with :func:`math.tanh` so that the per command path never touches numpy.
+
+    Args:
+        capacity (int, optional): Initial number of slots to allocate. The arrays grow as needed.
+            Defaults to 16
+        clock (callable, optional): Function that returns the current time in seconds.
+            Defaults to :func:`time.time`
+
+    Examples
+    --------
+    >>> engine = TransitionEngine(clock=lambda: 10.0)
+    >>> engine.start("device 1", "temp", start_value=20, end_value=30, transition_time=10, set_time=5.0)
+    0
+    >>> engine.start("device 2", "temp", start_value=20, end_value=10, transition_time=10, set_time=0.0)
+    1
+    >>> round(engine.value("device 1", "temp"), 3)
+    24.297
+    >>> engine.values().round(3)
+    array([24.297, 10.033])
+    """
+
+    def __init__(self, capacity=16, clock=time.time):
+        capacity = max(int(capacity), 1)
+        self.clock = clock
+        self._slots = {}  # (owner, attribute) -> slot
+        self._keys = []  # slot -> (owner, attribute)
+        self.start_values = np.zeros(capacity, dtype=float)
+        self.end_values = np.zeros(capacity, dtype=float)
+        self.set_times = np.zeros(capacity, dtype=float)
+        self.transition_times = np.zeros(capacity, dtype=float)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    @property
+    def keys(self):
+        """list[tuple]: ``(owner, attribute)`` of every slot, in slot order"""
+        return list(self._keys)
+
+    def slot(self, owner, attribute):
+        """
+        Return the slot of the transition for ``attribute`` on ``owner``, or ``None`` if
+        there is no transition for it.
+        """
+        return self._slots.get((owner, attribute))
+
+    def start(self, owner, attribute, start_value, end_value, transition_time, set_time=None):
+        """
+        Start (or restart) a transition for ``attribute`` on ``owner``.
+
+        Args:
+            owner (hashable): Whatever owns the attribute, usually a
+                :class:`~granola.command_readers.GettersAndSetters` instance.
+            attribute (str): The name of the attribute.
+            start_value (float): Value at the start of the transition.
+            end_value (float): Value the transition approaches.
+            transition_time (float): How many seconds the transition should take.
+            set_time (float, optional): When the transition started. Defaults to now.
+
+        Returns:
+            int: the slot used by the transition.
+        """
+        key = (owner, attribute)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._keys)
+            if slot == self.start_values.shape[0]:
+                self._grow(2 * slot)
+            self._slots[key] = slot
+            self._keys.append(key)
+        self.start_values[slot] = float(start_value)
+        self.end_values[slot] = float(end_value)
+        self.set_times[slot] = self.clock() if set_time is None else set_time
+        self.transition_times[slot] = transition_time
+        return slot
+
+    def value(self, owner, attribute, now=None):
+        """
+        Current value of a single transition, evaluated with :func:`math.tanh`.
+
+        Returns:
+            float | None: the current value, or None if ``attribute`` has no transition on ``owner``.
+        """
+        slot = self._slots.get((owner, attribute))
+        if slot is None:
+            return None
+        now = self.clock() if now is None else now
+        start_value = self.start_values[slot]
+        end_value = self.end_values[slot]
+        transition_time = self.transition_times[slot]
+        if transition_time <= 0:
+            return float(end_value)
+        seconds_ran = now - self.set_times[slot]
+        fraction = 0.5 * (1 + math.tanh(6 * seconds_ran / transition_time - pi))
+        return float(start_value + fraction * (end_value - start_value))
+
+    def values(self, slots=None, now=None):
+        """
+        Current value of many transitions in one vectorised call.
+
+        Args:
+            slots (array-like[int], optional): Slots to evaluate. Defaults to every slot.
+            now (float, optional): Time to evaluate at. Defaults to now.
+
+        Returns:
+            np.ndarray: current value of every requested slot.
+        """
+        n = len(self._keys)
+        if slots is None:
+            slots = slice(0, n)
+        else:
+            slots = np.asarray(slots, dtype=np.intp)
+        now = self.clock() if now is None else now
+        start_values = self.start_values[slots]
+        end_values = self.end_values[slots]
+        transition_times = self.transition_times[slots]
+        seconds_ran = now - self.set_times[slots]
+        finished = transition_times <= 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = 0.5 * (1 + np.tanh(6 * seconds_ran / transition_times - pi))
+        fraction[finished] = 1.0
+        return start_values + fraction * (end_values - start_values)
+
+    def values_for(self, owners, attribute, now=None, default=np.nan):
+        """
+        Current value of ``attribute`` for each of ``owners`` in one vectorised call.
+
+        Args:
+            owners (list): Owners to look ``attribute`` up on.
+            attribute (str): The name of the attribute.
+            now (float, optional): Time to evaluate at. Defaults to now.
+            default (float, optional): Value used for owners with no transition for ``attribute``.
+                Defaults to nan.
+
+        Returns:
+            np.ndarray: one value per owner.
+        """
+        slots = np.array([self._slots.get((owner, attribute), -1) for owner in owners], dtype=np.intp)
+        result = np.full(slots.shape[0], default, dtype=float)
+        found = slots >= 0
+        if found.any():
+            result[found] = self.values(slots[found], now=now)
+        return result
+
+    def discard(self, owner):
+        """Remove every transition belonging to ``owner``, compacting the arrays."""
+        keep = [slot for slot, key in enumerate(self._keys) if key[0] is not owner]
+        if len(keep) == len(self._keys):
+            return
+        for name in ("start_values", "end_values", "set_times", "transition_times"):
+            array = getattr(self, name)
+            compacted = np.zeros(max(array.shape[0], 1), dtype=float)
+            compacted[: len(keep)] = array[keep]
+            setattr(self, name, compacted)
+        self._keys = [self._keys[slot] for slot in keep]
+        self._slots = {key: slot for slot, key in enumerate(self._keys)}
+
+    def _grow(self, capacity):
+        for name in ("start_values", "end_values", "set_times", "transition_times"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=float)
+            grown[: array.shape[0]] = array
+            setattr(self, name, grown)
+
+
+__doc__ = """
+Array backed storage for :class:`~granola.hooks.hooks.ApproachHook` transitions, so that many
+devices can share one :class:`TransitionEngine` and be evaluated together.
+"""
@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher(object):
+    """
+    Watch the files a :class:`~granola.breakfast_cereal.Cereal` was made from, its JSON configuration (when made with
+    :meth:`~granola.breakfast_cereal.Cereal.mock_from_json`) and the files of its command readers, such as canned
+    query CSVs, and reload them when they change, without making the device again.
+
+    Only the changed files are read again. When a canned query file changes, only its commands are grouped again,
+    and the cursors of every other command carry on where they were. When the configuration changes, each command
+    reader is updated from its new options with :meth:`~granola.command_readers.BaseCommandReaders.reload_config`.
+
+    Files are polled with :func:`os.stat`, either by calling :meth:`check` (such as between tests, or from an event
+    loop), or every ``interval`` seconds from a background thread once :meth:`start` is called. A file that can't be
+    read when it changes, such as one that is still being written, is logged, and read again when it next changes.
+    Reloading holds the device's lock, which writes to the device also take, so a command written from another
+    thread is answered either before the reload or after it, never part way through.
+
+    Args:
+        cereal (Cereal): Device to reload.
+        interval (float, optional): Seconds between polls, once started. Defaults to 1.0
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> from granola import Cereal
+    >>> path = os.path.join(tempfile.mkdtemp(), "cmds.csv")
+    >>> with open(path, "w") as f:
+    ...     _ = f.write("cmd,response\\nget -sn\\\\r,42\\\\r>\\n")
+    >>> cereal = Cereal({"CannedQueries": {"data": [path]}})
+    >>> watcher = FileWatcher(cereal)
+    >>> with open(path, "w") as f:
+    ...     _ = f.write("cmd,response\\nget -sn\\\\r,43\\\\r>\\n")
+    >>> os.utime(path, (0, 0))  # as if it had been saved a while later
+    >>> watcher.check() == [path]
+    True
+    >>> cereal.write(b"get -sn\\r")
+    8
+    >>> cereal.read(cereal.in_waiting)
+    b'43\\r>'
+    """
+
+    def __init__(self, cereal, interval=1.0):
+        self.cereal = cereal
+        self.interval = interval
+        self._stamps = OrderedDict((path, _stamp(path)) for path in self.files())
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def files(self):
+        """Paths of the watched files"""
+        files = OrderedDict()
+        config_source = self.cereal._config_source_
+        if config_source is not None:
+            files[config_source[1]] = None
+        for reader in self.cereal._readers_.values():
+            files.update((path, None) for path in reader.watched_files())
+        return list(files)
+
+    def check(self):
+        """
+        Reload the files that have changed since they were last checked
+
+        Returns:
+            list[str]: paths of the files that changed
+        """
+        stamps = OrderedDict((path, _stamp(path)) for path in self.files())
+        changed = [path for path, stamp in stamps.items() if stamp != self._stamps.get(path) and stamp is not None]
+        self._stamps = stamps
+        if not changed:
+            return []
+        logger.info("%s changed: %s", self.cereal, ", ".join(changed))
+        config_source = self.cereal._config_source_
+        with self.cereal._lock_:  # so that writes from other threads wait for the reload to finish
+            try:
+                if config_source is not None and config_source[1] in changed:
+                    self.cereal.reload_config()
+                for reader in self.cereal._readers_.values():
+                    reader.reload([path for path in changed if path in reader.watched_files()])
+            except Exception:
+                logger.exception("%s couldn't reload %s", self.cereal, ", ".join(changed))
+        # files added by the new configuration are watched from now on
+        self._stamps.update((path, _stamp(path)) for path in self.files() if path not in self._stamps)
+        return changed
+
+    def start(self):
+        """Poll the files every ``interval`` seconds from a background thread"""
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="granola file watcher")
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop polling the files"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.check()
+
+
+def _stamp(path):
+    """Modification time and size of a file, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except (IOError, OSError):
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+__doc__ = """
+Reload the canned queries and configuration of devices while they run, when their files change, so edits to mocks
+are picked up by long running simulations without restarting them.
+
+.. seealso::
+
+    :meth:`Cereal.watch <granola.breakfast_cereal.Cereal.watch>`
+"""
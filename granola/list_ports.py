@@ -0,0 +1,295 @@
+import copy
+import logging
+from builtins import (
+    str as unicode,  # python 3 doesn't have a unicode type, and we don't want to override python2 str type
+)
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import serial
+import serial.tools.list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+from granola.breakfast_cereal import Cereal
+from granola.command_readers import GettersAndSetters
+from granola.utils import IS_PYTHON3, fixpath, get_path
+
+if IS_PYTHON3:
+    from unittest.mock import patch
+else:  # pragma: no cover
+    from mock import patch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METADATA_ATTRIBUTES = OrderedDict(
+    [("serial_number", "sn"), ("vid", "vid"), ("pid", "pid"), ("manufacturer", "manufacturer"), ("product", "product")]
+)
+
+
+class CerealPortInfo(ListPortInfo):
+    """
+    :class:`pyserial:serial.tools.list_ports.ListPortInfo` for a mocked port in a :class:`PortRegistry`.
+    """
+
+    def __init__(self, device, **usb_info):
+        super(CerealPortInfo, self).__init__(device, skip_link_detection=True)
+        for field, value in usb_info.items():
+            setattr(self, field, value)
+        if self.vid is not None or self.pid is not None:
+            self.apply_usb_info()
+        else:
+            self.description = self.product or self.description
+
+
+class PortRegistry(object):
+    """
+    Registry of mocked serial ports backed by :class:`~granola.breakfast_cereal.Cereal` devices, that can
+    stand in for :func:`serial.tools.list_ports.comports` and :class:`serial.Serial` so that code which discovers
+    ports and then opens them runs against mocks unchanged.
+
+    Ports registered from a configuration aren't built until they are opened, and their metadata is read
+    straight from the configuration's :class:`~granola.command_readers.GettersAndSetters` ``default_values``
+    (and any per port overrides of them), so registering and enumerating thousands of ports is cheap
+    and only the ports the code under test actually opens are constructed.
+
+    Args:
+        metadata_attributes (dict, optional): Mapping of :class:`ListPortInfo` field
+            (``serial_number``, ``vid``, ``pid``, ``manufacturer``, ``product``, ``description``, ``location``
+            or ``interface``) to the GettersAndSetters attribute it is read from.
+            Defaults to ``DEFAULT_METADATA_ATTRIBUTES``
+
+    Examples
+    --------
+    >>> config = {"command_readers": {"GettersAndSetters": {
+    ...     "default_values": {"sn": "0", "vid": "0x0403", "pid": "0x6015"},
+    ...     "getters": [{"cmd": "get sn\\r", "response": "{{ sn }}\\r>"}]}}}
+    >>> registry = PortRegistry()
+    >>> for i in range(5000):
+    ...     registry.register("/dev/ttyMOCK%s" % i, config=config, default_values={"sn": "SN%04d" % i})
+    >>> with registry.patch():
+    ...     ports = serial.tools.list_ports.comports()
+    ...     ser = serial.Serial(ports[42].device, baudrate=9600)
+    >>> len(ports), ports[42].hwid
+    (5000, 'USB VID:PID=0403:6015 SER=SN0042')
+    >>> ser.write(b"get sn\\r")
+    7
+    >>> ser.read(ser.in_waiting)
+    b'SN0042\\r>'
+    >>> registry.opened
+    ['/dev/ttyMOCK42']
+    """
+
+    def __init__(self, metadata_attributes=None):
+        self.metadata_attributes = (
+            metadata_attributes if metadata_attributes is not None else DEFAULT_METADATA_ATTRIBUTES
+        )
+        self._entries = OrderedDict()
+        self._config_cache = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, port):
+        return port in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    @property
+    def opened(self):
+        """list[str]: ports whose devices have been constructed"""
+        return [port for port, entry in self._entries.items() if entry.device is not None]
+
+    def register(
+        self,
+        port,
+        device=None,
+        config=None,
+        config_key=None,
+        config_path="config.json",
+        factory=None,
+        default_values=None,
+        **port_info
+    ):
+        """
+        Register a mocked port. The device behind the port can be given directly, as a configuration
+        dictionary, as a key into a JSON configuration file, or as a factory function.
+
+        Args:
+            port (str): Port name, such as ``/dev/ttyUSB0`` or ``COM3``.
+            device (Cereal, optional): An already constructed device.
+            config (dict, optional): Keyword arguments for :class:`~granola.breakfast_cereal.Cereal`,
+                as they would appear under a config key in a JSON configuration.
+            config_key (str, optional): Key of the device configuration in ``config_path``.
+            config_path (str, optional): JSON configuration file. Defaults to "config.json"
+            factory (callable, optional): Function that returns a new, not yet called, Cereal.
+            default_values (dict, optional): Overrides of the configuration's GettersAndSetters
+                ``default_values`` for this port, for example its serial number.
+            port_info: Explicit :class:`ListPortInfo` fields (``vid=0x0403``, ``description="..."``),
+                which take precedence over the values read from the attributes.
+        """
+        if config_key is not None:
+            config = self._load_config(config_key, config_path)
+        if device is None and config is None and factory is None:
+            raise TypeError("One of `device`, `config`, `config_key` or `factory` must be given for %s" % port)
+        self._entries[port] = _PortEntry(
+            registry=self,
+            port=port,
+            device=device,
+            config=config,
+            config_path=config_path if config_key is not None else None,
+            factory=factory,
+            default_values=default_values,
+            port_info=port_info,
+        )
+
+    def unregister(self, port):
+        del self._entries[port]
+
+    def comports(self, include_links=False):
+        """
+        Drop in replacement for :func:`serial.tools.list_ports.comports` listing every registered port.
+
+        Returns:
+            list[CerealPortInfo]
+        """
+        return [entry.info for entry in self._entries.values()]
+
+    def device(self, port):
+        """Return the device for ``port``, constructing it if this is the first time it is used"""
+        return self._entries[port].get_device()
+
+    def open(self, port=None, *args, **kwargs):
+        """
+        Drop in replacement for :class:`serial.Serial` for registered ports. Returns the port's device,
+        initialized with the pyserial arguments the first time, and reopened after that.
+        """
+        device = self.device(port)
+        if not hasattr(device, "_port"):
+            device(port, *args, **kwargs)
+        else:
+            device.open()
+        return device
+
+    @contextmanager
+    def patch(self, serial_class=True):
+        """
+        Context manager patching :func:`serial.tools.list_ports.comports` (and the platform specific
+        implementations) to list the registered ports, and, if ``serial_class`` is True, :class:`serial.Serial`
+        to open registered ports from the registry while passing any other port on to the real class.
+
+        Only lookups made through the modules (``serial.Serial(...)``, ``list_ports.comports()``) are patched,
+        names imported with ``from serial import Serial`` before patching still refer to the originals.
+        """
+        real_serial = serial.Serial
+
+        def serial_factory(port=None, *args, **kwargs):
+            if port in self._entries:
+                return self.open(port, *args, **kwargs)
+            return real_serial(port, *args, **kwargs)
+
+        targets = ["serial.tools.list_ports.comports"]
+        for module in ("serial.tools.list_ports_posix", "serial.tools.list_ports_windows"):
+            try:
+                __import__(module)
+            except ImportError:  # pragma: no cover
+                continue
+            targets.append(module + ".comports")
+
+        patchers = [patch(target, self.comports) for target in targets]
+        if serial_class:
+            patchers.append(patch("serial.Serial", serial_factory))
+        for patcher in patchers:
+            patcher.start()
+        try:
+            yield self
+        finally:
+            for patcher in reversed(patchers):
+                patcher.stop()
+
+    def _load_config(self, config_key, config_path):
+        """Load (and cache) the config for ``config_key``, so registering many ports reads the file once"""
+        key = (fixpath(get_path(config_path)), config_key)
+        config = self._config_cache.get(key)
+        if config is None:
+            config = Cereal._load_json_config(config_key=config_key, config_path=config_path)
+            self._config_cache[key] = config
+        return config
+
+
+class _PortEntry(object):
+    def __init__(self, registry, port, device, config, config_path, factory, default_values, port_info):
+        self.registry = registry
+        self.port = port
+        self.device = device
+        self.config = config
+        self.config_path = config_path
+        self.factory = factory
+        self.default_values = default_values
+        self.port_info = port_info
+        self._info = None
+
+    @property
+    def info(self):
+        if self._info is None or self.device is not None:  # a constructed device's attributes can change
+            usb_info = {}
+            attributes = self._attributes()
+            for field, attribute in self.registry.metadata_attributes.items():
+                if attribute in attributes:
+                    usb_info[field] = attributes[attribute]
+            usb_info.update(self.port_info)
+            for field in ("vid", "pid"):
+                if isinstance(usb_info.get(field), (str, unicode)):  # json configs give unicode on python 2
+                    usb_info[field] = int(usb_info[field], 0)
+            self._info = CerealPortInfo(self.port, **usb_info)
+        return self._info
+
+    def get_device(self):
+        if self.device is None:
+            logger.debug("Constructing mocked device for %s", self.port)
+            if self.factory is not None:
+                self.device = self.factory()
+            else:
+                config = self._device_config()
+                if self.config_path is not None:
+                    config.setdefault("data_path_root", self.config_path)
+                self.device = Cereal(**config)
+        return self.device
+
+    def _device_config(self):
+        return config_with_default_values(self.config, self.default_values)
+
+    def _attributes(self):
+        """Current GettersAndSetters attributes of the port, without constructing the device"""
+        if self.device is not None:
+            for reader in self.device._readers_.values():
+                if isinstance(reader, GettersAndSetters):
+                    return reader.attribute_vals
+            return {}
+        attributes = {}
+        if self.config is not None:
+            readers = self.config.get("command_readers", {})
+            if isinstance(readers, dict):
+                attributes.update(readers.get(GettersAndSetters.__name__, {}).get("default_values", {}))
+        attributes.update(self.default_values or {})
+        return attributes
+
+
+def config_with_default_values(config, default_values=None):
+    """
+    Copy of the Cereal configuration ``config`` with its GettersAndSetters ``default_values`` updated
+    with ``default_values``, for example to give a device built from a shared configuration its own serial number.
+    """
+    config = copy.deepcopy(config)
+    if default_values:
+        getters_and_setters = config.setdefault("command_readers", {}).setdefault(GettersAndSetters.__name__, {})
+        config_default_values = getters_and_setters.setdefault("default_values", OrderedDict())
+        config_default_values.update(default_values)
+    return config
+
+
+__doc__ = """
+Mocked serial port enumeration. A :class:`PortRegistry` of :class:`~granola.breakfast_cereal.Cereal` devices
+can replace :func:`serial.tools.list_ports.comports` and :class:`serial.Serial`, so code that discovers and then opens
+its ports can run against a fleet of mocks without being changed.
+"""
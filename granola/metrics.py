@@ -0,0 +1,230 @@
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+UNSUPPORTED_COMMANDS = "<unsupported>"
+OTHER_COMMANDS = "<other>"
+
+
+class FleetMetrics(object):
+    """
+    Per device counters for every device in a :class:`~granola.fleet.Fleet`, stored in numpy arrays
+    (one row per device) so that they are cheap to update and cheap to aggregate.
+
+    Counters
+        * ``commands`` - number of commands processed
+        * ``unsupported`` - number of commands that got the unsupported response
+        * ``bytes_in`` - bytes written to the device
+        * ``bytes_out`` - bytes read from the device
+        * ``command_seconds`` - time spent processing commands (including hooks)
+        * ``hook_seconds`` - time spent running hooks
+        * ``command_counts`` and ``command_time`` - number of times and time spent per command,
+          with a column per command name in ``command_names``
+
+    Commands that got the unsupported response share one column, ``"<unsupported>"``, and once there are
+    ``max_commands`` columns, any other command is counted in one more, ``"<other>"``, so that clients sending
+    arbitrary commands can't grow the counters without limit.
+
+    Args:
+        size (int, optional): Number of devices to allocate rows for. Defaults to 0
+        max_commands (int, optional): Number of commands counted on their own. Defaults to 256
+    """
+
+    _DEVICE_COUNTERS = (
+        ("commands", np.int64),
+        ("unsupported", np.int64),
+        ("bytes_in", np.int64),
+        ("bytes_out", np.int64),
+        ("command_seconds", np.float64),
+        ("hook_seconds", np.float64),
+    )
+
+    def __init__(self, size=0, max_commands=256):
+        self.size = 0
+        self.max_commands = max_commands
+        self.command_names = {}  # command -> column in command_counts and command_time
+        capacity = max(size, 8)
+        for name, dtype in self._DEVICE_COUNTERS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.command_counts = np.zeros((capacity, 8), dtype=np.int64)
+        self.command_time = np.zeros((capacity, 8), dtype=np.float64)
+        self.resize(size)
+
+    def resize(self, size):
+        """Make sure there are rows for ``size`` devices"""
+        capacity = self.commands.shape[0]
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+            for name, _ in self._DEVICE_COUNTERS:
+                setattr(self, name, _grown(getattr(self, name), (capacity,)))
+            self.command_counts = _grown(self.command_counts, (capacity, self.command_counts.shape[1]))
+            self.command_time = _grown(self.command_time, (capacity, self.command_time.shape[1]))
+        self.size = max(self.size, size)
+
+    def recorder(self, index):
+        """Return the :class:`DeviceMetrics` that records into the row of the device at ``index``"""
+        self.resize(index + 1)
+        return DeviceMetrics(self, index)
+
+    def record_command(self, index, cmd, seconds, unsupported=False):
+        column = self._command_column(UNSUPPORTED_COMMANDS if unsupported else cmd)
+        self.commands[index] += 1
+        self.command_seconds[index] += seconds
+        self.command_counts[index, column] += 1
+        self.command_time[index, column] += seconds
+        if unsupported:
+            self.unsupported[index] += 1
+
+    def _command_column(self, cmd):
+        """Column of ``cmd`` in command_counts and command_time, added if it has none yet"""
+        column = self.command_names.get(cmd)
+        if column is not None:
+            return column
+        if len(self.command_names) >= self.max_commands:
+            cmd = OTHER_COMMANDS
+            column = self.command_names.get(cmd)
+            if column is not None:
+                return column
+        column = len(self.command_names)
+        if column == self.command_counts.shape[1]:
+            shape = (self.command_counts.shape[0], 2 * column)
+            self.command_counts = _grown(self.command_counts, shape)
+            self.command_time = _grown(self.command_time, shape)
+        self.command_names[cmd] = column
+        return column
+
+    def totals(self):
+        """
+        Fleet wide totals of every counter.
+
+        Returns:
+            dict: counter name -> total
+        """
+        totals = {name: getattr(self, name)[: self.size].sum().item() for name, _ in self._DEVICE_COUNTERS}
+        totals["devices"] = self.size
+        return totals
+
+    def command_totals(self):
+        """
+        Number of times, and total time, each command was processed across the fleet,
+        most common command first.
+
+        Returns:
+            list[tuple]: ``(command, {"count": int, "seconds": float})`` pairs
+        """
+        counts = self.command_counts[: self.size].sum(axis=0)
+        seconds = self.command_time[: self.size].sum(axis=0)
+        result = [
+            (cmd, {"count": counts[column].item(), "seconds": seconds[column].item()})
+            for cmd, column in self.command_names.items()
+        ]
+        result.sort(key=lambda item: item[1]["count"], reverse=True)
+        return result
+
+    def hottest(self, n=10, counter="commands"):
+        """
+        Indexes of the ``n`` devices with the highest ``counter``, highest first.
+        """
+        values = getattr(self, counter)[: self.size]
+        n = min(n, values.shape[0])
+        if n <= 0:
+            return []
+        top = np.argpartition(-values, n - 1)[:n]
+        return top[np.argsort(-values[top], kind="stable")].tolist()
+
+    def snapshot(self):
+        """
+        Copy of every counter, taken without stopping or resetting anything.
+
+        Returns:
+            dict: ``{"devices": {counter: list per device}, "commands": {command: {"count": list per device,
+            "seconds": list per device}}, "totals": {counter: total}}``
+        """
+        devices = {name: getattr(self, name)[: self.size].tolist() for name, _ in self._DEVICE_COUNTERS}
+        commands = {
+            cmd: {
+                "count": self.command_counts[: self.size, column].tolist(),
+                "seconds": self.command_time[: self.size, column].tolist(),
+            }
+            for cmd, column in self.command_names.items()
+        }
+        return {"devices": devices, "commands": commands, "totals": self.totals()}
+
+    def to_json(self, **kwargs):
+        """:meth:`snapshot` as a JSON string. ``kwargs`` are passed on to :func:`json.dumps`"""
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_dataframe(self):
+        """
+        Per device counters as a pandas DataFrame, one row per device, with a ``count <command>``
+        column per command.
+        """
+        import pandas as pd
+
+        data = {name: getattr(self, name)[: self.size].copy() for name, _ in self._DEVICE_COUNTERS}
+        for cmd, column in self.command_names.items():
+            data["count {cmd!r}".format(cmd=cmd)] = self.command_counts[: self.size, column].copy()
+        return pd.DataFrame(data)
+
+    def reset(self):
+        """Zero every counter"""
+        for name, _ in self._DEVICE_COUNTERS:
+            getattr(self, name)[:] = 0
+        self.command_counts[:] = 0
+        self.command_time[:] = 0
+
+
+class DeviceMetrics(object):
+    """
+    Records the metrics of a single device into its row of a :class:`FleetMetrics`. This is what
+    :class:`~granola.breakfast_cereal.Cereal` and its command readers call as commands are processed.
+    """
+
+    __slots__ = ("fleet_metrics", "index")
+
+    def __init__(self, fleet_metrics, index):
+        self.fleet_metrics = fleet_metrics
+        self.index = index
+
+    def __getstate__(self):
+        return {"fleet_metrics": self.fleet_metrics, "index": self.index}
+
+    def __setstate__(self, state):
+        self.fleet_metrics = state["fleet_metrics"]
+        self.index = state["index"]
+
+    def command(self, cmd, seconds, unsupported=False):
+        self.fleet_metrics.record_command(self.index, cmd, seconds, unsupported)
+
+    def bytes_in(self, count):
+        self.fleet_metrics.bytes_in[self.index] += count
+
+    def bytes_out(self, count):
+        self.fleet_metrics.bytes_out[self.index] += count
+
+    def hook_time(self, seconds):
+        self.fleet_metrics.hook_seconds[self.index] += seconds
+
+
+def _grown(array, shape):
+    grown = np.zeros(shape, dtype=array.dtype)
+    grown[tuple(slice(0, size) for size in array.shape)] = array
+    return grown
+
+
+__doc__ = """
+Counters for every device in a :class:`~granola.fleet.Fleet`, to see which devices are hot, which
+commands dominate and how long they take.
+
+>>> from granola import Cereal, Fleet
+>>> fleet = Fleet([Cereal({"CannedQueries": {"data": [{"1\\r": "1"}]}}) for _ in range(2)])
+>>> for cmd in (b"1\\r", b"1\\r", b"2\\r"):
+...     _ = fleet[1].write(cmd)
+>>> fleet.metrics.commands.tolist()[:2], fleet.metrics.unsupported.tolist()[:2]
+([0, 3], [0, 1])
+>>> [(cmd, stats["count"]) for cmd, stats in fleet.metrics.command_totals()]
+[('1\\r', 2), ('<unsupported>', 1)]
+"""
@@ -0,0 +1,113 @@
+import errno
+import logging
+import os
+import tty
+from collections import OrderedDict
+
+from granola.serving import Channel, SelectorServer
+
+logger = logging.getLogger(__name__)
+
+
+class PtyServer(SelectorServer):
+    """
+    Serve :class:`~granola.breakfast_cereal.Cereal` devices to other processes through pseudo terminals.
+
+    Every device added gets its own pseudo terminal pair (:func:`os.openpty`). The server keeps the master side and
+    answers everything written to it with the device, while other processes (including ones that aren't
+    Python) open the slave side, a normal ``/dev/pts/N`` path, as if it were a real serial port. All of the pseudo
+    terminals are served by one non blocking :mod:`selectors` event loop, so a single thread can serve many ports.
+
+    Only available on POSIX systems.
+
+    Examples
+    --------
+    >>> from granola import Cereal
+    >>> server = PtyServer()
+    >>> path = server.add(Cereal({"CannedQueries": {"data": [{"ping\\r": "pong\\r>"}]}}))
+    >>> client = os.open(path, os.O_RDWR | os.O_NOCTTY)
+    >>> os.write(client, b"ping\\r")
+    5
+    >>> server.serve_once(timeout=1)
+    >>> os.read(client, 100)
+    b'pong\\r>'
+    >>> os.close(client)
+    >>> server.close()
+    """
+
+    def __init__(self, chunk_size=4096):
+        super(PtyServer, self).__init__(chunk_size=chunk_size)
+        self._ptys = OrderedDict()  # slave path -> _PtyChannel
+
+    @property
+    def paths(self):
+        """list[str]: slave paths of every served device"""
+        return list(self._ptys)
+
+    def device(self, path):
+        """Return the device served on the slave ``path``"""
+        return self._ptys[path].device
+
+    def add(self, device):
+        """
+        Serve ``device`` on a new pseudo terminal.
+
+        Args:
+            device (Cereal): The device to serve.
+
+        Returns:
+            str: path of the slave side of the pseudo terminal, for other processes to open.
+        """
+        master, slave = os.openpty()
+        tty.setraw(slave)  # no echo or line editing, bytes go through as they are
+        os.set_blocking(master, False)
+        path = os.ttyname(slave)
+        if not hasattr(device, "_port"):
+            device(port=path)
+        pty = _PtyChannel(self, master, device, slave, path)
+        self._ptys[path] = pty
+        pty.register()
+        logger.info("%s serving %s on %s", self.__class__.__name__, device, path)
+        return path
+
+    def remove(self, path):
+        """Stop serving the device on ``path`` and close its pseudo terminal"""
+        pty = self._ptys.pop(path)
+        self.unregister(pty.fileobj)
+        os.close(pty.fileobj)
+        os.close(pty.slave)
+
+    def _close_channels(self):
+        for path in list(self._ptys):
+            self.remove(path)
+
+
+class _PtyChannel(Channel):
+    def __init__(self, server, master, device, slave, path):
+        super(_PtyChannel, self).__init__(server, master, device)
+        self.slave = slave  # kept open so the master doesn't see EIO between client connections
+        self.path = path
+
+    def recv(self, size):
+        try:
+            return os.read(self.fileobj, size)
+        except (BlockingIOError, InterruptedError):
+            return None
+        except OSError as err:  # EIO when no client has the slave open
+            if err.errno != errno.EIO:
+                raise
+            return None
+
+    def send(self, data):
+        return os.write(self.fileobj, data)
+
+    def closed(self):  # pragma: no cover, the master never reads EOF while the slave is held open
+        pass
+
+
+__doc__ = """
+Serve :class:`~granola.breakfast_cereal.Cereal` devices on pseudo terminals, so that separate processes and
+non-Python programs can open them like real serial ports. Also available from the command line::
+
+    python -m granola pty config.json cereal --count 4
+"""
@@ -0,0 +1,89 @@
+import logging
+
+from serial.rfc2217 import PortManager
+
+from granola.tcp_server import TcpServer, _Connection
+
+logger = logging.getLogger(__name__)
+
+
+class Rfc2217Server(TcpServer):
+    """
+    Serve :class:`~granola.breakfast_cereal.Cereal` devices over RFC 2217, so that tooling that talks to remote
+    serial ports through pyserial's ``rfc2217://`` URLs (or any other RFC 2217 client) can run against mocks.
+
+    Each session negotiates with a :class:`pyserial:serial.rfc2217.PortManager`, so the port settings a client
+    changes (``baudrate``, ``bytesize``, ``parity``, ``stopbits``, flow control, ``dtr``, ``rts`` and
+    ``break_condition``) are applied to the device's serial attributes, and changes to the device's modem lines
+    (``cts``, ``dsr``, ``ri`` and ``cd``) are sent to its clients. Ports, sessions and the devices behind
+    them are set up exactly as for :class:`~granola.tcp_server.TcpServer`, and every session runs on its one
+    event loop.
+
+    Examples
+    --------
+    >>> import threading
+    >>> import serial
+    >>> from granola import Cereal
+    >>> server = Rfc2217Server()
+    >>> device = Cereal({"CannedQueries": {"data": [{"ping\\r": "pong\\r>"}]}})
+    >>> address = server.add(device)
+    >>> thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    >>> thread.start()
+    >>> ser = serial.serial_for_url(server.url(address), baudrate=19200, timeout=1)
+    >>> ser.write(b"ping\\r")
+    5
+    >>> ser.read(6)
+    b'pong\\r>'
+    >>> device.baudrate
+    19200
+    >>> ser.close()
+    >>> server.stop()
+    >>> thread.join()
+    >>> server.close()
+    """
+
+    scheme = "rfc2217"
+
+    def serve_once(self, timeout=None):
+        super(Rfc2217Server, self).serve_once(timeout)
+        for connection in list(self._connections):
+            connection.check_modem_lines()
+
+    def _connection(self, sock, device, release):
+        return _Rfc2217Connection(self, sock, device, release)
+
+
+class _Rfc2217Connection(_Connection):
+    def __init__(self, server, sock, device, release):
+        super(_Rfc2217Connection, self).__init__(server, sock, device, release)
+        if not hasattr(device, "_port"):  # pyserial's port settings only exist once a Cereal has been called
+            device()
+        self.port_manager = PortManager(device, self, logger=logger if logger.isEnabledFor(logging.DEBUG) else None)
+
+    def register(self):
+        super(_Rfc2217Connection, self).register()
+        self.flush()  # the options PortManager requested when it was created
+
+    def write(self, data):
+        """Called by the PortManager to send Telnet and RFC 2217 messages"""
+        self.output += data
+
+    def received(self, data):
+        data = b"".join(self.port_manager.filter(data))
+        if data:
+            super(_Rfc2217Connection, self).received(data)
+
+    def responded(self, data):
+        self.output += b"".join(self.port_manager.escape(data))
+
+    def check_modem_lines(self):
+        self.port_manager.check_modem_lines()
+        if self.output:
+            self.flush()
+
+
+__doc__ = """
+Serve :class:`~granola.breakfast_cereal.Cereal` devices to RFC 2217 clients. Also available from the command line::
+
+    python -m granola rfc2217 config.json cereal --count 4 --port 7000
+"""
@@ -6,6 +6,7 @@ from builtins import (
 )
 from contextlib import contextmanager
 from datetime import datetime
+from timeit import default_timer as timer
 
 from serial import Serial
 
@@ -47,6 +48,7 @@ class SerialSniffer(Serial):
     quotechar = '"'
     write_terminator = b"\r"
     read_terminator = b"\r>"
+    recorder = None
 
     @add_created_at
     def __init__(self, *args, **kwargs):
@@ -58,23 +60,22 @@ class SerialSniffer(Serial):
             else:
                 self.outfile = datetime.now().strftime("%Y-%m-%dT%H-%M-%S") + "_serial_commands.csv"
 
-        self.outpath = get_path(self.outfile)
-        make_path(self.outpath)
+        self.recorder = SniffRecorder(
+            self.outfile, self.delimiter, self.quotechar, self.write_terminator, self.read_terminator
+        )
+        self.outpath = self.recorder.outpath
 
         logger.debug("%s outpath: %s", self, self.outpath)
 
-        self.current_write = b""
-        self.current_read = b""
-        self.last_write_time = datetime.now()
-        self.last_read_time = datetime.now()
+    @property
+    def current_write(self):
+        """The command being written, until its response has been read"""
+        return self.recorder.current_write
 
-        try:
-            with _open_csv_writer(
-                self.outpath, "w", delimiter=self.delimiter, quotechar=self.quotechar, quoting=csv.QUOTE_MINIMAL
-            ) as csvwriter:
-                csvwriter.writerow(["cmd", "response", "delay(ms)"])
-        except IOError as err:
-            logger.exception("%s %r", self, err)
+    @property
+    def current_read(self):
+        """The response being read"""
+        return self.recorder.current_read
 
     def __str__(self):
         port = getattr(self, "port", "")
@@ -89,16 +90,7 @@ class SerialSniffer(Serial):
         terminator are ignored for our purposes. They are still written to the serial port, of course."""
 
         logger.info("%s write: %r", self, data)
-
-        if not self._is_write_terminated(self.current_write):
-            # this write is not yet terminated
-            for int_repr in bytes(data):  # convert byte data into ascii int representation
-                self.current_write += bytes([int_repr])  # convert back to bytes
-                if self._is_write_terminated(self.current_write):
-                    self.last_write_time = datetime.now()
-                    self.current_read = b""
-                    break
-
+        self.recorder.wrote(data)
         return super(SerialSniffer, self).write(data, *args, **kwargs)
 
     def read(self, size=1, *args, **kwargs):
@@ -106,31 +98,8 @@ class SerialSniffer(Serial):
         A wrapper for Serial.read, that also stores read content, and when a terminator is reached,
         records that read to the given csv inputs and outputs are the same as Serial.read"""
         read = super(SerialSniffer, self).read(size=size, *args, **kwargs)
-
         logger.info("%s read: %r", self, read)
-
-        self.current_read += read
-
-        if self._is_read_terminated(self.current_read):
-            self.last_read_time = datetime.now()
-            delay = (self.last_read_time - self.last_write_time).total_seconds() * 1000
-            try:
-                if self._is_write_terminated(self.current_write):
-                    with _open_csv_writer(
-                        self.outpath, "a", delimiter=self.delimiter, quotechar=self.quotechar, quoting=csv.QUOTE_MINIMAL
-                    ) as csvwriter:
-                        csvwriter.writerow(
-                            [
-                                encode_escape_char(decode_bytes(self.current_write)),
-                                encode_escape_char(decode_bytes(self.current_read)),
-                                delay,
-                            ]
-                        )
-            except IOError as err:
-                logger.exception("%s %r", self, err)
-            self.current_write = b""
-            self.current_read = b""
-
+        self.recorder.read(read)
         return read
 
     if check_min_package_version("pyserial", "3.0"):
@@ -139,14 +108,16 @@ class SerialSniffer(Serial):
             """
             A wrapper for serial.reset_input_buffer that also clears the current read buffer.
             Should only be used with pyserial versions >= 3.0"""
-            self.current_read = b""
+            if self.recorder is not None:  # pyserial resets the buffers as it opens the port, before we record
+                self.recorder.current_read = b""
             super(SerialSniffer, self).reset_input_buffer()
 
         def reset_output_buffer(self):
             """
             A wrapper for serial.reset_output_buffer that also clears the current write buffer.
             Should only be used with pyserial versions >= 3.0"""
-            self.current_write = b""
+            if self.recorder is not None:
+                self.recorder.current_write = b""
             super(SerialSniffer, self).reset_output_buffer()
 
     else:
@@ -155,16 +126,95 @@ class SerialSniffer(Serial):
             """
             A wrapper for serial.FlushInput that also clears the current read buffer.
             Should only be used with pyserial versions <= 3.0"""
-            self.current_read = b""
+            if self.recorder is not None:
+                self.recorder.current_read = b""
             super(SerialSniffer, self).flushInput()
 
         def flushOutput(self):
             """
             A wrapper for serial.FlushOutput that also clears the current write buffer.
             Should only be used with pyserial versions <= 3.0"""
-            self.current_write = b""
+            if self.recorder is not None:
+                self.recorder.current_write = b""
             super(SerialSniffer, self).flushOutput()
 
+
+class SniffRecorder(object):
+    """
+    Pairs up the commands written to a device with the responses read from it, and records each pair, and the time
+    the response took, as a row of a CSV file to be used by GRANOLA. The first terminated response read after a
+    terminated command is its response, and unpaired reads and writes are ignored.
+
+    Used by :class:`SerialSniffer`, and by :class:`~granola.sniffing_proxy.SniffingProxy`.
+
+    Args:
+        outfile (str): Path to the file you want to write to
+        delimiter : passed to csv.writer()
+        quotechar : passed to csv.writer()
+        write_terminator (bytes): The character sequence used to indicate that a serial command is complete
+        read_terminator (bytes): The character sequence used to indicate that a serial response is complete
+        keep_open (bool, optional): Whether to keep the file open while recording, and flush it after every row,
+            rather than open it for every row. A file that can't be written raises IOError if it is kept open, and
+            is only logged otherwise. Defaults to False
+    """
+
+    def __init__(
+        self, outfile, delimiter=",", quotechar='"', write_terminator=b"\r", read_terminator=b"\r>", keep_open=False
+    ):
+        self.outpath = get_path(outfile)
+        make_path(self.outpath)
+        self.write_terminator = write_terminator
+        self.read_terminator = read_terminator
+        self.current_write = b""
+        self.current_read = b""
+        self.last_write_time = timer()
+        self._csv_kwargs = dict(delimiter=delimiter, quotechar=quotechar, quoting=csv.QUOTE_MINIMAL)
+        self._file = None
+        if keep_open:
+            self._file, self._writer = _csv_writer(self.outpath, "w", **self._csv_kwargs)
+        self._writerow(["cmd", "response", "delay(ms)"], "w")
+
+    def wrote(self, data):
+        """Record ``data`` written to the device. Anything after the command's terminator is ignored."""
+        if not self._is_write_terminated(self.current_write):
+            for byte in bytearray(data):
+                self.current_write += bytes([byte])
+                if self._is_write_terminated(self.current_write):
+                    self.last_write_time = timer()
+                    self.current_read = b""
+                    break
+
+    def read(self, data):
+        """Record ``data`` read from the device, and the row of the command and its response once it is terminated"""
+        self.current_read += data
+        if self._is_read_terminated(self.current_read):
+            delay = (timer() - self.last_write_time) * 1000
+            if self._is_write_terminated(self.current_write):
+                self._writerow(
+                    [
+                        encode_escape_char(decode_bytes(self.current_write)),
+                        encode_escape_char(decode_bytes(self.current_read)),
+                        delay,
+                    ]
+                )
+            self.current_write = b""
+            self.current_read = b""
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def _writerow(self, row, mode="a"):
+        if self._file is not None:
+            self._writer.writerow(row)
+            self._file.flush()
+            return
+        try:
+            with _open_csv_writer(self.outpath, mode, **self._csv_kwargs) as csvwriter:
+                csvwriter.writerow(row)
+        except IOError as err:
+            logger.exception("%s couldn't record to %s: %r", self.__class__.__name__, self.outpath, err)
+
     def _is_write_terminated(self, input):
         return is_terminated_with(input, self.write_terminator)
 
@@ -172,6 +222,19 @@ class SerialSniffer(Serial):
         return is_terminated_with(input, self.read_terminator)
 
 
+def _csv_writer(path, mode, **kwargs):
+    """The csv file at ``path``, opened with ``mode`` (in either python 2 or 3), and a csv writer for it"""
+    if IS_PYTHON3:
+        csvfile = open(path, mode, newline="")
+    else:
+        csvfile = open(path, mode + "b")
+        kwargs = {
+            k: str(v) if isinstance(v, unicode) else v  # python 2 csv writer needs byte strings
+            for k, v in kwargs.items()
+        }
+    return csvfile, csv.writer(csvfile, **kwargs)
+
+
 @contextmanager
 def _open_csv_writer(path, mode, **kwargs):
     """
@@ -187,16 +250,7 @@ def _open_csv_writer(path, mode, **kwargs):
         csv.writer: a handle for the csv writer
     """
 
-    if IS_PYTHON3:
-        csvfile = open(path, mode, newline="")
-    else:
-        csvfile = open(path, mode + "b")
-        kwargs = {
-            k: str(v) if isinstance(v, unicode) else v  # python 2 csv writer needs byte strings
-            for k, v in kwargs.items()
-        }
-
-    csvwriter = csv.writer(csvfile, **kwargs)
+    csvfile, csvwriter = _csv_writer(path, mode, **kwargs)
     try:
         yield csvwriter
     finally:
@@ -0,0 +1,297 @@
+import abc
+import logging
+import selectors
+import socket
+from collections import deque
+
+from granola.utils import ABC, encode_to_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class SelectorServer(ABC):
+    """
+    Base for servers that answer clients with :class:`~granola.breakfast_cereal.Cereal` devices from a single,
+    non blocking, :mod:`selectors` event loop, so that one thread serves every client.
+
+    Subclasses register their listening sockets or file descriptors with :meth:`register`, and
+    release them in :meth:`_close_channels`.
+
+    Responses that a device holds back (see ``delay(ms)`` in canned queries) don't block the loop: the channel
+    waiting for one is held, and answered once the response is due on the device's clock. A device on a
+    :class:`~granola.clocks.VirtualClock` is checked every time around the loop, so with :meth:`serve_forever`,
+    a response is sent within ``poll_interval`` of the clock being advanced past it.
+
+    Clients sharing a device take turns: a client only writes a command once every other client's response has
+    been read from the device, as writing a command throws away whatever the device hasn't sent yet.
+
+    Args:
+        chunk_size (int, optional): Maximum number of bytes read from a client, or from a device, at once.
+            Defaults to 4096
+    """
+
+    def __init__(self, chunk_size=4096):
+        self.chunk_size = chunk_size
+        self.selector = selectors.DefaultSelector()
+        self._running = False
+        self._held = []  # channels waiting for a delayed response
+        self._talking = {}  # device -> the channel whose response is being read from it
+        self._turns = {}  # device -> deque of channels waiting for their turn to write to it
+        # socketpair rather than a pipe, so that waking up works with select on Windows too
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.register(self._wakeup_r, self._drain_wakeup)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def register(self, fileobj, callback, events=selectors.EVENT_READ):
+        """Call ``callback(mask)`` whenever ``fileobj`` is ready"""
+        self.selector.register(fileobj, events, callback)
+
+    def unregister(self, fileobj):
+        self.selector.unregister(fileobj)
+        self._held = [channel for channel in self._held if channel.fileobj is not fileobj]
+        for turns in list(self._turns.values()):
+            for channel in [channel for channel in turns if channel.fileobj is fileobj]:
+                turns.remove(channel)
+        for channel in [channel for channel in self._talking.values() if channel.fileobj is fileobj]:
+            self.done_talking(channel)
+
+    def take_turn(self, channel):
+        """
+        Let ``channel`` write a command to its device, returning True, or if another channel's response is still
+        being read from it, queue ``channel`` to be answered once it is done, returning False.
+        """
+        talking = self._talking.get(channel.device)
+        if talking is None or talking is channel:
+            self._talking[channel.device] = channel
+            return True
+        turns = self._turns.setdefault(channel.device, deque())
+        if channel not in turns:
+            turns.append(channel)
+        return False
+
+    def done_talking(self, channel):
+        """``channel``'s response has been read from its device, so answer the next channel waiting for it"""
+        device = channel.device
+        if self._talking.get(device) is not channel:
+            return
+        del self._talking[device]
+        turns = self._turns.get(device)
+        while turns and device not in self._talking:
+            waiting = turns.popleft()
+            waiting.answer()
+            waiting.flush()
+        if turns is not None and not turns and self._turns.get(device) is turns:
+            del self._turns[device]
+
+    def hold(self, channel):
+        """Answer ``channel`` again once its device's delayed response is due"""
+        if channel not in self._held:
+            self._held.append(channel)
+
+    def serve_once(self, timeout=None):
+        """
+        Wait up to ``timeout`` seconds (forever if None) for activity and handle it, and answer any held channels
+        whose responses are due.
+        """
+        waits = [wait for wait in (channel.device._delay_left() for channel in self._held) if wait is not None]
+        if waits:
+            timeout = min(waits) if timeout is None else min([timeout] + waits)
+        for key, mask in self.selector.select(timeout):
+            key.data(mask)
+        held, self._held = self._held, []
+        for channel in held:
+            if channel.device._is_delayed():
+                self.hold(channel)
+            else:
+                channel.answer()
+                channel.flush()
+
+    def serve_forever(self, poll_interval=0.5):
+        """Serve until :meth:`stop` is called (from a signal handler or another thread)"""
+        self._running = True
+        while self._running:
+            self.serve_once(poll_interval)
+
+    def stop(self):
+        """Make :meth:`serve_forever` return"""
+        self._running = False
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:  # pragma: no cover
+            pass
+
+    def close(self):
+        """Stop serving and release every client, device and the event loop"""
+        self._close_channels()
+        self.unregister(self._wakeup_r)
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+        self.selector.close()
+
+    @abc.abstractmethod
+    def _close_channels(self):
+        """Release every client and device"""
+
+    def _drain_wakeup(self, mask):
+        try:
+            while self._wakeup_r.recv(512):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+
+class Channel(ABC):
+    """
+    A client of a :class:`SelectorServer` talking to ``device``. Reads everything the client sends, answers it with
+    the device and buffers whatever can't be sent yet, only asking the event loop for write readiness while
+    something is buffered. Subclasses implement :meth:`recv`, :meth:`send` and :meth:`closed`, and can override
+    :meth:`received`, :meth:`write_command` and :meth:`responded` to process the data in between, for example to
+    speak a protocol on top of it.
+
+    Cereal only keeps the response to the last command of a write, so when a client sends several commands
+    before the server gets to them, they are queued, split on the device's write terminator, and answered one by
+    one. A command is only written once the response before it has been read, and no other client's response is
+    being read from the device, so a delayed response holds back the commands after it.
+
+    Responses are read from the device ``chunk_size`` bytes at a time, and the next chunk is only read once the
+    client has taken the one before it, so long responses streamed from files (see
+    :class:`~granola.file_responses.FileResponse`) are never buffered whole.
+    """
+
+    def __init__(self, server, fileobj, device):
+        self.server = server
+        self.fileobj = fileobj
+        self.device = device
+        self.output = bytearray()
+        self.commands = deque()
+        self.awaiting = False  # whether the response to the last command written hasn't been read yet
+        self.streaming = False  # whether the rest of the response is waiting for the client to take what is buffered
+        self.events = selectors.EVENT_READ
+
+    def register(self):
+        self.server.register(self.fileobj, self.ready)
+
+    @abc.abstractmethod
+    def recv(self, size):
+        """Return up to ``size`` bytes from the client, b"" when it is gone, or None if nothing can be read yet"""
+
+    @abc.abstractmethod
+    def send(self, data):
+        """Send as much of ``data`` as possible without blocking and return the number of bytes sent"""
+
+    @abc.abstractmethod
+    def closed(self):
+        """Called when the client has gone away"""
+
+    def ready(self, mask):
+        if mask & selectors.EVENT_READ:
+            data = self.recv(self.server.chunk_size)
+            if data == b"":
+                self.closed()
+                return
+            if data:
+                self.received(data)
+                self.flush()
+        if mask & selectors.EVENT_WRITE:
+            self.flush()
+
+    def received(self, data):
+        """Queue the commands in ``data`` from the client, and answer as many as the device is ready for"""
+        self.commands.extend(split_commands(self.device, data))
+        self.answer()
+
+    def answer(self):
+        """
+        Write queued commands to the device, passing each chunk of their responses to :meth:`responded`, until the
+        queue is empty, a chunk of the response is buffered for the client, in which case :meth:`flush` calls this
+        again once it has been sent, or the device holds a response back, in which case the server calls this
+        again when it is due.
+        """
+        self.streaming = False
+        while True:
+            if self.awaiting:
+                if self.device._is_delayed():
+                    self.server.hold(self)
+                    return
+                if len(self.output) >= self.server.chunk_size:
+                    self.streaming = True
+                    return
+                waiting = self.device.in_waiting
+                if waiting:
+                    self.responded(self.device.read(min(waiting, self.server.chunk_size)))
+                    continue
+                self.awaiting = False
+                self.server.done_talking(self)
+            if not self.commands or not self.server.take_turn(self):
+                return
+            self.write_command(self.commands.popleft())
+            self.awaiting = True
+
+    def write_command(self, command):
+        """Write one of the client's commands to the device"""
+        self.device.write(command)
+
+    def responded(self, data):
+        """Queue a response from the device in ``output``, to send to the client"""
+        self.output += data
+
+    def flush(self):
+        if self.streaming and len(self.output) < self.server.chunk_size:
+            self.answer()  # the next chunk of a long response, now that the client has taken some of the last one
+        if self.output:
+            try:
+                sent = self.send(self.output)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            del self.output[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if self.output or self.streaming else 0)
+        if events != self.events:
+            self.events = events
+            self.server.selector.modify(self.fileobj, events, self.ready)
+
+
+def respond(device, data, chunk_size=4096):
+    """
+    Write ``data`` to ``device`` one command at a time and yield everything it responds with, as a
+    :class:`Channel` would, but without waiting for responses that are held back.
+
+    Args:
+        device (Cereal): The device.
+        data (bytes): Bytes received from a client.
+        chunk_size (int, optional): Maximum number of bytes read from the device at once. Defaults to 4096
+
+    Yields:
+        bytes: the device's responses, up to ``chunk_size`` bytes at a time.
+    """
+    for command in split_commands(device, data):
+        device.write(command)
+        waiting = device.in_waiting
+        while waiting:
+            yield device.read(min(waiting, chunk_size))
+            waiting = device.in_waiting
+
+
+def split_commands(device, data):
+    """
+    Split ``data`` after each of ``device``'s write terminators, keeping any unterminated remainder as the last part.
+    """
+    terminator = encode_to_bytes(device._write_terminator, device._encoding)
+    start = 0
+    while start < len(data):
+        end = data.find(terminator, start) if terminator else -1
+        end = len(data) if end < 0 else end + len(terminator)
+        yield data[start:end]
+        start = end
+
+
+__doc__ = """
+Shared event loop for the servers that expose :class:`~granola.breakfast_cereal.Cereal` devices to other processes,
+such as :mod:`~granola.pty_server` and :mod:`~granola.tcp_server`.
+"""
@@ -0,0 +1,301 @@
+import abc
+import csv
+import logging
+import math
+import time
+
+import numpy as np
+
+from granola.utils import (
+    ABC,
+    IS_PYTHON3,
+    _get_subclasses,
+    fixpath,
+    resolve_data_path,
+)
+
+if IS_PYTHON3:
+    from collections.abc import Mapping
+else:  # pragma: no cover
+    from collections import Mapping
+
+logger = logging.getLogger(__name__)
+
+
+class BaseSignal(ABC):
+    """
+    Base class for signal sources. A signal is a value that changes over time that every device in a
+    :class:`~granola.fleet.Fleet` sees, such as the temperature of the region the devices are in.
+    Subclasses define the curve shared by every device with :meth:`shared_values`, and every device
+    additionally gets its own gaussian noise on top of that curve.
+
+    Args:
+        noise (float, optional): Standard deviation of the per device noise added to the shared curve.
+            Defaults to 0
+        seed (int, optional): Seed for the noise (and any other randomness in the signal).
+            Defaults to None
+    """
+
+    def __init__(self, noise=0.0, seed=None):
+        self.noise = noise
+        self.seed = seed
+        self.random_state = np.random.RandomState(seed)
+
+    @abc.abstractmethod
+    def shared_value(self, now):
+        """
+        Value of the signal, before per device noise, at time ``now``.
+
+        Args:
+            now (float): Time in seconds.
+
+        Returns:
+            float
+        """
+
+    def values(self, now, size):
+        """
+        Value of the signal for ``size`` devices at time ``now``, computed in one vectorised call.
+
+        Args:
+            now (float): Time in seconds.
+            size (int): Number of devices.
+
+        Returns:
+            np.ndarray: one value per device.
+        """
+        shared = self.shared_value(now)
+        if not self.noise:
+            return np.full(size, shared, dtype=float)
+        return shared + self.random_state.normal(0.0, self.noise, size)
+
+
+class DiurnalSignal(BaseSignal):
+    """
+    Sinusoid with a (by default) one day period, ``mean + amplitude * cos(2 * pi * (now - peak_time) / period)``.
+
+    Args:
+        mean (float): Mean value of the signal.
+        amplitude (float): Amplitude of the signal.
+        period (float, optional): Period of the signal in seconds. Defaults to 86400 (one day)
+        peak_time (float, optional): A time (in seconds) when the signal peaks. Defaults to 0
+        noise, seed: See :class:`BaseSignal`
+    """
+
+    def __init__(self, mean, amplitude, period=86400.0, peak_time=0.0, **kwargs):
+        super(DiurnalSignal, self).__init__(**kwargs)
+        self.mean = mean
+        self.amplitude = amplitude
+        self.period = period
+        self.peak_time = peak_time
+
+    def shared_value(self, now):
+        return self.mean + self.amplitude * math.cos(2 * math.pi * (now - self.peak_time) / self.period)
+
+
+class RecordedSeries(BaseSignal):
+    """
+    Signal that replays a recorded series, linearly interpolating between the recorded points.
+
+    Args:
+        times (list[float], optional): Times, in seconds from the start of the series, of each recorded value.
+        values (list[float], optional): The recorded values.
+        file (str, optional): CSV file with ``time`` and ``value`` columns to load ``times`` and ``values`` from.
+        data_path_root (str, optional): Path to resolve a relative ``file`` against.
+        start_time (float, optional): Time that lines up with the start of the series. Defaults to 0
+        loop (bool, optional): Whether to loop back to the beginning of the series once it ends, or hold the
+            last value. Defaults to True
+        noise, seed: See :class:`BaseSignal`
+    """
+
+    def __init__(self, times=None, values=None, file=None, data_path_root=None, start_time=0.0, loop=True, **kwargs):
+        super(RecordedSeries, self).__init__(**kwargs)
+        if file is not None:
+            times, values = self._load_file(file, data_path_root)
+        if times is None or values is None or len(times) != len(values) or not len(times):
+            raise ValueError("RecordedSeries needs the same, non zero, number of times and values")
+        self.times = np.asarray(times, dtype=float)
+        self.recorded_values = np.asarray(values, dtype=float)
+        self.start_time = start_time
+        self.loop = loop
+
+    def shared_value(self, now):
+        elapsed = now - self.start_time
+        if self.loop and self.times[-1] > self.times[0]:
+            elapsed = self.times[0] + (elapsed - self.times[0]) % (self.times[-1] - self.times[0])
+        return float(np.interp(elapsed, self.times, self.recorded_values))
+
+    @staticmethod
+    def _load_file(file, data_path_root):
+        path = fixpath(resolve_data_path(file, data_path_root))
+        times, values = [], []
+        with open(path) as f:
+            for row in csv.DictReader(f, skipinitialspace=True):
+                times.append(float(row["time"]))
+                values.append(float(row["value"]))
+        return times, values
+
+
+class RandomWalk(BaseSignal):
+    """
+    Shared gaussian random walk, that takes one step of standard deviation ``step`` every second.
+
+    Args:
+        start (float): Starting value of the walk.
+        step (float): Standard deviation of the change of the walk per second.
+        minimum (float, optional): Lowest value the walk can reach. Defaults to no limit
+        maximum (float, optional): Highest value the walk can reach. Defaults to no limit
+        noise, seed: See :class:`BaseSignal`
+    """
+
+    def __init__(self, start, step, minimum=None, maximum=None, **kwargs):
+        super(RandomWalk, self).__init__(**kwargs)
+        self.start = start
+        self.step = step
+        self.minimum = minimum
+        self.maximum = maximum
+        self.current = float(start)
+        self.last_time = None
+
+    def shared_value(self, now):
+        if self.last_time is not None and now > self.last_time:
+            self.current += self.random_state.normal(0.0, self.step * math.sqrt(now - self.last_time))
+            if self.minimum is not None or self.maximum is not None:
+                self.current = float(np.clip(self.current, self.minimum, self.maximum))
+        self.last_time = now
+        return self.current
+
+
+class SignalBank(object):
+    """
+    The signals of a :class:`~granola.fleet.Fleet`, computed once per tick for every device of the fleet.
+
+    The first time a signal is read in a new tick (``floor(now / tick)`` changed), every signal
+    in the bank is recomputed for every device with one vectorised call each. Until the next tick, reading
+    a signal on a device is just an array lookup, so thousands of devices can read signals at
+    no per device compute cost.
+
+    Args:
+        signals (dict[str, BaseSignal | dict], optional): Signals by name. A signal can be an instance or a dictionary
+            of ``{"SignalClassName": {initialization options}}``.
+        size (int, optional): Number of devices. Defaults to 0
+        tick (float, optional): Seconds between recomputing the signals. Defaults to 1
+        clock (callable, optional): Function that returns the current time in seconds. Defaults to :func:`time.time`
+        data_path_root (str, optional): Path to resolve relative signal data files against.
+
+    Examples
+    --------
+    >>> bank = SignalBank({"outdoor_temp": DiurnalSignal(mean=20, amplitude=5)}, size=3, clock=lambda: 0.0)
+    >>> bank.view(2)["outdoor_temp"]
+    25.0
+    >>> bank["outdoor_temp"].tolist()
+    [25.0, 25.0, 25.0]
+    """
+
+    def __init__(self, signals=None, size=0, tick=1.0, clock=time.time, data_path_root=None):
+        self.size = size
+        self.tick = tick
+        self.clock = clock
+        self.signals = {}
+        self.current = {}
+        self._tick_index = None
+        self._data_path_root = data_path_root
+        for name, signal in (signals if signals is not None else {}).items():
+            self.add(name, signal)
+
+    def add(self, name, signal):
+        """
+        Add a signal to the bank.
+
+        Args:
+            name (str): Name templates use to read the signal (``{{ signals.name }}``).
+            signal (BaseSignal | dict): The signal, or its ``{"SignalClassName": {options}}`` configuration.
+        """
+        if isinstance(signal, dict):
+            ((cls_name, options),) = signal.items()
+            opts = {"data_path_root": self._data_path_root} if cls_name == RecordedSeries.__name__ else {}
+            opts.update(options)
+            signal = _get_signal_subclasses()[cls_name](**opts)
+        self.signals[name] = signal
+        self._tick_index = None  # recompute everything with the new signal on next read
+
+    def resize(self, size):
+        """Change the number of devices the signals are computed for."""
+        if size != self.size:
+            self.size = size
+            self._tick_index = None
+
+    def refresh(self, now=None):
+        """Recompute every signal if ``now`` is in a new tick."""
+        now = self.clock() if now is None else now
+        tick_index = math.floor(now / self.tick) if self.tick else now
+        if tick_index != self._tick_index:
+            self._tick_index = tick_index
+            for name, signal in self.signals.items():
+                self.current[name] = signal.values(now, self.size)
+        return self.current
+
+    def __getitem__(self, name):
+        return self.refresh()[name]
+
+    def __contains__(self, name):
+        return name in self.signals
+
+    def view(self, index):
+        """Return the :class:`SignalView` of the device at ``index``."""
+        return SignalView(self, index)
+
+
+class SignalView(Mapping):
+    """
+    Read only mapping of signal name to the value a single device sees. This is what templates get as ``signals``.
+    """
+
+    def __init__(self, bank, index):
+        self.bank = bank
+        self.index = index
+
+    def __getitem__(self, name):
+        return float(self.bank[name][self.index])
+
+    def __iter__(self):
+        return iter(self.bank.signals)
+
+    def __len__(self):
+        return len(self.bank.signals)
+
+    def __repr__(self):
+        return "{cls}(index={index}, signals={signals})".format(
+            cls=self.__class__.__name__, index=self.index, signals=list(self)
+        )
+
+
+def _get_signal_subclasses():
+    subclasses = {}
+    stack = [BaseSignal]
+    while stack:
+        for name, subclass in _get_subclasses(stack.pop()).items():
+            subclasses[name] = subclass
+            stack.append(subclass)
+    return subclasses
+
+
+__doc__ = """
+Signal sources for simulated fleets. Signals are computed once per tick for every device in a
+:class:`~granola.fleet.Fleet` and read inside :class:`~granola.command_readers.GettersAndSetters`
+templates through the ``signals`` variable, so every device in a fleet can see the same curve plus its own noise.
+
+>>> from granola import Cereal, Fleet
+>>> command_readers = {
+...     "GettersAndSetters": {
+...         "default_values": {"offset": "0.5"},
+...         "getters": [{"cmd": "get temp\\r", "response": "{{ signals.outdoor_temp + offset|float }}\\r>"}],
+...     }
+... }
+>>> fleet = Fleet([Cereal(command_readers), Cereal(command_readers)], clock=lambda: 6 * 3600.0,
+...               signals={"outdoor_temp": DiurnalSignal(mean=20, amplitude=5, peak_time=6 * 3600)})
+>>> fleet[1].write(b"get temp\\r")
+9
+>>> fleet[1].read(fleet[1].in_waiting)
+b'25.5\\r>'
+"""
@@ -0,0 +1,168 @@
+import logging
+import os
+import re
+import tty
+from datetime import datetime
+
+import serial
+
+from granola.breakfast_cereal import Cereal
+from granola.pty_server import _PtyChannel
+from granola.serial_sniffer import SniffRecorder
+from granola.serving import SelectorServer, split_commands
+
+logger = logging.getLogger(__name__)
+
+
+class SniffingProxy(SelectorServer):
+    """
+    Transparent proxy that puts a pseudo terminal in front of a serial port and records everything that goes
+    through it in the same CSV format as :class:`~granola.serial_sniffer.SerialSniffer`, for applications
+    (such as third party binaries) that can't have a SerialSniffer injected in place of Serial.
+
+    Point the application at :attr:`path` instead of the port. Bytes are forwarded in both directions as soon
+    as they arrive, from one :mod:`selectors` event loop, and each command written by the application is recorded
+    with the response read after it, and the time the response took, just like SerialSniffer.
+
+    Only available on POSIX systems.
+
+    Args:
+        device (str or serial.Serial): The port to proxy. Either an opened Serial (including a
+            :class:`~granola.breakfast_cereal.Cereal` standing in for the device), or a port name or pyserial URL
+            (such as ``/dev/ttyUSB0`` or ``granola://cereal``) that is opened with ``serial_kwargs``.
+        outfile (str, optional): CSV file to write to. Defaults to a timestamped file named after the port
+        delimiter (str, optional): Passed to :func:`csv.writer`. Defaults to ","
+        quotechar (str, optional): Passed to :func:`csv.writer`. Defaults to '"'
+        write_terminator (bytes, optional): End of a command. Defaults to b"\\\\r"
+        read_terminator (bytes, optional): End of a response. Defaults to b"\\\\r>"
+        chunk_size (int, optional): Maximum number of bytes forwarded at once. Defaults to 4096
+        serial_kwargs: Arguments for :func:`serial.serial_for_url` when ``device`` is a port name.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> outfile = os.path.join(tempfile.mkdtemp(), "sniffed.csv")
+    >>> device = Cereal({"CannedQueries": {"data": [{"ping\\r": "pong\\r>"}]}})
+    >>> proxy = SniffingProxy(device, outfile=outfile)
+    >>> application = os.open(proxy.path, os.O_RDWR | os.O_NOCTTY)
+    >>> os.write(application, b"ping\\r")
+    5
+    >>> proxy.serve_once(timeout=1)
+    >>> os.read(application, 100)
+    b'pong\\r>'
+    >>> proxy.close()
+    >>> os.close(application)
+    >>> print(open(outfile).read().splitlines()[1].rsplit(",", 1)[0])
+    ping\\r,pong\\r>
+    """
+
+    def __init__(
+        self,
+        device,
+        outfile="",
+        delimiter=",",
+        quotechar='"',
+        write_terminator=b"\r",
+        read_terminator=b"\r>",
+        chunk_size=4096,
+        **serial_kwargs
+    ):
+        super(SniffingProxy, self).__init__(chunk_size=chunk_size)
+        self._owns_device = not isinstance(device, serial.SerialBase)
+        if self._owns_device:
+            serial_kwargs.setdefault("timeout", 0)
+            device = serial.serial_for_url(device, **serial_kwargs)
+        self.device = device
+        if not outfile:
+            port = re.sub(r"[^\w.-]+", "_", str(device.port or "serial")).strip("_")
+            outfile = datetime.now().strftime("%Y-%m-%dT%H-%M-%S") + "_" + port + ".csv"
+        self.recorder = SniffRecorder(outfile, delimiter, quotechar, write_terminator, read_terminator, keep_open=True)
+
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        self.path = os.ttyname(slave)
+        self._application = _ApplicationChannel(self, master, device, slave, self.path)
+        self._application.register()
+
+        # A Cereal answers as soon as it is written to, and a real port is watched through its file descriptor.
+        # Anything else is polled every time around the loop
+        self._cereal = isinstance(device, Cereal)
+        self._device_fd = None if self._cereal else _fileno(device)
+        self._polling = self._device_fd is None and not self._cereal
+        if self._device_fd is not None:
+            self.register(self._device_fd, self._device_ready)
+        logger.info("%s proxying %s on %s, recording to %s", self.__class__.__name__, device, self.path, outfile)
+
+    def serve_once(self, timeout=None):
+        if self._polling:
+            timeout = 0.001 if timeout is None else min(timeout, 0.001)
+        super(SniffingProxy, self).serve_once(timeout)
+        if self._polling:
+            self._device_ready(None)
+
+    def forward_to_device(self, data):
+        if self._cereal:  # record each command with its own response, as they would be from a real device
+            self._application.commands.extend(split_commands(self.device, data))
+            self._application.answer()
+        else:
+            self.recorder.wrote(data)
+            self.device.write(data)
+
+    def forward_to_application(self, data):
+        if data:
+            self.recorder.read(data)
+            self._application.output += data
+            self._application.flush()
+
+    def _device_ready(self, mask):
+        try:
+            waiting = self.device.in_waiting
+            data = self.device.read(min(max(waiting, 1), self.chunk_size)) if waiting or mask else b""
+        except (OSError, serial.SerialException) as err:
+            logger.error("%s lost %s: %r", self.__class__.__name__, self.device, err)
+            if self._device_fd is not None:
+                self.unregister(self._device_fd)
+                self._device_fd = None
+            self._polling = False
+            self.stop()
+            return
+        self.forward_to_application(data)
+
+    def _close_channels(self):
+        self.unregister(self._application.fileobj)
+        os.close(self._application.fileobj)
+        os.close(self._application.slave)
+        if self._device_fd is not None:
+            self.unregister(self._device_fd)
+        if self._owns_device:
+            self.device.close()
+        self.recorder.close()
+
+
+class _ApplicationChannel(_PtyChannel):
+    def received(self, data):
+        self.server.forward_to_device(data)
+
+    def write_command(self, command):
+        self.server.recorder.wrote(command)
+        super(_ApplicationChannel, self).write_command(command)
+
+    def responded(self, data):
+        self.server.forward_to_application(bytes(data))
+
+
+def _fileno(device):
+    """The file descriptor to watch for data from ``device``, or None if it doesn't have one"""
+    try:
+        return device.fileno()
+    except (AttributeError, serial.SerialException, ValueError):
+        return None
+
+
+__doc__ = """
+Record the traffic between an application and a serial port, without changing the application, by putting a
+pseudo terminal in front of the port. Also available from the command line::
+
+    python -m granola sniff /dev/ttyUSB0 --baudrate 115200 --outfile sniffed.csv
+"""
@@ -0,0 +1,314 @@
+import csv
+import io
+import logging
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+from granola.command_table import NAN, CommandTable, _convert_value, _is_missing
+from granola.utils import IS_PYTHON3, decode_escape_char
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+TABLE_NAME = "canned_queries"
+_BATCH_SIZE = 1000
+
+
+class SqliteCommandTable(CommandTable):
+    """
+    Table of canned serial commands in a SQLite database, such as a library of captures from many firmware versions
+    made with :func:`import_csv`, where only the rows matching ``where`` are used. Nothing is read when the table is
+    opened, a command's rows are only looked up when its responses are first used, and each value is only read when
+    a cursor reaches it, so libraries of millions of rows can be used as mocks.
+
+    Args:
+        path (str): Path to the database.
+        where (dict, optional): Values of the extra fields (such as ``{"firmware": "1.2.0"}``) of the rows to use.
+            Defaults to every row
+        table (str, optional): Table in the database. Defaults to "canned_queries"
+
+    Examples
+    --------
+    >>> import os, tempfile
+    >>> capture = os.path.join(tempfile.mkdtemp(), "capture.csv")
+    >>> with open(capture, "w") as f:
+    ...     f.writelines(["cmd,response\\n", "get -sn\\\\r,42\\\\r>\\n", "get -sn\\\\r,43\\\\r>\\n"])
+    >>> path = capture.replace(".csv", ".sqlite")
+    >>> import_csv(path, [capture], firmware="1.2.0")
+    2
+    >>> import_csv(path, [capture], firmware="1.3.0")
+    2
+    >>> responses = SqliteCommandTable(path, where={"firmware": "1.3.0"}).index()["get -sn\\r"]
+    >>> len(responses), responses[1]
+    (2, '43\\r>')
+    """
+
+    lazy = True
+
+    def __init__(self, path, where=None, table=TABLE_NAME):
+        self.path = str(path)
+        self.where = OrderedDict(where or {})
+        self.table = table
+        self.extra_fields = OrderedDict()
+        self._open()
+        info = self._connection.execute("PRAGMA table_info(%s)" % _quote(self.table)).fetchall()
+        names = [row[1] for row in info]
+        self._text_columns = set(row[1] for row in info if row[2].upper() == "TEXT")
+        if not names:
+            raise ValueError("%s has no table %s" % (self.path, self.table))
+        self._stored_columns = set(names)
+        for name in self.where:
+            if name not in names:
+                raise ValueError("%s has no %s column to select rows with" % (self.path, name))
+        self.columns = OrderedDict((name, _SqliteColumn(self, name)) for name in names)
+        self._length = None
+        self._rowids = None  # of every row used, in order, to find the values of extra fields with one per row
+
+    def __len__(self):
+        if self._length is None:
+            self._length = self._query("SELECT COUNT(*) FROM {table}{where}").fetchone()[0]
+        return self._length
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_connection"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def close(self):
+        self._connection.close()
+
+    def add_fields(self, **fields):
+        """
+        Add extra fields, as for :meth:`CommandTable.add_fields`, used where a row doesn't have a value. Nothing is
+        read for a value broadcast to every row, and only the row ids for a list of values, one per row.
+        """
+        for name, value in fields.items():
+            if isinstance(value, (list, tuple)) and len(value) != len(self):
+                raise ValueError("Length of values (%s) does not match number of rows (%s)" % (len(value), len(self)))
+            self.extra_fields[name] = value
+            if name not in self.columns:
+                self.columns[name] = _SqliteColumn(self, name)
+
+    def index(self, column="response"):
+        commands = self._query("SELECT cmd FROM {table}{where} GROUP BY cmd ORDER BY MIN(rowid)")
+        return OrderedDict((cmd, _SqliteColumn(self, column, cmd)) for (cmd,) in commands if cmd is not None)
+
+    def to_dataframe(self):
+        """The selected rows as a pandas DataFrame (requires pandas, and reads every row)"""
+        return CommandTable(OrderedDict((name, list(column)) for name, column in self.columns.items())).to_dataframe()
+
+    def _extra_value(self, name, rowid):
+        """Value of the extra field ``name`` in the row with ``rowid``, or NaN"""
+        extra = self.extra_fields.get(name, NAN)
+        if isinstance(extra, (list, tuple)):
+            if self._rowids is None:
+                self._rowids = _SqliteColumn(self, "cmd").rowids
+            extra = extra[int(np.searchsorted(self._rowids, rowid))]
+        return extra
+
+    def _open(self):
+        if IS_PYTHON3:
+            uri = "file:%s?mode=ro" % self.path.replace("?", "%3f").replace("#", "%23")
+            self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:  # pragma: no cover
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+    def _query(self, sql, conditions=None, parameters=()):
+        """Run ``sql``, with ``{table}`` and ``{where}`` (the rows selected, and ``conditions``) filled in"""
+        conditions = OrderedDict(conditions or {})
+        conditions.update(self.where)
+        where = " AND ".join(self._condition(name) for name in conditions)
+        sql = sql.format(table=_quote(self.table), where=" WHERE " + where if where else "")
+        return self._connection.execute(sql, tuple(conditions.values()) + tuple(parameters))
+
+    def _condition(self, name):
+        """
+        Condition of the rows whose ``name`` is a value, compared as text, so that values such as ``"1.10"`` and
+        ``"007"`` aren't taken as numbers. Fields imported with :func:`import_csv` are text columns, so their
+        comparisons use their index, while other columns (such as numbers from the CSV files) are cast to text first.
+        """
+        if name == "cmd" or name in self._text_columns:
+            return "%s = ?" % _quote(name)
+        return "CAST(%s AS TEXT) = ?" % _quote(name)
+
+
+class _SqliteColumn(object):
+    """
+    Sequence of the values of one column of a :class:`SqliteCommandTable`, in the rows of one command (or every row).
+    The rows are looked up when the sequence is first used, and values are read as they are used.
+    """
+
+    def __init__(self, table, name, cmd=None):
+        self.table = table
+        self.name = name
+        self.cmd = cmd
+        self._rowids = None
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_rowids"] = None
+        return state
+
+    def __getitem__(self, i):
+        sql = "SELECT %s FROM %s WHERE rowid = ?" % (self._selected(), _quote(self.table.table))
+        rowid = int(self.rowids[i])
+        (value,) = self.table._connection.execute(sql, (rowid,)).fetchone()
+        return self._value(value, rowid)
+
+    def __iter__(self):
+        for value, rowid in self.table._query(
+            "SELECT %s, rowid FROM {table}{where} ORDER BY rowid" % self._selected(), self._conditions()
+        ):
+            yield self._value(value, rowid)
+
+    @property
+    def rowids(self):
+        if self._rowids is None:
+            rowids = self.table._query("SELECT rowid FROM {table}{where} ORDER BY rowid", self._conditions())
+            self._rowids = np.fromiter((rowid for (rowid,) in rowids), dtype=np.int64)
+        return self._rowids
+
+    def _conditions(self):
+        return {"cmd": self.cmd} if self.cmd is not None else {}
+
+    def _selected(self):
+        return _quote(self.name) if self.name in self.table._stored_columns else "NULL"
+
+    def _value(self, value, rowid):
+        if value is None:
+            value = self.table._extra_value(self.name, rowid)
+        return value
+
+
+def import_csv(path, csv_paths, table=TABLE_NAME, **fields):
+    """
+    Import the canned queries in CSV files, such as captures from :class:`~granola.serial_sniffer.SerialSniffer`, into
+    the SQLite database at ``path``, creating it if needed. Commands and responses are stored with their escape
+    characters decoded, and every other column (and each of ``fields``) is added to the table if it isn't there
+    already, and indexed along with the commands, so they can be used to pick the rows a
+    :class:`SqliteCommandTable` uses.
+
+    Args:
+        path (str): Path to the database.
+        csv_paths (list[str]): CSV files to import.
+        table (str, optional): Table in the database. Defaults to "canned_queries"
+        fields: Values to store in every imported row, such as ``firmware="1.2.0"``. They are stored as text.
+
+    Returns:
+        int: Number of rows imported.
+    """
+    connection = sqlite3.connect(str(path))
+    imported = 0
+    try:
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS %s (cmd, response)" % _quote(table))
+            connection.execute("CREATE INDEX IF NOT EXISTS %s ON %s (cmd)" % (_quote("%s_cmd" % table), _quote(table)))
+            for csv_path in csv_paths:
+                imported += _import_csv(connection, table, str(csv_path), fields)
+    finally:
+        connection.close()
+    logger.info("Imported %s rows from %s into %s", imported, len(csv_paths), path)
+    return imported
+
+
+def _import_csv(connection, table, csv_path, fields):
+    if IS_PYTHON3:
+        f = io.open(csv_path, newline="", encoding="utf-8")
+    else:  # pragma: no cover
+        f = open(csv_path, "rb")
+    with f:
+        reader = csv.reader(f, skipinitialspace=True)
+        header = next(reader, ["cmd", "response"])
+        names = header + [name for name in fields if name not in header]
+        _add_columns(connection, table, names, text=fields)
+        insert = "INSERT INTO %s (%s) VALUES (%s)" % (
+            _quote(table),
+            ", ".join(_quote(name) for name in names),
+            ", ".join("?" for _ in names),
+        )
+        imported = 0
+        batch = []
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            values = values + [""] * (len(header) - len(values))
+            row = [
+                decode_escape_char(value) if name in ("cmd", "response") else _convert_value(value)
+                for name, value in zip(header, values)
+            ]
+            row = [None if _is_missing(value) or value == "" else value for value in row]
+            batch.append(row + [fields[name] for name in names[len(header) :]])
+            if len(batch) == _BATCH_SIZE:
+                connection.executemany(insert, batch)
+                imported += len(batch)
+                batch = []
+        connection.executemany(insert, batch)
+        return imported + len(batch)
+
+
+def _add_columns(connection, table, names, text=()):
+    """
+    Add any of the columns that the table doesn't have, each indexed along with the commands. Columns in ``text``
+    are TEXT columns, so that their values are stored, and compared, as text.
+    """
+    existing = [row[1] for row in connection.execute("PRAGMA table_info(%s)" % _quote(table))]
+    for name in names:
+        if name in existing:
+            continue
+        column = _quote(name) + (" TEXT" if name in text else "")
+        connection.execute("ALTER TABLE %s ADD COLUMN %s" % (_quote(table), column))
+        existing.append(name)
+    for name in names:
+        if name not in ("cmd", "response"):
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS %s ON %s (%s, cmd)"
+                % (_quote("%s_%s" % (table, name)), _quote(table), _quote(name))
+            )
+
+
+def split_sqlite_path(path):
+    """
+    The database and the rows to use from a canned queries path to a SQLite database, which can pick rows by the
+    values of their extra fields after a ``?``, like a URL, or None if ``path`` isn't to a database.
+
+    Examples
+    --------
+    >>> split_sqlite_path("library.sqlite?firmware=1.10&device_id=007")
+    ('library.sqlite', OrderedDict([('firmware', '1.10'), ('device_id', '007')]))
+    >>> split_sqlite_path("cereal_cmds.csv") is None
+    True
+    """
+    path, _, query = str(path).partition("?")
+    if not path.lower().endswith(SQLITE_SUFFIXES):
+        return None
+    where = OrderedDict()
+    for condition in query.split("&") if query else []:
+        name, _, value = condition.partition("=")
+        where[name] = value  # kept as text, as "1.10" isn't the same firmware as "1.1"
+    return path, where
+
+
+def _quote(name):
+    return '"%s"' % name.replace('"', '""')
+
+
+__doc__ = """
+Canned queries stored in SQLite databases, for libraries of captures too big to read, with the rows a device uses
+picked by the values of their extra fields, such as the firmware version they were captured from. Captures are
+imported with :func:`import_csv`, or from the command line::
+
+    python -m granola import-sqlite library.sqlite capture.csv --field firmware=1.2.0
+
+and used by adding the database to the canned queries ``data``, with the values of the rows to use after a ``?``::
+
+    "data": ["library.sqlite?firmware=1.2.0&device=cereal"]
+"""
@@ -0,0 +1,273 @@
+import logging
+import selectors
+import socket
+import threading
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+from granola.serving import Channel, SelectorServer, respond
+
+logger = logging.getLogger(__name__)
+
+
+class TcpServer(SelectorServer):
+    """
+    Serve :class:`~granola.breakfast_cereal.Cereal` devices over TCP, so that code in other processes can use them
+    through pyserial's ``socket://`` URLs (:func:`serial.serial_for_url`) without being changed.
+
+    Each listening port serves either one device, shared by every connection to the port, or a device per
+    connection, from a factory or from a pool such as a :class:`~granola.fleet.Fleet`. Every port and connection
+    is served from one non blocking :mod:`selectors` event loop, and responses are sent as soon as they are produced.
+
+    Args:
+        host (str, optional): Interface to listen on. Defaults to "127.0.0.1"
+        backlog (int, optional): Listen backlog of each port. Defaults to 128
+        chunk_size (int, optional): Maximum number of bytes read from a connection at once. Defaults to 4096
+
+    Examples
+    --------
+    >>> import serial
+    >>> from granola import Cereal
+    >>> server = TcpServer()
+    >>> address = server.add(Cereal({"CannedQueries": {"data": [{"ping\\r": "pong\\r>"}]}}))
+    >>> ser = serial.serial_for_url(server.url(address), timeout=1)
+    >>> ser.write(b"ping\\r")
+    5
+    >>> while not ser.in_waiting:
+    ...     server.serve_once(timeout=1)
+    >>> ser.read(6)
+    b'pong\\r>'
+    >>> ser.close()
+    >>> server.close()
+    """
+
+    scheme = "socket"
+
+    def __init__(self, host="127.0.0.1", backlog=128, chunk_size=4096):
+        super(TcpServer, self).__init__(chunk_size=chunk_size)
+        self.host = host
+        self.backlog = backlog
+        self._listeners = OrderedDict()  # (host, port) -> _Listener
+        self._connections = set()
+
+    @property
+    def addresses(self):
+        """list[tuple]: ``(host, port)`` of every listening port"""
+        return list(self._listeners)
+
+    @property
+    def connections(self):
+        """int: number of connected clients"""
+        return len(self._connections)
+
+    @classmethod
+    def url(cls, address):
+        """pyserial URL to connect to ``address``"""
+        return "{scheme}://{host}:{port}".format(scheme=cls.scheme, host=address[0], port=address[1])
+
+    def add(self, device, port=0):
+        """
+        Serve ``device`` on ``port``, shared by every connection to it. Connections take turns, each command only
+        being written to the device once the responses to other connections' commands have been sent.
+
+        Args:
+            device (Cereal): The device.
+            port (int, optional): Port to listen on. Defaults to 0, any free port
+
+        Returns:
+            tuple: ``(host, port)`` address the device is served on.
+        """
+        return self._listen(port, lambda: device, None)
+
+    def add_factory(self, factory, port=0):
+        """
+        Serve a new device from ``factory()`` to every connection to ``port``, discarded when the connection closes.
+
+        Returns:
+            tuple: ``(host, port)`` address the devices are served on.
+        """
+        return self._listen(port, factory, None)
+
+    def add_fleet(self, fleet, port=0, per_connection=False):
+        """
+        Serve every device in ``fleet`` (a :class:`~granola.fleet.Fleet` or a list of devices).
+
+        Args:
+            fleet (Fleet or list[Cereal]): The devices.
+            port (int, optional): Port to listen on, or the first of consecutive ports to listen on when each
+                device gets its own port. Defaults to 0, any free port
+            per_connection (bool, optional): If False, each device gets its own port. If True, all of them
+                are served on a single port, each connection getting the next device not in use by another
+                connection, and connections are refused once every device is in use. Defaults to False
+
+        Returns:
+            list[tuple]: ``(host, port)`` address of each device, or a single address if ``per_connection``.
+        """
+        devices = list(fleet)
+        if per_connection:
+            free = list(reversed(devices))
+
+            def acquire():
+                return free.pop() if free else None
+
+            return self._listen(port, acquire, free.append)
+        return [self.add(device, port + i if port else 0) for i, device in enumerate(devices)]
+
+    def remove(self, address):
+        """Stop listening on ``address``, connections already made stay open"""
+        listener = self._listeners.pop(tuple(address))
+        self.unregister(listener.sock)
+        listener.sock.close()
+
+    def _listen(self, port, acquire, release):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, port))
+        sock.listen(self.backlog)
+        sock.setblocking(False)
+        address = sock.getsockname()[:2]
+        listener = _Listener(self, sock, acquire, release)
+        self._listeners[address] = listener
+        self.register(sock, listener.accept)
+        logger.info("%s listening on %s", self.__class__.__name__, self.url(address))
+        return address
+
+    def _connection(self, sock, device, release):
+        return _Connection(self, sock, device, release)
+
+    def _close_channels(self):
+        for address in list(self._listeners):
+            self.remove(address)
+        for connection in list(self._connections):
+            connection.closed()
+
+
+class _Listener(object):
+    def __init__(self, server, sock, acquire, release):
+        self.server = server
+        self.sock = sock
+        self.acquire = acquire
+        self.release = release
+
+    def accept(self, mask):
+        try:
+            sock, peer = self.sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        device = self.acquire()
+        if device is None:
+            logger.warning("%s refusing %s, every device is in use", self.server.__class__.__name__, peer)
+            sock.close()
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = self.server._connection(sock, device, self.release)
+        self.server._connections.add(connection)
+        connection.register()
+        logger.debug("%s connected %s to %s", self.server.__class__.__name__, peer, device)
+
+
+class _Connection(Channel):
+    def __init__(self, server, sock, device, release):
+        super(_Connection, self).__init__(server, sock, device)
+        self.release = release
+
+    def recv(self, size):
+        try:
+            return self.fileobj.recv(size)
+        except (BlockingIOError, InterruptedError):
+            return None
+        except ConnectionError:
+            return b""
+
+    def send(self, data):
+        try:
+            return self.fileobj.send(data)
+        except ConnectionError:
+            self.output.clear()
+            return 0
+
+    def closed(self):
+        self.server._connections.discard(self)
+        self.server.unregister(self.fileobj)
+        self.fileobj.close()
+        if self.release is not None:
+            self.release(self.device)
+
+
+def benchmark(factory, command, clients=100, commands=100, host="127.0.0.1"):
+    """
+    Loopback benchmark of a :class:`TcpServer`. ``clients`` connections, each with its own device from
+    ``factory``, send ``command`` ``commands`` times each, waiting for each response before sending
+    the next command, while the server runs in a background thread.
+
+    Args:
+        factory (callable): Function returning a new device.
+        command (bytes): The command to send, including its terminator.
+        clients (int, optional): Number of concurrent connections. Defaults to 100
+        commands (int, optional): Number of commands sent by each connection. Defaults to 100
+        host (str, optional): Interface to serve on. Defaults to "127.0.0.1"
+
+    Returns:
+        dict: ``{"clients": int, "commands": int, "seconds": float, "commands_per_second": float}``
+    """
+    response_size = sum(len(chunk) for chunk in respond(factory(), command))
+    if not response_size:
+        raise ValueError("The device doesn't respond to %r" % command)
+
+    server = TcpServer(host=host, backlog=max(128, clients))
+    address = server.add_factory(factory)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.1})
+    thread.daemon = True
+    thread.start()
+    selector = selectors.DefaultSelector()
+    socks = []
+    try:
+        for _ in range(clients):
+            sock = socket.create_connection(address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            socks.append(sock)
+        remaining = {sock: commands for sock in socks}
+        received = {sock: 0 for sock in socks}
+        total = clients * commands
+        done = 0
+        start = timer()
+        for sock in socks:
+            sock.sendall(command)
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ)
+        while done < total:
+            ready = selector.select(5)
+            if not ready:
+                raise RuntimeError("Timed out with %s of %s commands answered" % (done, total))
+            for key, _ in ready:
+                sock = key.fileobj
+                data = sock.recv(65536)
+                if not data:
+                    raise RuntimeError("Server closed the connection")
+                received[sock] += len(data)
+                while received[sock] >= response_size:
+                    received[sock] -= response_size
+                    remaining[sock] -= 1
+                    done += 1
+                    if remaining[sock]:
+                        sock.sendall(command)
+        seconds = timer() - start
+    finally:
+        selector.close()
+        for sock in socks:
+            sock.close()
+        server.stop()
+        thread.join()
+        server.close()
+
+    return {"clients": clients, "commands": total, "seconds": seconds, "commands_per_second": total / seconds}
+
+
+__doc__ = """
+Serve :class:`~granola.breakfast_cereal.Cereal` devices over TCP to pyserial ``socket://`` clients in other
+processes. Also available from the command line, along with a loopback benchmark::
+
+    python -m granola tcp config.json cereal --count 4 --port 7000
+    python -m granola bench-tcp config.json cereal --command "get -sn\\r" --clients 200
+"""
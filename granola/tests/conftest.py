@@ -1,5 +1,6 @@
 import functools
 import os
+from timeit import default_timer as timer
 
 import pytest
 
@@ -42,6 +43,21 @@ def query_device(bk_cereal, cmd, write_terminator="\r"):
     return bk_cereal.read(1000)
 
 
+def query_server(server, write, read, data, size, timeout=5):
+    """Write ``data`` and serve until ``size`` bytes come back, failing after ``timeout`` seconds.
+
+    ``read`` is called with the number of bytes still missing and must not block.
+    """
+    write(data)
+    response = b""
+    deadline = timer() + timeout
+    while len(response) < size:
+        assert timer() < deadline, "got {!r} of {} bytes before the deadline".format(response, size)
+        server.serve_once(timeout=0.1)
+        response += read(size - len(response))
+    return response
+
+
 def decode_response(response, bk_cereal):
     return response.decode(bk_cereal._encoding)
 
@@ -4,6 +4,7 @@ from builtins import bytes
 from datetime import datetime
 
 from granola import SerialSniffer
+from granola.serial_sniffer import SniffRecorder
 from granola.utils import (
     IS_PYTHON3,
     check_min_package_version,
@@ -290,3 +291,26 @@ def test_reads_writes_length_of_terminator_still_behave(mock_read, mock_write, s
     result = load_serial_df(sniff_sniff.outpath)
     assert result["cmd"].iloc[0] == decode_bytes(input)
     assert result["response"].iloc[0] == decode_bytes(output)
+
+
+def test_recorders_kept_open_record_the_same_rows(tmp_path, mock_read, mock_write, sniff_sniff):
+    # Given a serial sniffer, and a recorder that keeps its file open
+    recorder = SniffRecorder(str(tmp_path / "recorded.csv"), keep_open=True)
+
+    # When the same commands and responses go through both, in pieces, with unpaired responses
+    for data, is_write in [(b"sh", True), (b"ow\rignored", True), (b"Cereal\r>", False), (b"unpaired\r>", False)]:
+        if is_write:
+            mock_write.return_value = len(data)
+            sniff_sniff.write(data)
+            recorder.wrote(data)
+        else:
+            mock_read.return_value = data
+            sniff_sniff.read()
+            recorder.read(data)
+
+    # Then they record the same rows, without the recorder being closed first
+    recorded = load_serial_df(recorder.outpath)
+    sniffed = load_serial_df(sniff_sniff.outpath)
+    assert list(recorded["cmd"]) == list(sniffed["cmd"]) == ["show\r"]
+    assert list(recorded["response"]) == list(sniffed["response"]) == ["Cereal\r>"]
+    recorder.close()
@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+from granola import Cereal
+from granola.tests.conftest import CONFIG_PATH
+from granola.utils import load_serial_df
+
+pty_server = pytest.importorskip("granola.pty_server")
+sniffing_proxy = pytest.importorskip("granola.sniffing_proxy")
+
+
+def _query(servers, application, data, size):
+    os.write(application, data)
+    response = b""
+    deadline = time.time() + 5
+    while len(response) < size and time.time() < deadline:
+        for server in servers:
+            server.serve_once(timeout=0.01)
+        try:
+            response += os.read(application, size - len(response))
+        except BlockingIOError:
+            pass
+    return response
+
+
+def test_proxy_forwards_between_an_application_and_a_port_and_records_the_traffic(tmp_path):
+    # Given a device on a port, and a proxy in front of it
+    outfile = str(tmp_path / "sniffed.csv")
+    with pty_server.PtyServer() as server:
+        port = server.add(Cereal.mock_from_json("cereal", config_path=CONFIG_PATH))
+        proxy = sniffing_proxy.SniffingProxy(port, outfile=outfile, baudrate=115200)
+        application = os.open(proxy.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+
+        # When the application talks to the proxy's pseudo terminal
+        responses = [
+            _query([proxy, server], application, b"set -sn 1234\r", 4),
+            _query([proxy, server], application, b"get -sn\r", 6),
+        ]
+        proxy.close()
+        os.close(application)
+
+    # Then the traffic goes through, and is recorded like a SerialSniffer would
+    assert responses == [b"OK\r>", b"1234\r>"]
+    df = load_serial_df(outfile)
+    assert list(df.columns) == ["cmd", "response", "delay(ms)"]
+    assert df[["cmd", "response"]].values.tolist() == [["set -sn 1234\r", "OK\r>"], ["get -sn\r", "1234\r>"]]
+    assert (df["delay(ms)"] >= 0).all()
+
+
+def test_proxy_records_each_command_written_at_once_to_a_stand_in_cereal(tmp_path):
+    # Given a proxy in front of a Cereal standing in for the device
+    outfile = str(tmp_path / "sniffed.csv")
+    proxy = sniffing_proxy.SniffingProxy(Cereal.mock_from_json("cereal", config_path=CONFIG_PATH), outfile=outfile)
+    application = os.open(proxy.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+
+    # When the application writes several commands at once
+    response = _query([proxy], application, b"get -sn\rget ver\r", 11)
+    proxy.close()
+    os.close(application)
+
+    # Then each command gets, and is recorded with, its own response
+    assert response == b"42\r>0.0.0\r>"
+    assert load_serial_df(outfile)[["cmd", "response"]].values.tolist() == [
+        ["get -sn\r", "42\r>"],
+        ["get ver\r", "0.0.0\r>"],
+    ]
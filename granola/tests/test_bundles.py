@@ -0,0 +1,140 @@
+import json
+import pickle
+
+import pytest
+
+from granola import CannedQueries, Cereal
+from granola.__main__ import main
+from granola.bundles import (
+    _MAGIC,
+    _PREAMBLE,
+    BUNDLE_VERSION,
+    BundleCommandTable,
+    compile_bundle,
+    write_bundle,
+)
+from granola.command_table import CommandTable
+from granola.tests.conftest import CONFIG_PATH, query_device
+
+
+def test_devices_from_bundles_give_the_same_responses(tmp_path):
+    # Given a device configuration compiled into a bundle
+    bundle = compile_bundle("cereal", config_path=CONFIG_PATH, output_path=str(tmp_path / "cereal.granola"))
+
+    # When we make the device from the bundle, and from its configuration
+    from_bundle = Cereal.mock_from_bundle(bundle)("COM1")
+    from_json = Cereal.mock_from_json("cereal", config_path=CONFIG_PATH)("COM1")
+
+    # Then they give the same responses, from canned queries and getters and setters
+    for cmd in ["show", "get -volt", "get -volt", "get -volt", "set -sn 43", "get -sn"]:
+        assert query_device(from_bundle, cmd) == query_device(from_json, cmd)
+    assert isinstance(from_bundle._readers_["CannedQueries"].serial_table, BundleCommandTable)
+
+
+def test_bundles_keep_each_type_of_column(tmp_path):
+    # Given canned queries with text, numeric and mixed columns
+    table = CommandTable.from_records(
+        [
+            {"cmd": "get -sn\r", "response": "42\r>", "weight": 2, "note": "first"},
+            {"cmd": "get -temp\r", "response": "20\r>", "weight": 0.5, "note": 3},
+            {"cmd": "get -sn\r", "response": "43\r>"},
+        ]
+    )
+
+    # When they are written to a bundle
+    path = write_bundle(str(tmp_path / "cmds.granola"), table)
+    bundle = BundleCommandTable(path)
+
+    # Then every value is read back, grouped by command
+    assert list(bundle.index()["get -sn\r"]) == ["42\r>", "43\r>"]
+    assert list(bundle.index("weight")["get -temp\r"]) == [0.5]
+    assert bundle.header["columns"]["weight"]["type"] == "float"
+    assert list(bundle.columns["note"])[:2] == ["first", 3]
+
+    # and when the bundle is pickled and loaded, it is mapped again
+    loaded = pickle.loads(pickle.dumps(bundle))
+    assert list(loaded.index()["get -sn\r"]) == ["42\r>", "43\r>"]
+
+
+def test_bundles_take_extra_fields_without_reading_their_rows(tmp_path):
+    # Given a bundle of canned queries, some with a delay
+    table = CommandTable.from_records(
+        [
+            {"cmd": "get -sn\r", "response": "42\r>", "delay(ms)": 1.0},
+            {"cmd": "get -temp\r", "response": "20\r>"},
+            {"cmd": "get -sn\r", "response": "43\r>"},
+        ]
+    )
+    bundle = BundleCommandTable(write_bundle(str(tmp_path / "cmds.granola"), table))
+
+    # When extra fields are added, one for every row, and one with a value per row
+    bundle.add_fields(note=["a", "b", "c"], **{"delay(ms)": 5})
+
+    # Then missing values are filled in, and each row gets its own value
+    assert list(bundle.index("delay(ms)")["get -sn\r"]) == [1.0, 5]
+    assert list(bundle.index("note")["get -sn\r"]) == ["a", "c"]
+    # and they are kept when the bundle is pickled and loaded
+    loaded = pickle.loads(pickle.dumps(bundle))
+    assert list(loaded.index("note")["get -temp\r"]) == ["b"]
+    assert list(loaded.columns["delay(ms)"]) == [1.0, 5, 5]
+
+
+def test_bundles_store_their_patterns(tmp_path, monkeypatch):
+    # Given a configuration with regex, glob and template commands, compiled into a bundle
+    config = {
+        "cereal": {
+            "command_readers": {
+                "CannedQueries": {
+                    "data": [
+                        {
+                            "set time \\d+\r": {"response": "OK\r>", "match": "regex"},
+                            "get -*\r": {"response": "Unknown setting\r>", "match": "glob"},
+                            "echo {{ text }}\r": {"response": "{{ text }}\r>", "match": "template"},
+                        }
+                    ]
+                }
+            }
+        }
+    }
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config))
+    bundle = compile_bundle("cereal", config_path=str(config_path))
+
+    # When the device is made from the bundle, without scanning its match column
+    def index_patterns_of_tables(indexes):
+        raise AssertionError("the match column was scanned")
+
+    monkeypatch.setattr(CannedQueries, "_index_patterns_of_tables", staticmethod(index_patterns_of_tables))
+    device = Cereal.mock_from_bundle(bundle)("COM1")
+
+    # Then the patterns stored in the bundle still match
+    assert query_device(device, "set time 1697000000") == b"OK\r>"
+    assert query_device(device, "get -anything") == b"Unknown setting\r>"
+    assert query_device(device, "echo hi") == b"hi\r>"
+
+
+def test_only_bundles_from_this_version_or_older_are_read(tmp_path):
+    # Given a file that isn't a bundle, and a bundle from a newer version
+    not_bundle = tmp_path / "cmds.granola"
+    not_bundle.write_text("cmd,response\n")
+    newer = tmp_path / "newer.granola"
+    newer.write_bytes(_PREAMBLE.pack(_MAGIC, BUNDLE_VERSION + 1, 0, 2) + b"{}")
+
+    # When / Then they are read, they are refused
+    with pytest.raises(ValueError, match="not a GRANOLA bundle"):
+        BundleCommandTable(str(not_bundle))
+    with pytest.raises(ValueError, match="version %s bundle" % (BUNDLE_VERSION + 1)):
+        BundleCommandTable(str(newer))
+
+
+def test_compile_from_the_command_line(tmp_path, capsys):
+    # Given a JSON configuration
+
+    # When its devices are compiled from the command line
+    main(["compile", CONFIG_PATH, "cereal", "--outdir", str(tmp_path)])
+
+    # Then a bundle is written for each
+    assert capsys.readouterr().out.strip() == str(tmp_path / "cereal.granola")
+    assert (
+        query_device(Cereal.mock_from_bundle(str(tmp_path / "cereal.granola"))("COM1"), "show") == b"Cereal 0.0.0 42\r>"
+    )
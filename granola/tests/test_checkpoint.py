@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from granola import ApproachHook, Fleet, VirtualClock
+from granola.checkpoint import _HEADER, MAGIC, VERSION, CheckpointError
+from granola.tests.conftest import CONFIG_PATH, query_device
+
+EVENTS = []
+
+
+def record_event(name):
+    EVENTS.append(name)
+
+
+@pytest.fixture
+def fleet():
+    clock = VirtualClock()
+    return Fleet.mock_from_json(
+        "cereal",
+        config_path=CONFIG_PATH,
+        count=3,
+        clock=clock,
+        hooks=[ApproachHook(attributes={"temp"}, include_or_exclude="include", transition_asc_scaling=10)],
+    )
+
+
+def test_resumed_fleet_continues_where_the_checkpoint_left_off(fleet, tmp_path):
+    # Given a fleet that has been used for a while
+    query_device(fleet[0], "set -sn 1234")
+    query_device(fleet[1], "set -temp 30")
+    first_volt = query_device(fleet[2], "get -volt")
+    fleet.clock.advance(50)
+    fleet.clock.call_later(10, record_event, "later")
+
+    # When we checkpoint it and resume it
+    path = fleet.checkpoint(str(tmp_path / "fleet.ckpt"))
+    resumed = Fleet.resume(path)
+
+    # Then the attribute values, transitions and canned query positions pick up where they left off
+    assert query_device(resumed[0], "get -sn") == b"1234\r>"
+    assert query_device(resumed[1], "get -temp") == query_device(fleet[1], "get -temp")
+    assert query_device(resumed[2], "get -volt") == query_device(fleet[2], "get -volt") != first_volt
+    # and the virtual clock and its pending events are restored
+    assert resumed.clock() == 50
+    del EVENTS[:]
+    resumed.clock.advance(10)
+    assert EVENTS == ["later"]
+
+
+def test_resumed_transitions_stay_bound_to_the_resumed_devices(fleet, tmp_path):
+    # Given a fleet with a transition started
+    query_device(fleet[1], "set -temp 30")
+
+    # When we resume it from a checkpoint and let the transition finish
+    resumed = Fleet.resume(fleet.checkpoint(str(tmp_path / "fleet.ckpt"), compress=False))
+    resumed.clock.advance(1000)
+
+    # Then the fleet wide values and the device's own response agree
+    assert resumed.approach_values("temp").tolist() == [20.0, 30.0, 20.0]
+    assert query_device(resumed[1], "get -temp") == b"30.0\r>"
+
+
+def test_truncated_checkpoint_raises(fleet, tmp_path):
+    # Given a checkpoint that was cut off part way through
+    path = fleet.checkpoint(str(tmp_path / "fleet.ckpt"))
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[: len(data) // 2])
+
+    # Then resuming it raises
+    with pytest.raises(CheckpointError):
+        Fleet.resume(path)
+    # and no temporary file is left behind by saving
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_checkpoints_from_other_versions_are_refused(fleet, tmp_path):
+    # Given checkpoints with the format version of an older and a newer GRANOLA
+    path = fleet.checkpoint(str(tmp_path / "fleet.ckpt"))
+    with open(path, "rb") as f:
+        data = f.read()
+    for version in (VERSION - 1, VERSION + 1):
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, version, 1) + data[_HEADER.size :])
+
+        # Then resuming them raises
+        with pytest.raises(CheckpointError, match="checkpoint version %s" % version):
+            Fleet.resume(path)
@@ -0,0 +1,180 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from granola import CannedQueries
+from granola.command_table import (
+    INDEX_SUFFIX,
+    ChainedCommandTable,
+    CommandTable,
+    MappedCommandTable,
+)
+from granola.tests.conftest import CONFIG_PATH
+from granola.utils import load_serial_df
+
+DATA_DIR = os.path.join(os.path.dirname(CONFIG_PATH), "data")
+
+
+def test_command_table_reads_csvs_the_same_as_pandas(tmp_path):
+    # Given a CSV file with escape characters, extra columns and missing values
+    path = tmp_path / "cmds.csv"
+    path.write_text(
+        "cmd,response,delay,note\nget -sn\\r, 42\\r>,1,fast\nget -volt\\r, 7800\\r>,2.5,\nreset\\r,,,slow\n"
+    )
+
+    # When we read it with and without pandas
+    table = CommandTable.read_csv(str(path))
+
+    # Then they are the same
+    pd.testing.assert_frame_equal(table.to_dataframe(), load_serial_df(str(path)))
+
+
+def test_canned_queries_are_the_same_with_either_backend():
+    # Given canned queries from files and dictionaries, with extra fields
+    data = [
+        os.path.join(DATA_DIR, "cereal_cmds.csv"),
+        {"get -temp\r": {"response": ["20\r>", "22\r>"], "delay": [7, 6]}, "get -sn\r": "42\r>"},
+    ]
+
+    # When we load them with and without pandas
+    tables = CannedQueries(data=data, delay=2, backend="csv")
+    dataframes = CannedQueries(data=data, delay=2, backend="pandas")
+
+    # Then they have the same serial commands
+    assert isinstance(tables.serial_table, CommandTable)
+    assert isinstance(dataframes.serial_table, pd.DataFrame)
+    pd.testing.assert_frame_equal(
+        tables.serial_df.reset_index(drop=True), dataframes.serial_df.reset_index(drop=True), check_dtype=False
+    )
+    # and give the same responses
+    for cmd in ["get -volt\r", "get -temp\r", "get -sn\r"]:
+        assert [tables.get_reading(cmd) for _ in range(3)] == [dataframes.get_reading(cmd) for _ in range(3)]
+
+
+def test_canned_queries_without_pandas_dont_import_it():
+    # Given a device with canned queries from files and dictionaries
+    script = (
+        "import sys\n"
+        "from granola import Cereal\n"
+        "from granola.tests.conftest import CONFIG_PATH, query_device\n"
+        "cereal = Cereal.mock_from_json('cereal', config_path=CONFIG_PATH)('COM1')\n"
+        "assert query_device(cereal, 'show') == b'Cereal 0.0.0 42\\r>'\n"
+        "print('pandas' in sys.modules)\n"
+    )
+
+    # When we use it in a new process
+    output = subprocess.check_output([sys.executable, "-c", script])
+
+    # Then pandas is never imported
+    assert output.strip() == b"False"
+
+
+def _capture(tmp_path, lines, name="capture.csv"):
+    path = tmp_path / name
+    path.write_text("".join(line + "\r\n" for line in ["cmd,response,delay(ms)"] + lines))
+    return str(path)
+
+
+def test_mapped_canned_queries_are_the_same_as_read_ones(tmp_path):
+    # Given a capture with quoted fields, alongside canned queries from a dictionary
+    path = _capture(
+        tmp_path,
+        ["get -sn\\r,42\\r>,1.5", '"say ""hi"", twice\\r","hi, hi\\r>",2', "get -sn\\r,43\\r>,1.5", "", "reset\\r,,3"],
+    )
+    data = [path, {"get -sn\r": "44\r>", "get -temp\r": "20\r>"}]
+
+    # When we load them memory mapped, and read
+    mapped = CannedQueries(data=data, backend="mmap")
+    read = CannedQueries(data=data, backend="csv")
+
+    # Then they have the same serial commands
+    pd.testing.assert_frame_equal(mapped.serial_df, read.serial_df)
+    # and give the same responses
+    for cmd in ["get -sn\r", 'say "hi", twice\r', "reset\r", "get -temp\r"]:
+        assert [mapped.get_reading(cmd) for _ in range(3)] == [read.get_reading(cmd) for _ in range(3)]
+
+
+def test_mapped_command_tables_save_their_index_until_the_file_changes(tmp_path, monkeypatch):
+    # Given a capture that has been opened once
+    path = _capture(tmp_path, ["get -sn\\r,42\\r>,1"])
+    MappedCommandTable(path)
+
+    # When it is opened again
+    def build_index(self):
+        raise AssertionError("the file was scanned again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(MappedCommandTable, "_build_index", build_index)
+        table = MappedCommandTable(path)
+
+    # Then the saved index is used
+    assert list(table.index()["get -sn\r"]) == ["42\r>"]
+
+    # And when the file changes
+    path = _capture(tmp_path, ["get -sn\\r,42\\r>,1", "get -sn\\r,43\\r>,1"])
+    os.utime(path, (0, 0))
+    table = MappedCommandTable(path)
+
+    # Then the index is rebuilt
+    assert list(table.index()["get -sn\r"]) == ["42\r>", "43\r>"]
+
+
+_unpickled = []
+
+
+class _Unpickled(object):
+    def __reduce__(self):
+        return (_unpickled.append, (True,))
+
+
+def test_saved_indexes_are_never_unpickled(tmp_path):
+    # Given a capture, with a pickle where its saved index would be
+    path = _capture(tmp_path, ["get -sn\\r,42\\r>,1"])
+    with open(path + INDEX_SUFFIX, "wb") as f:
+        pickle.dump({"stamp": _Unpickled()}, f)
+
+    # When it is opened
+    table = MappedCommandTable(path)
+
+    # Then the pickle isn't loaded, and the index is rebuilt and saved without pickling
+    assert not _unpickled
+    assert list(table.index()["get -sn\r"]) == ["42\r>"]
+    with open(path + INDEX_SUFFIX, "rb") as f:
+        assert f.read(1) == b"{"
+    assert list(MappedCommandTable(path).index()["get -sn\r"]) == ["42\r>"]
+
+
+def test_mapped_canned_queries_can_be_pickled(tmp_path):
+    # Given memory mapped canned queries, part way through a command's responses
+    path = _capture(tmp_path, ["get -sn\\r,42\\r>,1", "get -sn\\r,43\\r>,1"])
+    canned_queries = CannedQueries(data=[path], backend="mmap", delay=2)
+    canned_queries.get_reading("get -sn\r")
+
+    # When they are pickled and loaded
+    loaded = pickle.loads(pickle.dumps(canned_queries))
+
+    # Then they pick up where they left off
+    assert loaded.get_reading("get -sn\r") == "43\r>"
+    assert list(loaded.serial_df["delay"]) == [2, 2]
+
+
+def test_extra_fields_with_a_value_per_row_are_split_between_chained_tables(tmp_path):
+    # Given a memory mapped capture chained with canned queries that are read
+    mapped = MappedCommandTable(_capture(tmp_path, ["get -sn\\r,42\\r>,1", "reset\\r,,"]))
+    table = ChainedCommandTable([mapped, CommandTable.from_records([{"cmd": "get -sn\r", "response": "43\r>"}])])
+
+    # When extra fields are added, one with a value per row
+    table.add_fields(note=["a", "b", "c"], **{"delay(ms)": 5})
+
+    # Then each table gets its own rows' values, and existing values are kept
+    assert list(table.index("note")["get -sn\r"]) == ["a", "c"]
+    assert list(table.columns["delay(ms)"]) == [1, 5, 5]
+    # while the memory mapped capture stays lazy
+    assert isinstance(table.tables[0], MappedCommandTable)
+    # and the values must line up with the rows
+    with pytest.raises(ValueError, match="does not match number of rows"):
+        table.add_fields(note=["a"])
@@ -0,0 +1,132 @@
+import pickle
+import timeit
+
+from granola import CannedQueries, Cereal
+from granola.command_trie import CommandTrie
+from granola.tests.conftest import query_device
+
+
+def test_arguments_are_as_long_as_they_can_be_and_characters_win_over_arguments():
+    # Given commands with arguments, and a command without that they also match
+    trie = CommandTrie()
+    trie.add("set sn and temp {{ sn }} {{ temp }}\r", "both")
+    trie.add("set -sn {{sn}}\r", "sn")
+    trie.add("set -sn default\r", "default")
+    trie.add("set -sn {{ other }}\r", "ignored")
+
+    # When we match serial commands against them
+    # Then arguments are as long as they can be, like the setter regular expressions they replace
+    assert trie.match("set sn and temp a b c\r") == ("both", {"sn": "a b", "temp": "c"})
+    # and the command without arguments wins, then the one added first
+    assert trie.match("set -sn default\r") == ("default", {})
+    assert trie.match("set -sn 42\r") == ("sn", {"sn": "42"})
+    assert trie.match("set -sn \r") == ("sn", {"sn": ""})
+    # and the whole serial command must match
+    assert trie.match("set -sn 42\r extra") is None
+    assert trie.match("set -s") is None
+
+
+def test_finding_a_command_doesnt_depend_on_how_many_there_are():
+    # Given a few commands with arguments, and many of them
+    few, many = CommandTrie(), CommandTrie()
+    for trie, count in [(few, 10), (many, 10000)]:
+        for i in range(count):
+            trie.add("set -opt%s {{ value }}\r" % i, i)
+
+    # When we find one of them
+    def time(trie):
+        return min(timeit.repeat(lambda: trie.match("set -opt7 12.5\r"), number=1000, repeat=5))
+
+    # Then it takes about as long
+    assert few.match("set -opt7 12.5\r") == many.match("set -opt7 12.5\r") == (7, {"value": "12.5"})
+    assert time(many) < 5 * time(few)
+
+    # and the trie can be pickled
+    assert pickle.loads(pickle.dumps(many)).match("set -opt9999 1\r") == (9999, {"value": "1"})
+
+
+def test_commands_that_almost_match_take_polynomial_time():
+    # Given a command with several arguments, separated by a character that a serial command has many of
+    trie = CommandTrie()
+    trie.add("a{{ x }} {{ y }} {{ z }} q\r", "matched")
+
+    # When we match serial commands that can be split between the arguments in many ways, but don't match
+    def time(length):
+        return min(timeit.repeat(lambda: trie.match("a" + " " * length + "\r"), number=1, repeat=3))
+
+    # Then they don't match, without trying every way of splitting them
+    assert trie.match("a" + " " * 400 + "\r") is None
+    assert time(400) < 0.5
+    # and ones that do match still find the longest arguments
+    assert trie.match("a b c d q\r") == ("matched", {"x": " b", "y": "c", "z": "d"})
+
+
+def test_getters_can_have_arguments():
+    # Given getters with arguments, and setters
+    command_readers = {
+        "GettersAndSetters": {
+            "default_values": {"volt": "5"},
+            "getters": [
+                {"cmd": "get -volt\r", "response": "{{ volt }}\r>"},
+                {"cmd": "get -volt -ch {{ ch }}\r", "response": "ch{{ ch }} {{ volt|float * ch|int }}\r>"},
+            ],
+            "setters": [{"cmd": "set -volt {{ volt }}\r", "response": "OK\r>"}],
+        }
+    }
+    mock = Cereal(command_readers=command_readers)()
+
+    # When we use them
+    # Then the arguments are used in the responses
+    assert query_device(mock, "get -volt -ch 3") == b"ch3 15.0\r>"
+    assert query_device(mock, "set -volt 2") == b"OK\r>"
+    assert query_device(mock, "get -volt -ch 3") == b"ch3 6.0\r>"
+    assert query_device(mock, "get -volt") == b"2\r>"
+
+
+def test_canned_queries_can_have_arguments():
+    # Given canned queries with arguments, instead of a row for each value
+    canned_queries = CannedQueries(
+        data=[
+            {
+                "set -ch {{ ch }} -volt {{ volt }}\r": {
+                    "response": ["ch{{ ch }}={{volt}}\r>", "ch{{ ch }} busy\r>"],
+                    "match": "template",
+                },
+                "set -ch 0 -volt 1\r": "ERROR\r>",
+            }
+        ]
+    )
+    canned_queries.assign_default_hook()
+
+    # When we send commands with different arguments
+    responses = [canned_queries.get_reading(cmd) for cmd in ["set -ch 1 -volt 3.3\r"] * 3 + ["set -ch 2 -volt 5\r"]]
+
+    # Then the arguments are substituted into the responses, which loop as usual
+    assert responses == ["ch1=3.3\r>", "ch1 busy\r>", "ch1=3.3\r>", "ch2 busy\r>"]
+    assert canned_queries.get_reading("set -ch 0 -volt 1\r") == "ERROR\r>"
+
+
+def test_commands_matching_patterns_dont_each_keep_a_cursor():
+    # Given canned queries with a template and a regular expression
+    canned_queries = CannedQueries(
+        data=[
+            {
+                "set -ch {{ ch }}\r": {"response": "ch{{ ch }}\r>", "match": "template"},
+                r"get -ch \d+\r": {"response": ["1\r>", "2\r>"], "match": "regex"},
+                "get -sn\r": "42\r>",
+            }
+        ]
+    )
+    canned_queries.assign_default_hook()
+
+    # When many different serial commands match them
+    for i in range(1000):
+        assert canned_queries.get_reading("set -ch %s\r" % i) == "ch%s\r>" % i
+        canned_queries.get_reading("get -ch %s\r" % i)
+    canned_queries.get_reading("get -sn\r")
+
+    # Then only the commands with canned queries of their own keep a cursor, and the patterns share theirs
+    assert list(canned_queries.serial_generator) == ["get -sn\r"]
+    assert len(canned_queries._pattern_cursors) == 2
+    # which loops as usual
+    assert [canned_queries.get_reading("get -ch 7\r") for _ in range(3)] == ["1\r>", "2\r>", "1\r>"]
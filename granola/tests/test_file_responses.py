@@ -0,0 +1,83 @@
+import os
+import pickle
+
+import pytest
+
+from granola import Cereal
+from granola.file_responses import FileResponse, ResponseStream
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / "memory.bin"
+    path.write_bytes(bytes(bytearray(range(256))) * 4096)  # 1 MiB
+    return path
+
+
+@pytest.fixture
+def cereal(tmp_path, dump):
+    csv = tmp_path / "cmds.csv"
+    csv.write_text(
+        "cmd,response,response_file\n"
+        "dump\\r,,memory.bin\n"
+        "dump\\r,,memory.bin?offset=256&length=4\n"
+        "dump\\r,done\\r>,\n"
+        "get -sn\\r,42\\r>,\n"
+    )
+    return Cereal({"CannedQueries": {"data": ["cmds.csv"]}}, data_path_root=str(tmp_path / "config.json"))
+
+
+def test_file_responses_are_streamed_from_their_files(cereal, dump):
+    # Given canned queries with responses from a file
+
+    # When the command is sent, and its response read in chunks
+    cereal.write(b"dump\r")
+    waiting = cereal.in_waiting
+    chunks = []
+    while cereal.in_waiting:
+        chunks.append(cereal.read(64 * 1024))
+
+    # Then the whole file is read, straight from the file
+    assert waiting == os.path.getsize(str(dump))
+    assert b"".join(chunks) == dump.read_bytes()
+    assert len(chunks) == 16
+
+    # and the following responses are the range of bytes, and then the canned query
+    cereal.write(b"dump\r")
+    assert cereal.read(cereal.in_waiting) == b"\x00\x01\x02\x03"
+    cereal.write(b"dump\r")
+    assert cereal.read(cereal.in_waiting) == b"done\r>"
+
+
+def test_file_responses_not_read_are_replaced_by_the_next_response(cereal):
+    # Given a file response that is only partly read
+    cereal.write(b"dump\r")
+    stream = cereal._next_read
+    cereal.read(10)
+
+    # When another command is sent
+    cereal.write(b"get -sn\r")
+
+    # Then the rest of the file isn't read, and it is no longer mapped
+    assert cereal.read(cereal.in_waiting) == b"42\r>"
+    with pytest.raises(ValueError):
+        stream.read(1)
+
+
+def test_streams_can_be_pickled_part_way_through(dump):
+    # Given a stream that is part way through a file
+    stream = FileResponse(str(dump), offset=10).open()
+    stream.read(100)
+
+    # When it is pickled and loaded
+    loaded = pickle.loads(pickle.dumps(stream))
+
+    # Then it carries on where it was
+    assert isinstance(loaded, ResponseStream)
+    assert len(loaded) == len(stream)
+    assert loaded.read(5) == dump.read_bytes()[110:115]
+
+
+def test_response_files_must_only_have_a_range():
+    with pytest.raises(ValueError, match="Unknown option 'start'"):
+        FileResponse.from_spec("/dumps/memory.bin?start=3")
@@ -0,0 +1,57 @@
+import numpy as np
+from numpy.testing import assert_almost_equal
+
+from granola import ApproachHook, Cereal, Fleet, TransitionEngine, VirtualClock
+from granola.tests.conftest import CONFIG_PATH, query_device
+
+
+def test_vectorised_transition_values_match_scalar_values():
+    # Given an engine with many transitions at different points in their transition
+    clock = VirtualClock(100.0)
+    engine = TransitionEngine(capacity=2, clock=clock)
+    for i in range(50):
+        engine.start(i, "temp", start_value=i, end_value=2 * i + 10, transition_time=i % 7, set_time=90.0 + i / 10.0)
+
+    # When we evaluate them all at once
+    values = engine.values()
+
+    # Then they match evaluating them one at a time
+    assert_almost_equal(values, [engine.value(i, "temp") for i in range(50)])
+
+
+def test_fleet_approach_values_should_track_every_devices_transition():
+    # Given a fleet of devices with the approach hook on temp
+    clock = VirtualClock(0.0)
+    fleet = Fleet(
+        (
+            Cereal.mock_from_json(
+                "cereal",
+                config_path=CONFIG_PATH,
+                hooks=[ApproachHook(attributes={"temp"}, include_or_exclude="include")],
+            )
+            for _ in range(4)
+        ),
+        clock=clock,
+    )
+
+    # When we set the temperature on some devices higher and some lower
+    query_device(fleet[0], "set -temp 25")
+    query_device(fleet[1], "set -temp 15")
+    clock.advance_to(1e6)
+    values = fleet.approach_values("temp")
+
+    # Then both transitions finish, and untouched devices keep their value
+    assert_almost_equal(values, [25, 15, 20, 20])
+    # and the devices respond with the same value as the fleet
+    assert float(query_device(fleet[1], "get -temp")[:-2]) == values[1]
+
+
+def test_fleet_approach_values_is_nan_for_non_numeric_attributes():
+    # Given a fleet of devices
+    fleet = Fleet.mock_from_json("cereal", config_path=CONFIG_PATH, count=2)
+
+    # When we ask for an attribute that isn't numeric
+    values = fleet.approach_values("devtype")
+
+    # Then we get nan back
+    assert np.isnan(values).all()
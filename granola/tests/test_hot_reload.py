@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+
+import pytest
+
+from granola import Cereal
+from granola.hot_reload import FileWatcher
+from granola.tests.conftest import query_device
+
+
+def _write(path, text, mtime):
+    path.write_text(text)
+    os.utime(str(path), (mtime, mtime))  # file systems may not see writes within the same tick
+
+
+def _write_config(path, data, sn="42", mtime=1):
+    config = {
+        "cereal": {
+            "command_readers": {
+                "GettersAndSetters": {
+                    "default_values": {"sn": sn, "volts": "2000"},
+                    "getters": [{"cmd": "get -sn\r", "response": "{{ sn }}\r>"}],
+                    "setters": [{"cmd": "set -volt {{ volts }}\r", "response": "OK\r>"}],
+                },
+                "CannedQueries": {"data": data},
+            }
+        }
+    }
+    _write(path, json.dumps(config), mtime)
+
+
+@pytest.fixture
+def device(tmp_path):
+    _write(tmp_path / "temps.csv", "cmd,response\nget -temp\\r,20\\r>\nget -temp\\r,21\\r>\n", 1)
+    _write(tmp_path / "volts.csv", "cmd,response\nget -volt\\r,1\\r>\nget -volt\\r,2\\r>\nget -volt\\r,3\\r>\n", 1)
+    config_path = tmp_path / "config.json"
+    _write_config(config_path, ["temps.csv", "volts.csv"])
+    return Cereal.mock_from_json("cereal", config_path=str(config_path))
+
+
+def test_changed_canned_query_files_are_reloaded(tmp_path, device):
+    # Given a watched device, part way through the responses of two commands
+    watcher = FileWatcher(device)
+    assert query_device(device, "get -temp") == b"20\r>"
+    assert query_device(device, "get -volt") == b"1\r>"
+
+    # When one of its files changes
+    _write(tmp_path / "temps.csv", "cmd,response\nget -temp\\r,30\\r>\n", 2)
+    changed = watcher.check()
+
+    # Then only that file is reloaded, and its commands start from their new first response
+    assert changed == [str(tmp_path / "temps.csv")]
+    assert query_device(device, "get -temp") == b"30\r>"
+    # while the other commands carry on where they were
+    assert query_device(device, "get -volt") == b"2\r>"
+    # and checking again, with nothing changed, reloads nothing
+    assert watcher.check() == []
+
+
+def test_changed_configuration_is_reloaded(tmp_path, device):
+    # Given a watched device, with an attribute that has been set
+    watcher = FileWatcher(device)
+    assert query_device(device, "set -volt 12") == b"OK\r>"
+    assert query_device(device, "get -volt") == b"1\r>"
+
+    # When its configuration changes a default value, and adds a canned query file
+    _write(tmp_path / "sn.csv", "cmd,response\nget -id\\r,7\\r>\n", 1)
+    _write_config(tmp_path / "config.json", ["temps.csv", "volts.csv", "sn.csv"], sn="43", mtime=2)
+    watcher.check()
+
+    # Then the new configuration is used
+    assert query_device(device, "get -sn") == b"43\r>"
+    assert query_device(device, "get -id") == b"7\r>"
+    # while attributes and cursors that didn't change are kept
+    assert device._readers_["GettersAndSetters"].instrument_attributes["volts"].value == "12"
+    assert query_device(device, "get -volt") == b"2\r>"
+    # and the new file is watched
+    assert str(tmp_path / "sn.csv") in watcher.files()
+
+
+def test_files_that_cannot_be_read_are_reloaded_once_fixed(tmp_path, device):
+    # Given a watched device
+    watcher = FileWatcher(device)
+
+    # When a file is changed into one that can't be read
+    _write(tmp_path / "temps.csv", "response\n20\\r>\n", 2)
+    watcher.check()
+
+    # Then the device keeps its canned queries
+    assert query_device(device, "get -temp") == b"20\r>"
+
+    # until the file is fixed
+    _write(tmp_path / "temps.csv", "cmd,response\nget -temp\\r,30\\r>\n", 3)
+    watcher.check()
+    assert query_device(device, "get -temp") == b"30\r>"
+
+
+def test_reloads_wait_for_writes_from_other_threads(tmp_path, device):
+    # Given a watched device, with a changed file, that another thread is writing to
+    watcher = FileWatcher(device)
+    _write(tmp_path / "temps.csv", "cmd,response\nget -temp\\r,30\\r>\n", 2)
+    reloaded = threading.Event()
+    with device._lock_:
+        # When the watcher checks the files from its own thread
+        thread = threading.Thread(target=lambda: watcher.check() and reloaded.set())
+        thread.start()
+
+        # Then it waits for the write to finish before reloading
+        assert not reloaded.wait(0.1)
+        assert query_device(device, "get -temp") == b"20\r>"
+    thread.join()
+    assert reloaded.is_set()
+    assert query_device(device, "get -temp") == b"30\r>"
+
+
+def test_reload_config_needs_a_json_configuration():
+    with pytest.raises(ValueError, match="JSON configuration"):
+        Cereal().reload_config()
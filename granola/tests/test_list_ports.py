@@ -0,0 +1,57 @@
+import serial
+import serial.tools.list_ports
+
+from granola import Cereal, PortRegistry
+from granola.tests.conftest import CONFIG_PATH, query_device
+
+
+def test_registry_enumerates_ports_with_metadata_from_attributes_without_constructing_them():
+    # Given a registry with many ports from the same configuration, each with its own serial number
+    registry = PortRegistry(metadata_attributes={"serial_number": "sn", "product": "devtype"})
+    for i in range(1000):
+        registry.register("COM%s" % i, config_key="cereal", config_path=CONFIG_PATH, default_values={"sn": str(i)})
+
+    # When we enumerate them through pyserial
+    with registry.patch():
+        ports = serial.tools.list_ports.comports()
+
+    # Then every port is listed with its metadata, but no devices are built
+    assert [port.device for port in ports[:3]] == ["COM0", "COM1", "COM2"]
+    assert ports[7].serial_number == "7"
+    assert ports[7].description == "Cereal"
+    assert registry.opened == []
+
+
+def test_registry_opens_only_the_ports_used_and_passes_other_ports_through():
+    # Given a registry with a lazily built port and an already built device
+    registry = PortRegistry()
+    registry.register("COM1", config_key="cereal", config_path=CONFIG_PATH, default_values={"sn": "1234"})
+    registry.register("COM2", device=Cereal.mock_from_json("cereal", config_path=CONFIG_PATH), vid=0x0403, pid=0x6001)
+
+    # When the code opens a port through pyserial
+    with registry.patch():
+        ser = serial.Serial("COM1", baudrate=9600, timeout=1)
+        real = serial.Serial()
+
+    # Then it talks to the mocked device, initialized with the pyserial arguments
+    assert query_device(ser, "get -sn") == b"1234\r>"
+    assert ser.baudrate == 9600
+    assert registry.opened == ["COM1", "COM2"]
+    assert registry.comports()[1].hwid == "USB VID:PID=0403:6001 SER=42"
+    # and unregistered ports go to the real Serial
+    assert not isinstance(real, Cereal)
+    # and the patch is removed afterwards
+    assert serial.tools.list_ports.comports is not registry.comports
+
+
+def test_registry_parses_vid_and_pid_given_as_text():
+    # Given ports registered with vid and pid as byte and unicode text, as read from a json config
+    registry = PortRegistry()
+    registry.register("COM1", config_key="cereal", config_path=CONFIG_PATH, vid="0x0403", pid="0x6001")
+    registry.register("COM2", config_key="cereal", config_path=CONFIG_PATH, vid="0x0403", pid="0x6001")
+
+    # When they are enumerated
+    ports = registry.comports()
+
+    # Then both are listed with numeric ids
+    assert [(port.vid, port.pid) for port in ports] == [(0x0403, 0x6001)] * 2
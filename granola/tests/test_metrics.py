@@ -0,0 +1,59 @@
+import json
+
+from granola import Fleet
+from granola.tests.conftest import CONFIG_PATH, query_device
+
+
+def test_fleet_metrics_count_commands_bytes_and_unsupported_per_device():
+    # Given a fleet of devices
+    fleet = Fleet.mock_from_json("cereal", config_path=CONFIG_PATH, count=3)
+
+    # When we query one device a lot, and another a little
+    for _ in range(5):
+        query_device(fleet[2], "get -sn")
+    query_device(fleet[0], "not a command")
+
+    # Then the counters reflect it
+    metrics = fleet.metrics
+    assert metrics.commands[:3].tolist() == [1, 0, 5]
+    assert metrics.unsupported[:3].tolist() == [1, 0, 0]
+    assert metrics.bytes_in[2] == 5 * len(b"get -sn\r")
+    assert metrics.bytes_out[2] == 5 * len(b"42\r>")
+    assert metrics.hottest(2) == [2, 0]
+    assert metrics.command_totals()[0] == ("get -sn\r", {"count": 5, "seconds": metrics.command_time[2, 0].item()})
+
+
+def test_fleet_metrics_snapshots_export_without_resetting():
+    # Given a fleet that has processed some commands
+    fleet = Fleet.mock_from_json("cereal", config_path=CONFIG_PATH, count=2)
+    query_device(fleet[1], "get -sn")
+
+    # When we export snapshots
+    snapshot = json.loads(fleet.metrics.to_json())
+    df = fleet.metrics.to_dataframe()
+    query_device(fleet[1], "get -sn")
+
+    # Then they hold the counts at the time of the snapshot and the simulation keeps counting
+    assert snapshot["devices"]["commands"] == [0, 1]
+    assert snapshot["commands"]["get -sn\r"]["count"] == [0, 1]
+    assert snapshot["totals"]["commands"] == 1
+    assert df["commands"].tolist() == [0, 1]
+    assert fleet.metrics.totals()["commands"] == 2
+    assert snapshot["devices"]["hook_seconds"][1] > 0
+
+
+def test_fleet_metrics_only_count_so_many_commands_on_their_own():
+    # Given a fleet that counts two commands on their own
+    fleet = Fleet.mock_from_json("cereal", config_path=CONFIG_PATH, count=1)
+    fleet.metrics.max_commands = 2
+
+    # When it gets many different unsupported commands, and more supported commands than that
+    for i in range(100):
+        query_device(fleet[0], "not a command %s" % i)
+    for cmd in ["get -sn", "show", "get -volt", "get -volt"]:
+        query_device(fleet[0], cmd)
+
+    # Then the unsupported commands share a column, and the rest of the commands share another
+    totals = dict((cmd, stats["count"]) for cmd, stats in fleet.metrics.command_totals())
+    assert totals == {"<unsupported>": 100, "get -sn\r": 1, "<other>": 3}
+    assert fleet.metrics.unsupported[0] == 100
@@ -0,0 +1,57 @@
+import os
+import select
+
+import pytest
+
+from granola import Cereal
+from granola.__main__ import build_parser
+from granola.tests.conftest import CONFIG_PATH, query_server
+
+pty_server = pytest.importorskip("granola.pty_server")
+
+
+def _query(server, client, data, size):
+    def read(count):
+        return os.read(client, count) if select.select([client], [], [], 0)[0] else b""
+
+    return query_server(server, lambda data: os.write(client, data), read, data, size)
+
+
+def test_pty_server_serves_many_devices_from_one_loop():
+    # Given a server with several devices from the same config
+    with pty_server.PtyServer() as server:
+        paths = [server.add(Cereal.mock_from_json("cereal", config_path=CONFIG_PATH)) for _ in range(3)]
+        clients = [os.open(path, os.O_RDWR | os.O_NOCTTY) for path in paths]
+        server.device(paths[1]).write(b"set -sn 1234\r")
+
+        # When each device is queried through its pseudo terminal
+        responses = [_query(server, client, b"get -sn\r", size) for client, size in zip(clients, (4, 6, 4))]
+
+        # Then each answers as its own device
+        assert len(set(paths)) == 3
+        assert responses == [b"42\r>", b"1234\r>", b"42\r>"]
+        for client in clients:
+            os.close(client)
+
+
+def test_pty_server_answers_every_command_in_a_single_write():
+    # Given a device served on a pseudo terminal
+    with pty_server.PtyServer() as server:
+        path = server.add(Cereal.mock_from_json("cereal", config_path=CONFIG_PATH))
+        client = os.open(path, os.O_RDWR | os.O_NOCTTY)
+
+        # When several commands arrive before the server gets to them
+        response = _query(server, client, b"get -sn\rget -sn\r", 8)
+
+        # Then every command is answered, not just the last
+        assert response == b"42\r>42\r>"
+        os.close(client)
+
+
+def test_cli_parses_pty_command():
+    # When the pty command line is parsed
+    args = build_parser().parse_args(["pty", "config.json", "cereal", "--count", "4"])
+
+    # Then it serves the requested devices
+    assert args.func.__name__ == "pty"
+    assert (args.config_path, args.config_key, args.count) == ("config.json", "cereal", 4)
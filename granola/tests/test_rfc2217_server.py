@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+import serial
+
+from granola import Cereal, Rfc2217Server
+from granola.tests.conftest import CONFIG_PATH
+
+
+@pytest.fixture
+def server():
+    server = Rfc2217Server()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.02})
+    thread.start()
+    yield server
+    server.stop()
+    thread.join()
+    server.close()
+
+
+def _wait_for(condition, timeout=2):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_rfc2217_client_settings_are_applied_to_the_device(server):
+    # Given a device served over RFC 2217
+    device = Cereal.mock_from_json("cereal", config_path=CONFIG_PATH)
+    client = serial.serial_for_url(server.url(server.add(device)), timeout=1)
+
+    # When the client changes the port settings and control lines
+    client.baudrate = 115200
+    client.parity = serial.PARITY_EVEN
+    client.stopbits = serial.STOPBITS_TWO
+    client.dtr = False
+    client.break_condition = True
+
+    # Then they are applied to the device, which still answers commands
+    client.write(b"get -sn\r")
+    assert client.read(4) == b"42\r>"
+    assert (device.baudrate, device.parity, device.stopbits) == (115200, serial.PARITY_EVEN, serial.STOPBITS_TWO)
+    assert device.dtr is False
+    assert device.break_condition is True
+    client.close()
+
+
+def test_rfc2217_device_modem_lines_are_sent_to_every_session(server):
+    # Given a device shared by several sessions
+    device = Cereal.mock_from_json("cereal", config_path=CONFIG_PATH)
+    address = server.add(device)
+    clients = [serial.serial_for_url(server.url(address), timeout=1) for _ in range(3)]
+    assert all(client.cts and not client.ri for client in clients)
+
+    # When the device changes its modem lines
+    device.cts = False
+    device.ri = True
+
+    # Then every client is notified
+    assert _wait_for(lambda: all(not client.cts and client.ri for client in clients))
+    for client in clients:
+        client.close()
+
+
+def test_cereal_modem_lines_need_an_open_port():
+    # Given a closed device
+    device = Cereal.mock_from_json("cereal", config_path=CONFIG_PATH)
+    device.cd = False
+    device.close()
+
+    # Then its modem lines can't be read
+    with pytest.raises(serial.PortNotOpenError):
+        device.cd
+    device.open()
+    assert device.cd is False
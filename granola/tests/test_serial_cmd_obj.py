@@ -1,6 +1,9 @@
-import pandas as pd
+from timeit import default_timer as timer
 
-from granola import CannedQueries, Cereal, RandomizeResponse
+import numpy as np
+
+from granola import CannedQueries, Cereal, RandomizeResponse, ScaledClock, VirtualClock
+from granola.command_readers import _alias_table
 from granola.tests.conftest import (
     CONFIG_PATH,
     all_equal,
@@ -142,15 +145,16 @@ def test_that_that_all_off_the_ways_to_specify_canned_queries_inside_dicts_can_g
 
 
 def test_random_responses():
-    # When we have a dataframe and and randomized response enum
-    df = pd.DataFrame(data=dict(cmd=[1, 2, 3], response=[1, 2, 3]))
+    # When we have responses and and randomized response enum
+    responses = np.array([1, 2, 3])
     will_randomize_responses = RandomizeResponse.randomized_w_replacement.name
 
     # When we randomize our response 100 times
     # (we choose 100, just to be pretty sure that it will give us difference respones, even if luck isn't on our side)
     randomized_responses = []
     for _ in range(100):
-        randomized_responses.append(next(CannedQueries._get_generator_from_df(df.copy(), will_randomize_responses)))
+        cursor = CannedQueries._get_cursor(responses, will_randomize_responses)
+        randomized_responses.append(next(cursor))
 
     # instead of always getting the 1st response, we should get others as well
     assert len(set(randomized_responses)) != 1
@@ -158,8 +162,8 @@ def test_random_responses():
 
 def test_random_responses_with_removal():
 
-    # When we have a dataframe and and randomized response enum
-    df = pd.DataFrame(data=dict(cmd=[1, 2, 3], response=[1, 2, 3]))
+    # When we have responses and and randomized response enum
+    canned = np.array([1, 2, 3])
     will_randomize_responses = RandomizeResponse.randomize_and_remove.name
 
     # When we randomize our response 100 times
@@ -167,8 +171,8 @@ def test_random_responses_with_removal():
     randomized_responses = []
     for _ in range(100):
         responses = []
-        for _ in range(len(df)):
-            responses.append(next(CannedQueries._get_generator_from_df(df.copy(), will_randomize_responses)))
+        for _ in range(len(canned)):
+            responses.append(next(CannedQueries._get_cursor(canned, will_randomize_responses)))
         randomized_responses.append(responses)
 
     # instead of always getting the 1st response, we should get others as well
@@ -195,3 +199,349 @@ def test_pass_in_randomize_response_in_canned_queries():
 
     # Then the order the 3 respones is not the same accross all 100 tries
     assert not all_equal(randomized_responses)
+
+
+def test_canned_queries_index_responses_of_each_command_in_order():
+    # Given canned queries with the responses of a command interleaved with other commands
+    canned_queries = CannedQueries(data=[{"1\r": ["1a", "1b"], "2\r": "2a"}, {"1\r": "1c"}])
+
+    # When we look at the index built when they were loaded
+    index = canned_queries._responses_by_cmd
+
+    # Then each command has all of its responses, in order
+    assert list(index["1\r"]) == ["1a", "1b", "1c"]
+    assert list(index["2\r"]) == ["2a"]
+
+
+def test_looping_canned_queries_restart_from_the_index():
+    # Given a device with a command with two responses
+    mock = Cereal(command_readers={"CannedQueries": {"data": [{"1\r": ["1a", "1b"], "2\r": "2a"}]}})()
+    # whose DataFrame is no longer searched once the canned queries are loaded
+    canned_queries = mock._readers_["CannedQueries"]
+    canned_queries.serial_df = None
+
+    # When we query past the end of the responses
+    responses = [query_device(mock, "1") for _ in range(5)]
+
+    # Then they loop back to the start
+    assert responses == [b"1a", b"1b", b"1a", b"1b", b"1a"]
+
+
+def test_canned_query_cursor_positions_can_be_inspected_and_set():
+    # Given a device with a command with three responses
+    mock = Cereal(command_readers={"CannedQueries": {"data": [{"1\r": ["1a", "1b", "1c"]}]}})()
+    canned_queries = mock._readers_["CannedQueries"]
+
+    # When we query it once
+    query_device(mock, "1")
+    cursor = canned_queries.serial_generator["1\r"]
+
+    # Then its cursor has moved past the first response
+    assert cursor.position == 1
+
+    # And when we move the cursor to the last response
+    cursor.position = 2
+
+    # Then the last response is next, before looping back to the start
+    assert query_device(mock, "1") == b"1c"
+    assert query_device(mock, "1") == b"1a"
+
+
+def test_randomize_and_remove_gives_every_response_once_per_loop():
+    # Given a command with responses from two sources, so their DataFrame labels repeat
+    command_readers = {
+        "CannedQueries": {
+            "data": [{"1\r": ["1a", "1b", "1c"]}, {"1\r": ["1d", "1e"]}],
+            "will_randomize_responses": "randomize_and_remove",
+        }
+    }
+    mock = Cereal(command_readers=command_readers)()
+
+    # When we query it through two full loops
+    responses = [query_device(mock, "1") for _ in range(10)]
+
+    # Then each loop gives every response exactly once
+    expected = [b"1a", b"1b", b"1c", b"1d", b"1e"]
+    assert sorted(responses[:5]) == expected
+    assert sorted(responses[5:]) == expected
+
+
+def test_seeded_canned_queries_randomize_responses_the_same_way_every_time():
+    # Given devices with the same seed, for each kind of randomized responses
+    for will_randomize_responses in ["randomized_w_replacement", "randomize_and_remove"]:
+        command_readers = {
+            "CannedQueries": {
+                "data": [{"1\r": ["1a", "1b", "1c", "1d"]}],
+                "will_randomize_responses": will_randomize_responses,
+                "seed": 7,
+            }
+        }
+
+        # When we query each of them
+        runs = []
+        for _ in range(3):
+            mock = Cereal(command_readers=command_readers)()
+            runs.append([query_device(mock, "1") for _ in range(20)])
+
+        # Then they give the same responses in the same order
+        assert all_equal(runs)
+        assert len(set(runs[0])) != 1
+
+
+def test_alias_table_picks_each_index_in_proportion_to_its_weight():
+    # Given some weights
+    weights = [5, 0, 1, 2, 0.5, 1.5]
+
+    # When we make an alias table from them
+    probability, alias = _alias_table(weights)
+
+    # Then the chance of ending up at each index is its share of the total weight
+    chances = np.zeros(len(weights))
+    for i in range(len(weights)):
+        chances[i] += probability[i] / len(weights)
+        chances[alias[i]] += (1 - probability[i]) / len(weights)
+    assert np.allclose(chances, np.array(weights) / sum(weights))
+
+
+def test_weighted_canned_queries_pick_responses_in_proportion_to_their_weight():
+    # Given a command with weighted responses, one of which is never picked
+    command_readers = {
+        "CannedQueries": {
+            "data": [{"1\r": {"response": ["OK", "ERROR", "RETRY"], "weight": [9, 1, 0]}}],
+            "will_randomize_responses": "randomized_w_replacement",
+            "seed": 0,
+        }
+    }
+    mock = Cereal(command_readers=command_readers)()
+
+    # When we query it many times
+    responses = [query_device(mock, "1") for _ in range(2000)]
+
+    # Then the responses are picked as often as their weights say
+    assert 0.85 < responses.count(b"OK") / 2000.0 < 0.95
+    assert responses.count(b"OK") + responses.count(b"ERROR") == 2000
+
+
+def test_pattern_commands_match_commands_without_their_own_canned_queries():
+    # Given regex and glob commands, one of which also matches a command with its own canned queries
+    command_readers = {
+        "CannedQueries": {
+            "data": [
+                {
+                    "set time 0\r": "epoch\r>",
+                    "set time \\d+\r": {"response": ["OK\r>", "OK again\r>"], "match": "regex"},
+                    "get -*\r": {"response": "any\r>", "match": "glob"},
+                    "set *\r": {"response": "set\r>", "match": "glob"},
+                }
+            ]
+        }
+    }
+    mock = Cereal(command_readers=command_readers)()
+
+    # When we send commands matching them
+    responses = [query_device(mock, cmd) for cmd in ["set time 1697000000", "set time 1697000001", "set time 0"]]
+
+    # Then commands with their own canned queries still get them, and the rest share the first matching pattern's
+    assert responses == [b"OK\r>", b"OK again\r>", b"epoch\r>"]
+    assert query_device(mock, "get -sn") == b"any\r>"
+    assert query_device(mock, "set time now") == b"set\r>"
+    assert query_device(mock, "unknown") == b"Unsupported\r>"
+    # and the patterns themselves aren't commands
+    assert mock._readers_["CannedQueries"].get_reading("set time \\d+\r") == "set\r>"
+
+
+def test_pattern_commands_that_cant_be_combined_are_tried_one_by_one():
+    # Given patterns with the same group names, and a back reference
+    canned_queries = CannedQueries(
+        data=[
+            {
+                "set (?P<value>\\d+)\r": {"response": "number\r>", "match": "regex"},
+                "set (?P<value>\\w+)\r": {"response": "word\r>", "match": "regex"},
+                "(\\w)\\1\r": {"response": "double\r>", "match": "regex"},
+            }
+        ]
+    )
+
+    # When we match commands against them
+    matcher = canned_queries._pattern_matcher
+
+    # Then the first matching pattern is used
+    assert matcher._combined is None
+    assert [canned_queries.get_reading(cmd) for cmd in ["set 1\r", "set a\r", "aa\r", "ab\r"]] == [
+        "number\r>",
+        "word\r>",
+        "double\r>",
+        None,
+    ]
+
+
+def test_responses_can_be_added_while_running():
+    # Given canned queries, part way through a command's responses
+    canned_queries = CannedQueries(data=[{"get -sn\r": ["42\r>", "43\r>"], "get -temp\r": "20\r>"}])
+    assert canned_queries.get_reading("get -sn\r") == "42\r>"
+
+    # When responses are added to it, and a new command is added
+    canned_queries.add_responses("get -sn\r", ["44\r>"])
+    canned_queries.add_responses("get -volt\r", ["1\r>"])
+
+    # Then the command carries on into its new responses
+    assert [canned_queries.get_reading("get -sn\r") for _ in range(2)] == ["43\r>", "44\r>"]
+    assert canned_queries.get_reading("get -volt\r") == "1\r>"
+    # and the other commands are unchanged
+    assert canned_queries.get_reading("get -temp\r") == "20\r>"
+
+
+def test_responses_can_be_replaced_and_removed_while_running():
+    # Given canned queries with a pattern, part way through a command's responses
+    canned_queries = CannedQueries(
+        data=[
+            {
+                "get -sn\r": ["42\r>", "43\r>"],
+                "get *\r": {"response": "any\r>", "match": "glob"},
+            }
+        ]
+    )
+    assert canned_queries.get_reading("get -sn\r") == "42\r>"
+    assert canned_queries.get_reading("get -id\r") == "any\r>"
+
+    # When a command's responses are replaced, the pattern's are replaced, and another command is removed
+    canned_queries.replace_responses("get -id\r", ["7\r>"])
+    canned_queries.replace_responses("get *\r", ["other\r>"] * 2)
+    canned_queries.remove_responses("get -sn\r")
+
+    # Then the replaced commands start again from their new responses
+    assert canned_queries.get_reading("get -id\r") == "7\r>"
+    assert canned_queries.get_reading("get -temp\r") == "other\r>"
+    # and the removed command is matched by the pattern, like any other command without canned queries
+    assert canned_queries.get_reading("get -sn\r") == "other\r>"
+
+    # and removing the pattern leaves commands without canned queries unanswered
+    canned_queries.remove_responses("get *\r")
+    assert canned_queries.get_reading("get -temp\r") is None
+
+
+def test_responses_changed_while_running_are_kept_when_reloaded(tmp_path):
+    # Given canned queries from a file, with a command's responses replaced
+    path = tmp_path / "cmds.csv"
+    path.write_text("cmd,response,weight\nget -sn\\r,42\\r>,1\nget -temp\\r,20\\r>,\n")
+    canned_queries = CannedQueries(data=[str(path)])
+    canned_queries.replace_responses("get -sn\r", ["43\r>"], weights=[2])
+    canned_queries.add_responses("get -temp\r", ["21\r>"])
+
+    # When the file is reloaded
+    path.write_text("cmd,response,weight\nget -sn\\r,44\\r>,1\nget -temp\\r,22\\r>,3\n")
+    canned_queries.reload()
+
+    # Then the changes are still applied
+    assert canned_queries.get_reading("get -sn\r") == "43\r>"
+    assert [canned_queries.get_reading("get -temp\r") for _ in range(2)] == ["22\r>", "21\r>"]
+    assert canned_queries._weights_by_cmd["get -temp\r"].tolist() == [3, 1]
+
+
+def test_randomized_cursors_carry_on_into_added_responses():
+    # Given randomized canned queries, part way through a loop
+    canned_queries = CannedQueries(
+        data=[{"get -sn\r": ["1", "2", "3"]}], randomize_responses=RandomizeResponse.randomize_and_remove.name, seed=0
+    )
+    first = canned_queries.get_reading("get -sn\r")
+
+    # When responses are added
+    canned_queries.add_responses("get -sn\r", ["4", "5"])
+
+    # Then the rest of the loop gives every other response once
+    rest = [canned_queries.get_reading("get -sn\r") for _ in range(4)]
+    assert sorted([first] + rest) == ["1", "2", "3", "4", "5"]
+
+
+def _capture_with_delays(tmp_path):
+    path = tmp_path / "capture.csv"
+    path.write_text("cmd,response,delay(ms)\nget -sn\\r,42\\r>,500\nget -temp\\r,20\\r>,\n")
+    return str(path)
+
+
+def test_delayed_responses_are_held_back_on_a_virtual_clock(tmp_path):
+    # Given a capture with a delay on one command, replayed on a virtual clock
+    clock = VirtualClock()
+    mock = Cereal({"CannedQueries": {"data": [_capture_with_delays(tmp_path)]}}, clock=clock)
+
+    # When the delayed command is sent
+    mock.write(b"get -sn\r")
+
+    # Then nothing can be read until the delay has passed on the clock
+    assert mock.in_waiting == 0 and mock.read(10) == b""
+    clock.advance(0.499)
+    assert mock.in_waiting == 0
+    clock.advance(0.001)
+    assert mock.read(mock.in_waiting) == b"42\r>"
+    # and commands without a delay answer straight away
+    mock.write(b"get -temp\r")
+    assert mock.read(mock.in_waiting) == b"20\r>"
+
+
+def test_delayed_responses_wait_for_the_timeout_on_a_scaled_clock(tmp_path):
+    # Given a capture with a delay, replayed 10 times as fast as real time, with a timeout longer than the delay
+    mock = Cereal({"CannedQueries": {"data": [_capture_with_delays(tmp_path)]}}, clock=ScaledClock(10))
+    mock(timeout=1)
+
+    # When the delayed command is sent and read
+    mock.write(b"get -sn\r")
+    start = timer()
+    read = mock.read(4)
+
+    # Then the read waits for the delay, a tenth as long in real time
+    assert read == b"42\r>"
+    assert 0.04 <= timer() - start < 0.5
+
+
+def test_delays_from_the_configuration_and_without_a_clock(tmp_path):
+    # Given a delay for every canned query in the configuration
+    command_readers = {"CannedQueries": {"data": [{"get -sn\r": "42\r>"}], "delay(ms)": 100}}
+    clock = VirtualClock()
+    delayed = Cereal(command_readers, clock=clock)
+    # and the same canned queries without a clock
+    instant = Cereal(command_readers)
+
+    # When the command is sent to both
+    delayed.write(b"get -sn\r")
+    instant.write(b"get -sn\r")
+
+    # Then only the device with a clock holds it back
+    assert delayed.in_waiting == 0
+    assert instant.read(instant.in_waiting) == b"42\r>"
+    clock.advance(0.1)
+    assert delayed.read(delayed.in_waiting) == b"42\r>"
+
+
+def test_delayed_template_responses_keep_their_delay():
+    # Given a delayed canned query with arguments, on a virtual clock
+    response = {"response": "ch{{ ch }}=5\r>", "match": "template"}
+    command_readers = {"CannedQueries": {"data": [{"get -ch {{ ch }}\r": response}], "delay(ms)": 100}}
+    clock = VirtualClock()
+    mock = Cereal(command_readers, clock=clock)
+
+    # When the command is sent
+    mock.write(b"get -ch 2\r")
+
+    # Then the response, with the argument in it, is held back for the delay
+    assert mock.in_waiting == 0
+    clock.advance(0.1)
+    assert mock.read(mock.in_waiting) == b"ch2=5\r>"
+
+
+def test_responses_can_be_added_many_times_to_lazy_tables(tmp_path):
+    # Given memory mapped canned queries, part way through a command's responses
+    path = tmp_path / "cmds.csv"
+    path.write_text("cmd,response\nget\\r,a\nget\\r,b\n")
+    canned_queries = CannedQueries(data=[str(path)], backend="mmap")
+    assert canned_queries.get_reading("get\r") == "a"
+
+    # When responses are added one at a time, many times, and the file is reloaded part way through
+    for i in range(1000):
+        canned_queries.add_responses("get\r", [str(i)])
+        if i == 500:
+            canned_queries.reload()
+    canned_queries.add_responses("get\r", ["last"])
+
+    # Then every response is given once, in order
+    responses = [canned_queries.get_reading("get\r") for _ in range(1003)]
+    assert responses == ["a", "b"] + [str(i) for i in range(1000)] + ["last"]
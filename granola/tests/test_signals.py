@@ -0,0 +1,94 @@
+import json
+
+import numpy as np
+from numpy.testing import assert_almost_equal
+
+from granola import Cereal, DiurnalSignal, Fleet, RandomWalk, RecordedSeries, VirtualClock
+from granola.tests.conftest import query_device
+
+
+class CountingSignal(DiurnalSignal):
+    calls = 0
+
+    def values(self, now, size):
+        CountingSignal.calls += 1
+        return super(CountingSignal, self).values(now, size)
+
+
+COMMAND_READERS = {
+    "GettersAndSetters": {
+        "default_values": {"sn": "42"},
+        "getters": [{"cmd": "get temp\r", "response": "{{ '%.3f'|format(signals.outdoor_temp) }}\r>"}],
+    }
+}
+
+
+def test_fleet_devices_see_the_same_signal_plus_their_own_noise():
+    # Given a fleet sharing an outdoor temperature with a little per device noise
+    clock = VirtualClock(0.0)
+    signal = DiurnalSignal(mean=20, amplitude=5, noise=0.01, seed=1)
+    fleet = Fleet([Cereal(COMMAND_READERS) for _ in range(100)], clock=clock, signals={"outdoor_temp": signal})
+
+    # When every device is queried for the temperature
+    temps = np.array([float(query_device(device, "get temp")[:-2]) for device in fleet])
+
+    # Then they are all close to the shared curve, but not identical
+    assert_almost_equal(temps.mean(), 25, decimal=2)
+    assert len(set(temps)) > 1
+
+
+def test_signals_are_computed_once_per_tick_for_the_whole_fleet():
+    # Given a fleet with a signal that counts how often it is computed
+    clock = VirtualClock(0.5)
+    CountingSignal.calls = 0
+    fleet = Fleet(
+        [Cereal(COMMAND_READERS) for _ in range(50)], clock=clock, signals={"outdoor_temp": CountingSignal(20, 5)}
+    )
+
+    # When every device reads the signal during the same tick, and then again in the next tick
+    for device in fleet:
+        query_device(device, "get temp")
+    clock.advance_to(1.5)
+    for device in fleet:
+        query_device(device, "get temp")
+
+    # Then it was only computed once per tick
+    assert CountingSignal.calls == 2
+
+
+def test_recorded_series_interpolates_and_loops():
+    # Given a recorded series
+    series = RecordedSeries(times=[0, 10, 20], values=[0, 10, 0])
+
+    # Then it interpolates between the points, and loops after the end
+    assert series.shared_value(5) == 5
+    assert series.shared_value(25) == 5
+
+
+def test_random_walk_is_reproducible_with_a_seed_and_stays_in_bounds():
+    # Given two random walks with the same seed
+    walks = [RandomWalk(start=0, step=1, minimum=-2, maximum=2, seed=3) for _ in range(2)]
+
+    # When we walk them both
+    steps = [[walk.shared_value(t) for t in range(100)] for walk in walks]
+
+    # Then they walk the same way, and never leave their bounds
+    assert steps[0] == steps[1]
+    assert max(steps[0]) <= 2 and min(steps[0]) >= -2
+
+
+def test_fleets_from_json_read_signal_files_relative_to_the_configuration(tmp_path):
+    # Given a configuration next to a recorded series
+    (tmp_path / "config.json").write_text(json.dumps({"cereal": {"command_readers": COMMAND_READERS}}))
+    (tmp_path / "series.csv").write_text("time,value\n0,10\n10,20\n")
+
+    # When a fleet is made from it, with the series given relative to the configuration
+    fleet = Fleet.mock_from_json(
+        "cereal",
+        config_path=str(tmp_path / "config.json"),
+        clock=lambda: 5.0,
+        signals={"outdoor_temp": {"RecordedSeries": {"file": "series.csv"}}},
+    )
+
+    # Then the series is read from next to the configuration
+    assert query_device(fleet[0], "get temp") == b"15.000\r>"
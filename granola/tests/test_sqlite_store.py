@@ -0,0 +1,120 @@
+import pickle
+
+import pandas as pd
+import pytest
+
+from granola import CannedQueries
+from granola.__main__ import main
+from granola.sqlite_store import SqliteCommandTable, import_csv
+
+
+def _capture(tmp_path, name, lines):
+    path = tmp_path / name
+    path.write_text("".join(line + "\r\n" for line in ["cmd,response,delay(ms)"] + lines))
+    return str(path)
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = str(tmp_path / "library.sqlite")
+    import_csv(path, [_capture(tmp_path, "old.csv", ["get -sn\\r,42\\r>,1", "get -sn\\r,43\\r>,2"])], firmware="1.2.0")
+    import_csv(path, [_capture(tmp_path, "new.csv", ["get -sn\\r,44\\r>,1", "reset\\r,,3"])], firmware="1.3.0")
+    return path
+
+
+def test_sqlite_canned_queries_are_the_same_as_read_ones(tmp_path, library):
+    # Given captures imported into a database
+
+    # When the rows from one firmware are used as canned queries, alongside a dictionary
+    data = [library + "?firmware=1.2.0", {"get -temp\r": "20\r>"}]
+    from_sqlite = CannedQueries(data=data, delay=2)
+    read = CannedQueries(data=[str(tmp_path / "old.csv"), {"get -temp\r": "20\r>"}], delay=2)
+
+    # Then they have the same serial commands
+    pd.testing.assert_frame_equal(from_sqlite.serial_df.drop(columns="firmware"), read.serial_df)
+    # and give the same responses
+    for cmd in ["get -sn\r", "get -temp\r", "reset\r"]:
+        assert [from_sqlite.get_reading(cmd) for _ in range(3)] == [read.get_reading(cmd) for _ in range(3)]
+
+
+def test_sqlite_tables_only_use_the_selected_rows(library):
+    # Given captures from two firmware versions in one database
+
+    # When we use the rows from each, and from both
+    old = SqliteCommandTable(library, where={"firmware": "1.2.0"})
+    new = SqliteCommandTable(library, where={"firmware": "1.3.0"})
+    both = SqliteCommandTable(library)
+
+    # Then each only has its own rows
+    assert list(old.index()) == ["get -sn\r"]
+    assert list(old.index()["get -sn\r"]) == ["42\r>", "43\r>"]
+    assert list(new.index()) == ["get -sn\r", "reset\r"]
+    assert list(new.index("delay(ms)")["reset\r"]) == [3]
+    assert len(both) == 4 and list(both.index()["get -sn\r"]) == ["42\r>", "43\r>", "44\r>"]
+
+    # and selecting rows by a column the database doesn't have is refused
+    with pytest.raises(ValueError, match="no device column"):
+        SqliteCommandTable(library, where={"device": "cereal"})
+
+
+def test_sqlite_tables_take_extra_fields_with_a_value_per_row(library):
+    # Given the rows of one firmware in a database
+    table = SqliteCommandTable(library, where={"firmware": "1.3.0"})
+
+    # When extra fields are added, one with a value for each row used
+    table.add_fields(note=["first", "second"], **{"delay(ms)": 5})
+
+    # Then each row gets its own value, and values in the database are kept
+    assert list(table.index("note")["reset\r"]) == ["second"]
+    assert table.index("note")["get -sn\r"][0] == "first"
+    assert list(table.columns["note"]) == ["first", "second"]
+    assert list(table.columns["delay(ms)"]) == [1, 3]
+    # and the values must line up with the rows
+    with pytest.raises(ValueError, match="does not match number of rows"):
+        table.add_fields(note=["first"])
+
+
+def test_sqlite_canned_queries_can_be_pickled(library):
+    # Given canned queries from a database, part way through a command's responses
+    canned_queries = CannedQueries(data=[library + "?firmware=1.2.0"])
+    canned_queries.get_reading("get -sn\r")
+
+    # When they are pickled and loaded
+    loaded = pickle.loads(pickle.dumps(canned_queries))
+
+    # Then they pick up where they left off
+    assert loaded.get_reading("get -sn\r") == "43\r>"
+
+
+def test_import_from_the_command_line(tmp_path, capsys):
+    # Given a capture
+    capture = _capture(tmp_path, "capture.csv", ["get -sn\\r,42\\r>,1"])
+
+    # When it is imported from the command line
+    main(
+        ["import-sqlite", str(tmp_path / "library.db"), capture, "--field", "firmware=1.2.0", "--field", "device_id=3"]
+    )
+
+    # Then its rows can be picked by the fields
+    assert capsys.readouterr().out.strip() == "1"
+    canned_queries = CannedQueries(data=[str(tmp_path / "library.db") + "?device_id=3&firmware=1.2.0"])
+    assert canned_queries.get_reading("get -sn\r") == "42\r>"
+
+
+def test_rows_are_picked_by_their_fields_as_text(tmp_path, capsys):
+    # Given captures from firmware versions that are the same number, but not the same text
+    path = str(tmp_path / "library.sqlite")
+    import_csv(path, [_capture(tmp_path, "a.csv", ["get -sn\\r,110\\r>,1"])], firmware="1.10")
+    import_csv(path, [_capture(tmp_path, "b.csv", ["get -sn\\r,11\\r>,1"])], firmware="1.1")
+    main(["import-sqlite", path, _capture(tmp_path, "c.csv", ["get -sn\\r,7\\r>,1"]), "--field", "firmware=007"])
+    main(["import-sqlite", path, _capture(tmp_path, "d.csv", ["get -sn\\r,1\\r>,1"]), "--field", "firmware=1.100"])
+
+    # When the rows of each firmware version are picked
+    def reading(firmware):
+        return CannedQueries(data=[path + "?firmware=" + firmware]).get_reading("get -sn\r")
+
+    # Then each version only has its own rows
+    assert [reading(firmware) for firmware in ("1.10", "1.1", "007", "1.100")] == ["110\r>", "11\r>", "7\r>", "1\r>"]
+    assert len(SqliteCommandTable(path, where={"firmware": "7"})) == 0
+    # while the other columns can still be picked by their values
+    assert len(SqliteCommandTable(path, where={"delay(ms)": "1"})) == 4
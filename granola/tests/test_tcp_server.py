@@ -0,0 +1,165 @@
+import socket
+from timeit import default_timer as timer
+
+import serial
+
+from granola import Cereal, Fleet, ScaledClock, TcpServer, VirtualClock
+from granola.tcp_server import benchmark
+from granola.tests.conftest import CONFIG_PATH, query_server
+
+
+def _device():
+    return Cereal.mock_from_json("cereal", config_path=CONFIG_PATH)
+
+
+def _query(server, client, data, size):
+    return query_server(server, client.write, lambda count: client.read(min(count, client.in_waiting)), data, size)
+
+
+def test_tcp_server_serves_a_fleet_one_device_per_port_to_pyserial_clients():
+    # Given a fleet served one device per port
+    fleet = Fleet([_device() for _ in range(2)])
+    fleet[1].write(b"set -sn 1234\r")
+    with TcpServer() as server:
+        addresses = server.add_fleet(fleet)
+        clients = [serial.serial_for_url(server.url(address), timeout=1) for address in addresses]
+
+        # When each port is queried through pyserial
+        responses = [_query(server, client, b"get -sn\r", size) for client, size in zip(clients, (4, 6))]
+
+        # Then each port answers as its own device
+        assert responses == [b"42\r>", b"1234\r>"]
+        for client in clients:
+            client.close()
+
+
+def test_tcp_server_gives_each_connection_its_own_device_until_the_pool_is_empty():
+    # Given two devices served per connection on one port
+    with TcpServer() as server:
+        address = server.add_fleet([_device(), _device()], per_connection=True)
+        first, second = [serial.serial_for_url(server.url(address), timeout=1) for _ in range(2)]
+
+        # When the first connection changes its device, and a third connection is attempted
+        _query(server, first, b"set -sn 1234\r", 2)
+        third = socket.create_connection(address)
+        server.serve_once(timeout=1)
+
+        # Then the second connection has an untouched device, and the third is refused
+        assert _query(server, second, b"get -sn\r", 4) == b"42\r>"
+        assert server.connections == 2
+        third.settimeout(1)
+        assert third.recv(10) == b""
+        for client in (first, second, third):
+            client.close()
+
+
+def _delayed_device(tmp_path, clock):
+    path = tmp_path / "capture.csv"
+    path.write_text("cmd,response,delay(ms)\nget -sn\\r,42\\r>,500\nget -temp\\r,20\\r>,\n")
+    return Cereal({"CannedQueries": {"data": [str(path)]}}, clock=clock)
+
+
+def test_tcp_server_sends_delayed_responses_when_they_are_due(tmp_path):
+    # Given a device that delays a response on a virtual clock, served over TCP
+    clock = VirtualClock()
+    with TcpServer() as server:
+        (address,) = server.add_fleet([_delayed_device(tmp_path, clock)])
+        client = serial.serial_for_url(server.url(address), timeout=0)
+
+        # When the delayed command is sent, followed by another one, before the delay has passed
+        client.write(b"get -sn\rget -temp\r")
+        for _ in range(3):
+            server.serve_once(timeout=0.01)
+
+        # Then nothing is sent, and the second command waits behind the first
+        assert client.read(100) == b""
+
+        # until the clock passes the delay, when both responses are sent in order
+        clock.advance(0.5)
+        assert _query(server, client, b"", 8) == b"42\r>20\r>"
+        client.close()
+
+
+def test_tcp_server_waits_for_delayed_responses_on_a_real_time_clock(tmp_path):
+    # Given a device that delays a response on a clock 10 times as fast as real time, served over TCP
+    with TcpServer() as server:
+        (address,) = server.add_fleet([_delayed_device(tmp_path, ScaledClock(10))])
+        client = serial.serial_for_url(server.url(address), timeout=0)
+
+        # When the delayed command is sent, and the server waits without a timeout
+        client.write(b"get -sn\r")
+        server.serve_once()
+        start = timer()
+        server.serve_once()
+
+        # Then the event loop wakes up to send the response when it is due
+        assert _query(server, client, b"", 4) == b"42\r>"
+        assert timer() - start < 0.5
+        client.close()
+
+
+def test_tcp_benchmark_answers_every_command():
+    # When the loopback benchmark is run
+    result = benchmark(_device, b"get -sn\r", clients=20, commands=10)
+
+    # Then every command gets answered
+    assert result["commands"] == 200
+    assert result["commands_per_second"] > 0
+
+
+def test_long_file_responses_are_streamed_a_chunk_at_a_time(tmp_path):
+    # Given a device that responds with a large file, served with small chunks
+    dump = bytes(bytearray(range(256))) * 4096  # 1 MiB
+    (tmp_path / "memory.bin").write_bytes(dump)
+    (tmp_path / "cmds.csv").write_text("cmd,response,response_file\ndump\\r,,memory.bin\n")
+    device = Cereal({"CannedQueries": {"data": ["cmds.csv"]}}, data_path_root=str(tmp_path / "config.json"))
+    reads = []
+    read = device.read
+    device.read = lambda size=1: reads.append(size) or read(size)
+    with TcpServer(chunk_size=4096) as server:
+        client = socket.create_connection(server.add(device))
+        client.setblocking(False)
+
+        # When the file is asked for
+        client.sendall(b"dump\r")
+        response = b""
+        deadline = timer() + 10
+        while len(response) < len(dump) and timer() < deadline:
+            server.serve_once(timeout=0.1)
+            try:
+                response += client.recv(1 << 20)
+            except (BlockingIOError, InterruptedError):
+                pass
+
+        # Then all of it is sent, without reading more than a chunk of it from the device at once
+        assert response == dump
+        assert max(reads) == 4096
+        client.close()
+
+
+def test_clients_sharing_a_delayed_device_take_turns(tmp_path):
+    # Given a device that delays a response on a virtual clock, shared by two clients
+    clock = VirtualClock()
+    with TcpServer() as server:
+        address = server.add(_delayed_device(tmp_path, clock))
+        first, second = [serial.serial_for_url(server.url(address), timeout=0) for _ in range(2)]
+        for _ in range(3):
+            server.serve_once(timeout=0.01)
+
+        # When the first client's response is held back, and the second client sends a command meanwhile
+        first.write(b"get -sn\r")
+        for _ in range(3):
+            server.serve_once(timeout=0.01)
+        second.write(b"get -temp\r")
+        for _ in range(3):
+            server.serve_once(timeout=0.01)
+
+        # Then the second client waits for the first one's response
+        assert first.read(100) == b"" and second.read(100) == b""
+
+        # and once it is due, each client gets its own response
+        clock.advance(0.5)
+        assert _query(server, first, b"", 4) == b"42\r>"
+        assert _query(server, second, b"", 4) == b"20\r>"
+        first.close()
+        second.close()
@@ -0,0 +1,140 @@
+import json
+import os
+import socket
+
+import pytest
+
+from granola import Cereal, Fleet, QueueSubscriber, Transcript, UnixSocketSubscriber
+from granola.checkpoint import load_checkpoint, save_checkpoint
+from granola.hooks.base_hook import BaseHook
+from granola.tests.conftest import CONFIG_PATH, query_device
+
+
+def _device():
+    return Cereal.mock_from_json("cereal", config_path=CONFIG_PATH)
+
+
+def test_queue_subscribers_each_get_every_event_until_they_are_full():
+    # Given a device with a fast and a slow subscriber
+    device = _device()
+    fast = device.subscribe(QueueSubscriber(maxsize=10))
+    slow = device.subscribe(QueueSubscriber(maxsize=2))
+
+    # When the device processes more commands than the slow subscriber can hold
+    for cmd in ("get -sn", "set -sn 1234", "get -sn", "nonsense"):
+        query_device(device, cmd)
+
+    # Then the fast subscriber sees every command, and the slow one drops the newest
+    events = fast.drain()
+    assert [(event.command, event.response) for event in events] == [
+        ("get -sn\r", "42\r>"),
+        ("set -sn 1234\r", "OK\r>"),
+        ("get -sn\r", "1234\r>"),
+        ("nonsense\r", "ERROR\r>"),
+    ]
+    assert [event.unsupported for event in events] == [False, False, False, True]
+    assert len(slow.drain()) == 2 and slow.dropped == 2
+
+
+def test_unix_socket_subscriber_streams_json_lines_and_drops_for_slow_observers(tmp_path):
+    if not hasattr(socket, "AF_UNIX"):
+        pytest.skip("Unix sockets are not available")
+    # Given a transcript of two devices, streamed to a socket with a tiny buffer
+    path = os.path.join(str(tmp_path), "transcript.sock")
+    transcript = Transcript()
+    subscriber = transcript.subscribe(UnixSocketSubscriber(path, maxsize=3))
+    devices = [transcript.attach(_device()) for _ in range(2)]
+    observer = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    observer.connect(path)
+    observer.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+
+    # When the devices process far more than the observer reads
+    for i in range(2000):
+        query_device(devices[i % 2], "get -sn")
+    observer.settimeout(1)
+    received = b""
+    while not received.endswith(b"\n"):
+        received += observer.recv(1 << 20)
+    query_device(devices[0], "show")  # once the observer catches up, it is told what it missed
+    observer.settimeout(0.2)
+    try:
+        while True:
+            chunk = observer.recv(1 << 20)
+            if not chunk:
+                break
+            received += chunk
+    except socket.timeout:
+        pass
+
+    # Then the observer got the events as JSON lines, and a count of the dropped ones
+    lines = [json.loads(line) for line in received.splitlines()]
+    assert lines[0]["command"] == "get -sn\r" and lines[0]["response"] == "42\r>"
+    assert lines[-1]["command"] == "show\r"
+    dropped = sum(line.get("dropped", 0) for line in lines)
+    assert dropped > 0
+    assert len([line for line in lines if "command" in line]) + dropped == 2001
+    observer.close()
+    subscriber.close()
+    assert not os.path.exists(path)
+
+
+def test_subscribers_are_not_saved_with_checkpoints(tmp_path):
+    # Given a subscribed device in a fleet
+    fleet = Fleet([_device()])
+    fleet[0].subscribe(QueueSubscriber())
+
+    # When the fleet is saved and resumed
+    resumed = load_checkpoint(save_checkpoint(fleet, str(tmp_path / "fleet.ckpt")))
+
+    # Then the resumed device works, and can be subscribed to again
+    subscriber = resumed[0].subscribe(QueueSubscriber())
+    assert query_device(resumed[0], "get -sn") == b"42\r>"
+    assert subscriber.get(timeout=1).response == "42\r>"
+    assert len(resumed[0]._transcript_.subscribers) == 1
+
+
+class _Shout(BaseHook):
+    hooked_classes = [Cereal]
+
+    def post_reading(self, hooked, result, data, **kwargs):
+        return result.upper()
+
+
+def test_subscribers_see_responses_after_the_post_reading_hooks():
+    # Given a subscribed device with a hook that changes its responses after they are read
+    device = Cereal({"CannedQueries": {"data": [{"ping\r": "pong\r>"}]}})
+    device._hooks_.append(_Shout())
+    subscriber = device.subscribe(QueueSubscriber())
+
+    # When it processes commands, including several in one write
+    device.write(b"ping\r")
+    device.write(b"ping\rping\r")
+
+    # Then every event has the response the device gives
+    assert device.read(device.in_waiting) == b"PONG\r>"
+    assert [event.response for event in subscriber.drain()] == ["PONG\r>", "pong\r>", "PONG\r>"]
+
+
+def test_unsubscribing_what_is_not_subscribed_raises_value_error():
+    # Given a device without subscribers
+    device = _device()
+
+    # Then unsubscribing raises ValueError, before and after a subscriber has been added
+    with pytest.raises(ValueError, match="not subscribed"):
+        device.unsubscribe(QueueSubscriber())
+    device.unsubscribe(device.subscribe(QueueSubscriber()))
+    with pytest.raises(ValueError, match="not subscribed"):
+        device.unsubscribe(QueueSubscriber())
+
+
+def test_devices_with_subscribers_are_not_attached_to_other_transcripts():
+    # Given a device with a subscriber
+    device = _device()
+    device.subscribe(QueueSubscriber())
+
+    # Then attaching it to another transcript raises, rather than cutting off the subscriber
+    with pytest.raises(ValueError, match="already publishes"):
+        Transcript().attach(device)
+    # while a device without subscribers can be attached
+    transcript = Transcript()
+    assert transcript.attach(_device())._transcript_ is transcript
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+
+import pytest
+import serial
+
+from granola import Cereal
+from granola.tests.conftest import CONFIG_PATH, query_device
+from granola.urlhandler import protocol_granola
+
+
+@pytest.fixture
+def config_copy(tmp_path):
+    path = str(tmp_path / "config.json")
+    shutil.copy(CONFIG_PATH, path)
+    shutil.copytree(os.path.join(os.path.dirname(CONFIG_PATH), "data"), str(tmp_path / "data"))
+    protocol_granola.clear_cache()
+    yield path
+    protocol_granola.clear_cache()
+
+
+def test_granola_url_opens_independent_devices_from_a_cached_config(config_copy):
+    # Given a granola:// URL
+    url = "granola://cereal?config=%s&sn=1234" % config_copy
+
+    # When it is opened twice, and the first device is changed
+    first = serial.serial_for_url(url, baudrate=9600, timeout=1)
+    second = serial.serial_for_url(url)
+    query_device(first, "set -sn 5678")
+
+    # Then both are opened Cereals with the URL's attributes and their own state, built from one cached config
+    assert isinstance(first, Cereal) and first.is_open
+    assert first.port == url and first.baudrate == 9600
+    assert query_device(first, "get -sn") == b"5678\r>"
+    assert query_device(second, "get -sn") == b"1234\r>"
+    assert len(protocol_granola._prototypes) == 1
+
+    # and URLs with other default values use the same cached config
+    other = serial.serial_for_url("granola://cereal?config=%s&sn=42" % config_copy)
+    assert query_device(other, "get -sn") == b"42\r>"
+    assert query_device(serial.serial_for_url(url), "get -sn") == b"1234\r>"
+    assert len(protocol_granola._prototypes) == 1
+
+
+def test_granola_url_rebuilds_devices_after_the_config_changes(config_copy):
+    # Given a device already opened from a config
+    url = "granola://cereal?config=%s" % config_copy
+    serial.serial_for_url(url)
+
+    # When the config's default values change
+    with open(config_copy) as f:
+        config = json.load(f)
+    config["cereal"]["command_readers"]["GettersAndSetters"]["default_values"]["sn"] = "99"
+    with open(config_copy, "w") as f:
+        json.dump(config, f)
+    os.utime(config_copy, (0, 0))
+
+    # Then newly opened devices use the new config
+    assert query_device(serial.serial_for_url(url), "get -sn") == b"99\r>"
+
+
+def test_granola_url_rebuilds_devices_after_their_canned_queries_change(config_copy, tmp_path):
+    # Given a device already opened from a config with canned queries
+    url = "granola://cereal?config=%s" % config_copy
+    device = serial.serial_for_url(url)
+    canned_queries = device._readers_["CannedQueries"]
+    path = canned_queries.watched_files()[0]
+    cmd = list(canned_queries._responses_by_cmd)[0]
+
+    # When one of its canned query files changes
+    with open(path, "w") as f:
+        f.write("cmd,response\n%s,changed\\r>\n" % cmd.replace("\r", "\\r"))
+    os.utime(path, (0, 0))
+
+    # Then newly opened devices use the new canned queries
+    assert query_device(serial.serial_for_url(url), cmd.rstrip("\r")) == b"changed\r>"
+
+
+@pytest.mark.parametrize("url", ["granola://", "granola://cereal?logging=loud"])
+def test_granola_url_rejects_bad_urls(url):
+    with pytest.raises(ValueError):
+        serial.serial_for_url(url)
@@ -0,0 +1,226 @@
+import errno
+import json
+import logging
+import os
+import socket
+import time
+from collections import deque, namedtuple
+
+from granola.utils import IS_PYTHON3, would_block
+
+if IS_PYTHON3:
+    import queue
+else:  # pragma: no cover
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+TranscriptEvent = namedtuple("TranscriptEvent", ["time", "device", "command", "response", "unsupported"])
+TranscriptEvent.__doc__ = """A command processed by a device, and the response it produced"""
+
+
+class Transcript(object):
+    """
+    Publishes every command a :class:`~granola.breakfast_cereal.Cereal` processes, with its response, as a
+    :class:`TranscriptEvent` to any number of subscribers (anything with a ``publish(event)`` method,
+    such as :class:`QueueSubscriber` or :class:`UnixSocketSubscriber`).
+
+    Subscribers have bounded buffers and drop events when they fall behind, so watching a device never slows it
+    down. A device without subscribers doesn't publish anything.
+
+    Subscribers only watch live devices, so they aren't saved with checkpoints.
+
+    Args:
+        clock (callable, optional): Timestamps the events. Defaults to :func:`time.time`
+
+    Examples
+    --------
+    >>> from granola import Cereal
+    >>> device = Cereal({"CannedQueries": {"data": [{"ping\\r": "pong\\r>"}]}})
+    >>> subscriber = device.subscribe(QueueSubscriber(maxsize=100))
+    >>> device.write(b"ping\\r")
+    5
+    >>> event = subscriber.get()
+    >>> event.command, event.response, event.unsupported
+    ('ping\\r', 'pong\\r>', False)
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.subscribers = []
+
+    def __getstate__(self):
+        return {"clock": self.clock, "subscribers": []}
+
+    def attach(self, device):
+        """
+        Publish the commands processed by ``device``, so one transcript can watch many devices. Raises ValueError if
+        the device already publishes to another transcript with subscribers, rather than cutting them off.
+        """
+        current = device._transcript_
+        if current is not None and current is not self and current.subscribers:
+            raise ValueError("%s already publishes to a transcript with subscribers" % device)
+        device._transcript_ = self
+        return device
+
+    def subscribe(self, subscriber):
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Stop publishing to ``subscriber``. Raises ValueError if it isn't subscribed."""
+        if subscriber not in self.subscribers:
+            raise ValueError("%r is not subscribed" % (subscriber,))
+        self.subscribers.remove(subscriber)
+
+    def publish(self, device, command, response, unsupported=False):
+        if not self.subscribers:
+            return
+        event = TranscriptEvent(self.clock(), device, command, response, unsupported)
+        for subscriber in self.subscribers:
+            subscriber.publish(event)
+
+
+class QueueSubscriber(object):
+    """
+    In process subscriber, that queues events to be read with :meth:`get`, from any thread.
+
+    Args:
+        maxsize (int, optional): Maximum number of queued events. Events published while the queue is full are
+            dropped, and counted in ``dropped``. Defaults to 1000
+    """
+
+    def __init__(self, maxsize=1000):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def publish(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, block=True, timeout=None):
+        """Next :class:`TranscriptEvent`, raises :class:`queue.Empty` if there isn't one in time"""
+        return self.queue.get(block, timeout)
+
+    def drain(self):
+        """Every queued :class:`TranscriptEvent`"""
+        events = []
+        try:
+            while True:
+                events.append(self.queue.get_nowait())
+        except queue.Empty:
+            return events
+
+
+class UnixSocketSubscriber(object):
+    """
+    Streams events as JSON lines to every process connected to the Unix socket at ``path``, such as
+    ``python -m granola watch <path>`` or ``nc -U <path>``.
+
+    Nothing ever blocks the device. Connections are accepted, and queued lines sent, as events are published, and
+    events for a connection that already has ``maxsize`` lines waiting are dropped. Once it catches up, the connection
+    is sent a ``{"dropped": <count>}`` line before the next event.
+
+    Args:
+        path (str): Path of the socket, replaced if it already exists.
+        maxsize (int, optional): Maximum number of lines waiting per connection. Defaults to 1000
+    """
+
+    def __init__(self, path, maxsize=1000):
+        self.path = str(path)
+        self.maxsize = maxsize
+        try:
+            os.unlink(self.path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(16)
+        self.sock.setblocking(False)
+        self._connections = []
+
+    @property
+    def connections(self):
+        """int: number of connected observers, as of the last publish"""
+        return len(self._connections)
+
+    def publish(self, event):
+        self._accept()
+        if not self._connections:
+            return
+        line = _encode_line(
+            {
+                "time": event.time,
+                "device": str(event.device),
+                "command": event.command,
+                "response": event.response,
+                "unsupported": event.unsupported,
+            }
+        )
+        for connection in list(self._connections):
+            connection.flush()
+            if len(connection.pending) >= self.maxsize:
+                connection.dropped += 1
+            else:
+                if connection.dropped:
+                    connection.pending.append(_encode_line({"dropped": connection.dropped}))
+                    connection.dropped = 0
+                connection.pending.append(line)
+            if not connection.flush():
+                self._connections.remove(connection)
+
+    def close(self):
+        for connection in self._connections:
+            connection.sock.close()
+        self._connections = []
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except (IOError, OSError) as err:
+                if would_block(err):
+                    return
+                raise
+            sock.setblocking(False)
+            self._connections.append(_SocketConnection(sock))
+
+
+class _SocketConnection(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = deque()
+        self.dropped = 0
+
+    def flush(self):
+        """Send as much as possible without blocking, returns False if the observer has gone"""
+        try:
+            while self.pending:
+                sent = self.sock.send(self.pending[0])
+                if sent < len(self.pending[0]):
+                    self.pending[0] = self.pending[0][sent:]
+                    break
+                self.pending.popleft()
+        except (IOError, OSError) as err:  # socket.error is only an OSError from python 3
+            if not would_block(err):  # the observer went away
+                self.sock.close()
+                return False
+        return True
+
+
+def _encode_line(obj):
+    return (json.dumps(obj, default=str) + "\n").encode("utf-8")
+
+
+__doc__ = """
+Watch what mocked devices are doing while they run, without a debugger or INFO logging, by streaming their
+commands and responses to local subscribers.
+"""
@@ -0,0 +1,17 @@
+import serial
+
+PACKAGE = __name__
+
+
+def register():
+    """
+    Add GRANOLA's URL handlers to pyserial's ``protocol_handler_packages``, so :func:`serial.serial_for_url`
+    understands ``granola://`` URLs. Called when :mod:`granola` is imported, and safe to call again.
+    """
+    if PACKAGE not in serial.protocol_handler_packages:
+        serial.protocol_handler_packages.append(PACKAGE)
+
+
+__doc__ = """
+pyserial URL handlers, see :mod:`granola.urlhandler.protocol_granola`.
+"""
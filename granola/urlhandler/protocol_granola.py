@@ -0,0 +1,153 @@
+import logging
+import pickle
+from collections import OrderedDict
+
+from granola.breakfast_cereal import Cereal
+from granola.command_readers import GettersAndSetters, InstrumentAttribute
+from granola.hot_reload import _stamp
+from granola.list_ports import config_with_default_values
+from granola.utils import IS_PYTHON3, fixpath, get_path
+
+if IS_PYTHON3:
+    from urllib.parse import parse_qsl, unquote, urlsplit
+else:  # pragma: no cover
+    from urllib import unquote
+
+    from urlparse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+LOGGER_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+# (config path, config key) -> (stamp of the config and each file the device was loaded from, pickled prototype device)
+_prototypes = {}
+
+
+def serial_class_for_url(url):
+    """
+    pyserial hook for ``granola://<config_key>?config=<path>&<attribute>=<value>&...`` URLs.
+
+    The device is built from ``config_key`` in the JSON configuration at ``config`` (defaults to "config.json"),
+    with any other query parameters overriding its GettersAndSetters ``default_values``.
+
+    ``logging=<level>`` (``debug``, ``info``, ``warning`` or ``error``) sets the level of the ``"granola"`` logger
+    when the device is opened. Every device logs to that logger, so this changes the logging of every device, and
+    the rest of GRANOLA, in the process, not only this device's, and it lasts after the device is closed.
+
+    Returns:
+        tuple: ``(url, factory)``, where ``factory`` takes pyserial's arguments and returns the new device.
+    """
+    config_key, config_path, default_values, level = parse_url(url)
+
+    def factory(port=None, *args, **kwargs):
+        if level is not None:  # for the whole process, every device logs to the granola logger
+            logging.getLogger("granola").setLevel(level)
+        device = build_device(config_key, config_path, default_values)
+        device(port, *args, **kwargs)
+        return device
+
+    return url, factory
+
+
+def parse_url(url):
+    """
+    Split a ``granola://`` URL into its config key, config path, default value overrides and logging level.
+
+    Raises:
+        ValueError: if the URL isn't a ``granola://`` URL or doesn't have a config key.
+    """
+    parts = urlsplit(url)
+    if parts.scheme.lower() != "granola":
+        raise ValueError("expected a granola:// URL, got %r" % url)
+    config_key = unquote(parts.netloc + parts.path)
+    if not config_key:
+        raise ValueError("granola:// URL %r is missing the config key, such as granola://cereal" % url)
+    config_path = "config.json"
+    level = None
+    default_values = []
+    for option, value in parse_qsl(parts.query, keep_blank_values=True):
+        if option == "config":
+            config_path = value
+        elif option == "logging":
+            try:
+                level = LOGGER_LEVELS[value]
+            except KeyError:
+                raise ValueError(
+                    "unknown logging level %r in %r, expected one of %s" % (value, url, list(LOGGER_LEVELS))
+                )
+        else:
+            default_values.append((option, value))
+    return config_key, config_path, tuple(default_values), level
+
+
+def build_device(config_key, config_path="config.json", default_values=()):
+    """
+    Build a new, not yet initialized, device from ``config_key`` in ``config_path``.
+
+    The first device built for a configuration is kept pickled, and every later one is unpickled from it, with
+    ``default_values`` applied to the copy, so opening the same configuration many times, with any default values,
+    neither rereads the configuration nor reparses its CSVs. The cached device is rebuilt when the configuration
+    file, or any file the device was loaded from (such as its canned query CSVs), changes.
+    """
+    path = fixpath(get_path(config_path))
+    key = (path, config_key)
+    cached = _prototypes.get(key)
+    if cached is None or any(_stamp(file) != stamp for file, stamp in cached[0].items()):
+        logger.debug("Building %s from %s", config_key, path)
+        prototype = _build_device(config_key, path)
+        files = [path] + [file for reader in prototype._readers_.values() for file in reader.watched_files()]
+        cached = (
+            dict((file, _stamp(file)) for file in files),
+            pickle.dumps(prototype, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+        _prototypes[key] = cached
+    device = pickle.loads(cached[1])
+    if default_values and not _set_default_values(device, default_values):
+        # the getters and setters of a configuration without default values aren't set up, so build it as configured
+        device = _build_device(config_key, path, default_values)
+    return device
+
+
+def _build_device(config_key, path, default_values=()):
+    config = Cereal._load_json_config(config_key=config_key, config_path=path)
+    config = config_with_default_values(config, dict(default_values))
+    config.setdefault("data_path_root", path)
+    return Cereal(**config)
+
+
+def _set_default_values(device, default_values):
+    """
+    Give the attributes of ``device``'s GettersAndSetters the ``default_values`` (and those values), as if they had
+    been configured with them. Returns False if ``device`` doesn't have getters and setters with default values.
+    """
+    reader = device._readers_.get(GettersAndSetters.__name__)
+    if reader is None or not reader.instrument_attributes:
+        return False
+    reader._default_values = OrderedDict(reader._default_values)
+    for name, value in default_values:
+        reader._default_values[name] = value
+        reader.instrument_attributes[name] = InstrumentAttribute(name=name, value=value)
+    return True
+
+
+def clear_cache():
+    """Forget every cached configuration"""
+    _prototypes.clear()
+
+
+__doc__ = """
+``granola://`` URLs for :func:`serial.serial_for_url`, so code that opens its ports from a URL can be switched to
+a mocked device by changing only the URL.
+
+>>> import serial
+>>> import granola
+>>> from granola.tests.conftest import CONFIG_PATH
+>>> ser = serial.serial_for_url("granola://cereal?config=%s&sn=1234" % CONFIG_PATH, baudrate=9600)
+>>> ser.write(b"get -sn\\r")
+8
+>>> ser.read(ser.in_waiting)
+b'1234\\r>'
+
+A ``logging=<level>`` query parameter sets the level of the ``"granola"`` logger, for the whole process, as the
+device is opened.
+"""
@@ -1,4 +1,5 @@
 import abc
+import errno
 import functools
 import logging
 import os
@@ -12,7 +13,6 @@ from builtins import (
 from collections import OrderedDict
 from datetime import datetime
 
-import pandas as pd
 import pkg_resources
 
 logger = logging.getLogger(__name__)
@@ -57,6 +57,27 @@ def fixpath(path):
     return str(new_path)
 
 
+def resolve_data_path(file, data_path_root=None):
+    """
+    Resolve a data file path. Relative paths are relative to the directory of ``data_path_root``
+    (usually the path of the configuration file).
+
+    Args:
+        file (str | Path): Absolute path, or path relative to ``data_path_root``
+        data_path_root (str | Path, optional): Path to configuration. Required if file path is not an absolute path
+
+    Returns:
+        str: the resolved path
+    """
+    file = str(file)
+    if not os.path.isabs(file):
+        if data_path_root is None:
+            raise TypeError("`data_path_root` must be specified when using a relative file path")
+        data_path_root = str(data_path_root)
+        file = os.path.join(os.path.dirname(data_path_root), file)
+    return file
+
+
 def deunicodify_hook(pairs):
     """Hook for ``json.load`` to convert unicode json to byte json for python 2"""
     new_pairs = []
@@ -111,6 +132,7 @@ def load_serial_df(path):
 
     Necessary columns -> cmd, response
     """
+    import pandas as pd
 
     df = pd.read_csv(path, converters=dict(cmd=decode_escape_char, response=decode_escape_char), skipinitialspace=True)
     return df
@@ -149,6 +171,24 @@ def make_path(path):
         os.makedirs(dir_name)
 
 
+def replace_file(source, destination):
+    """Move ``source`` to ``destination``, replacing it if it exists, like python 3's ``os.replace``"""
+    if IS_PYTHON3:
+        os.replace(source, destination)
+        return
+    if os.name == "nt" and os.path.exists(destination):  # python 2 can't rename over a file on windows
+        os.remove(destination)
+    os.rename(source, destination)
+
+
+def would_block(err):
+    """
+    Whether ``err``, raised by a non blocking socket or file, only means it isn't ready yet, like python 3's
+    ``BlockingIOError`` and ``InterruptedError``
+    """
+    return getattr(err, "errno", None) in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
 def int_to_char(int_):
     """Return an ascii character in byte string form for a given int"""
     return bytes([int_])